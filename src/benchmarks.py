@@ -0,0 +1,336 @@
+import pandas as pd
+import numpy as np
+from pathlib import Path
+from datetime import datetime, timezone
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tempfile
+import warnings
+
+from config import BASE_DIR, DATA_DIR, REPORTS_DIR, ESTADOS_POR_SUBMERCADO
+from climate_ingestion import UF_POR_NOME
+from memory_report import MonitorRSS, peak_rss_mb
+
+# Ignorar avisos
+warnings.filterwarnings('ignore')
+
+# --- 1. Configuração de Caminhos ---
+BENCHMARK_DATA_DIR = DATA_DIR / "benchmark"     # Dados sintéticos (um diretório por escala)
+RESULTADOS_DIR = REPORTS_DIR / "benchmarks"     # Resultados em JSON, comparáveis entre versões
+
+# Suba esta versão ao mudar o formato do JSON ou o que cada etapa mede
+VERSAO_FORMATO = 2
+
+# Escala -> (anos de histórico, classes de consumidor por estado/dia).
+# 1x ~ a amostra real (um ano, uma classe por estado: ~9,5 mil linhas brutas).
+ESCALAS = {1: (1, 1), 10: (2, 5), 100: (10, 10)}
+ULTIMO_ANO = 2024  # População e clima do pipeline são de 2024
+
+CLASSES = [
+    'Distribuidor', 'Consumidor Livre', 'Consumidor Especial', 'Autoprodutor', 'Gerador',
+    'Comercializador', 'Produtor Independente', 'Exportador', 'Importador', 'Transmissor',
+]
+STATUS_MIGRACAO = ['Existente', 'Migrante', 'Novo']
+REGIOES_IBGE = ['Norte', 'Nordeste', 'Sudeste', 'Sul', 'Centro-Oeste']
+MESES = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho', 'Julho', 'Agosto',
+         'Setembro', 'Outubro', 'Novembro', 'Dezembro']
+
+# Diferenças menores que isso são ruído de medição, não regressão
+MINIMO_SEGUNDOS = 0.05
+MINIMO_MB = 20.0
+
+
+# --- 2. Gerador de Dados Sintéticos (Mesmos Formatos dos Arquivos Reais) ---
+
+def _formato_brasileiro(valores):
+    """1234.5 -> '1.234,500' (milhar com ponto, decimal com vírgula, 3 casas, como no export da CCEE)."""
+    troca = str.maketrans(',.', '.,')
+    return [f"{v:,.3f}".translate(troca) for v in valores]
+
+def generate_raw(pasta, escala=1, semente=42):
+    """Escreve os 3 CSVs brutos sintéticos em 'pasta'; retorna o nº de linhas do consumo.
+
+    - consumo_historico_por_regiao.csv: UTF-16, separado por tab, números '2.331,865';
+    - crescimento_populacional_regioes_2020_2024.csv e medias_temperatura_umidade_2024.csv:
+      UTF-8, separados por vírgula, como os arquivos da amostra.
+    """
+    anos, n_classes = ESCALAS[escala]
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(semente)
+
+    submercado_por_uf = {uf: regiao for regiao, ufs in ESTADOS_POR_SUBMERCADO.items() for uf in ufs}
+    estados = [(nome, submercado_por_uf[uf]) for nome, uf in UF_POR_NOME.items() if uf in submercado_por_uf]
+    classes = CLASSES[:n_classes]
+    datas = pd.date_range(f"{ULTIMO_ANO - anos + 1}-01-01", f"{ULTIMO_ANO}-12-31", freq='D')
+
+    # Grade (dia x estado x classe), com o dia mais recente primeiro, como no export
+    n_d, n_e, n_c = len(datas), len(estados), len(classes)
+    i_dia = np.repeat(np.arange(n_d)[::-1], n_e * n_c)
+    i_estado = np.tile(np.repeat(np.arange(n_e), n_c), n_d)
+    i_classe = np.tile(np.arange(n_c), n_d * n_e)
+
+    base_estado = rng.lognormal(mean=6.5, sigma=0.9, size=n_e)
+    fator_classe = rng.dirichlet(np.ones(n_c)) * n_c if n_c > 1 else np.ones(1)
+    dia_ano = datas.dayofyear.to_numpy()[i_dia]
+    semana = np.where(datas.dayofweek.to_numpy()[i_dia] >= 5, 0.85, 1.0)
+    consumo = (base_estado[i_estado] * fator_classe[i_classe] * semana
+               * (1 + 0.08 * np.sin(2 * np.pi * dia_ano / 365.25)) * rng.normal(1, 0.03, len(i_dia)))
+
+    df_consumo = pd.DataFrame({
+        'Data': datas.strftime('%d/%m/%Y').to_numpy()[i_dia],
+        'Classe': np.array(classes)[i_classe],
+        'Ambiente': np.where(i_classe == 0, 'ACR', 'ACL'),
+        'Ramo de atividade': np.where(i_classe == 0, 'ACR', 'SERVIÇOS'),
+        'Submercado': np.array([s for _, s in estados])[i_estado],
+        'Estado': np.array([n for n, _ in estados])[i_estado],
+        'Status Migracao': rng.choice(STATUS_MIGRACAO, size=len(i_dia), p=[0.9, 0.07, 0.03]),
+        'Consumo (MWm)': _formato_brasileiro(np.round(consumo, 3)),
+    })
+    df_consumo.to_csv(pasta / "consumo_historico_por_regiao.csv", sep='\t', encoding='utf-16', index=False)
+
+    pop_2020 = rng.integers(15_000_000, 90_000_000, size=len(REGIOES_IBGE))
+    crescimento = np.round(rng.normal(0.5, 1.5, size=len(REGIOES_IBGE)), 2)
+    pop_2024 = np.rint(pop_2020 * (1 + crescimento / 100)).astype('int64')
+    df_pop = pd.DataFrame({'Região': REGIOES_IBGE, 'População 2020': pop_2020,
+                           'População 2024': pop_2024, 'Crescimento (%)': crescimento})
+    total = {'Região': 'Brasil', 'População 2020': pop_2020.sum(), 'População 2024': pop_2024.sum(),
+             'Crescimento (%)': round((pop_2024.sum() / pop_2020.sum() - 1) * 100, 2)}
+    df_pop = pd.concat([df_pop, pd.DataFrame([total])], ignore_index=True)
+    df_pop.to_csv(pasta / "crescimento_populacional_regioes_2020_2024.csv", index=False, encoding='utf-8')
+
+    regioes_clima = np.repeat(REGIOES_IBGE, 12)
+    meses = np.tile(np.arange(12), len(REGIOES_IBGE))
+    df_clima = pd.DataFrame({
+        'Região': regioes_clima,
+        'Mês': np.array(MESES)[meses],
+        'Temperatura (°C)': np.round(24 + 3 * np.cos(2 * np.pi * meses / 12) + rng.normal(0, 0.5, len(meses)), 1),
+        'Umidade (%)': np.round(np.clip(70 + 12 * np.cos(2 * np.pi * meses / 12) + rng.normal(0, 3, len(meses)), 30, 95), 1),
+    })
+    df_clima.to_csv(pasta / "medias_temperatura_umidade_2024.csv", index=False, encoding='utf-8')
+    return len(df_consumo)
+
+def ensure_raw(escala, semente=42):
+    """Pasta com os dados sintéticos da escala (gerados só na primeira vez)."""
+    pasta = BENCHMARK_DATA_DIR / f"escala_{escala}x_s{semente}"
+    if not (pasta / "medias_temperatura_umidade_2024.csv").exists():
+        inicio = time.perf_counter()
+        linhas = generate_raw(pasta, escala, semente)
+        print(f"✅ Dados sintéticos {escala}x: {linhas:,} linhas de consumo em {time.perf_counter() - inicio:.1f}s")
+    return pasta
+
+
+# --- 3. Etapas Medidas ---
+
+def _medir(etapas, nome, funcao, *args, **kwargs):
+    """Roda uma etapa, guardando tempo de parede, pico de RSS do bloco e linhas da saída."""
+    with MonitorRSS() as monitor:
+        inicio = time.perf_counter()
+        saida = funcao(*args, **kwargs)
+        segundos = time.perf_counter() - inicio
+    principal = saida[0] if isinstance(saida, tuple) else saida
+    etapas.setdefault(nome, []).append({
+        'segundos': segundos,
+        'pico_rss_mb': monitor.pico_mb,
+        'acrescimo_rss_mb': monitor.acrescimo_mb,
+        'linhas_saida': len(principal) if hasattr(principal, '__len__') else None,
+    })
+    return saida
+
+def _isolar_saidas(pasta):
+    """Aponta registry, prediction store e master (hash do dataset) para 'pasta'.
+
+    Só é chamado no subprocesso de cada escala: o train_and_save_models roda inteiro
+    (treino + registro + previsões) sem misturar modelos sintéticos com os de produção.
+    """
+    import model_registry
+    import prediction_store
+    pasta = Path(pasta)
+    model_registry.REGISTRY_DIR = pasta / "registry"
+    prediction_store.PREDICTIONS_DIR = pasta / "predictions"
+    prediction_store.MASTER_PARQUET = pasta / "master_dataset.parquet"
+    return prediction_store.MASTER_PARQUET
+
+def _treinar(df_master, threads):
+    """O train_and_save_models de produção (matrizes + XGBoost + registro + previsões)."""
+    from ml_pipeline import FEATURES_V4, train_and_save_models
+    df = df_master.rename(columns={'População 2024': 'Populacao'})
+    return train_and_save_models(df, threads=threads, features=FEATURES_V4)
+
+def _carregar_dashboard(caminho, regiao):
+    """O que o dashboard lê: o master inteiro (load_data) e uma região (filtro por row group)."""
+    from dataset_store import load_master_dataset
+    completo = load_master_dataset(caminho=caminho)
+    load_master_dataset(regioes=[regiao], caminho=caminho)
+    return completo
+
+def run_scale(pasta, repeticoes=1, threads=None):
+    """Mede cada etapa do pipeline sobre os dados de 'pasta' (roda dentro de um subprocesso)."""
+    from data_processing import (load_raw_data, load_consumo_chunked, clean_data, harmonize_regions,
+                                 create_features)
+    from dataset_store import save_master_dataset
+
+    threads = threads or os.cpu_count() or 1
+    etapas = {}
+    with tempfile.TemporaryDirectory() as temporaria:
+        caminho_master = _isolar_saidas(temporaria)
+        for _ in range(repeticoes):
+            df_consumo, df_pop, df_clima = _medir(etapas, 'load_raw_data', load_raw_data, pasta=pasta)
+            _medir(etapas, 'load_consumo_chunked', load_consumo_chunked,
+                   Path(pasta) / "consumo_historico_por_regiao.csv", chunksize=500_000)
+            df_agg, df_pop, df_clima = _medir(etapas, 'clean_data', clean_data, df_consumo, df_pop, df_clima)
+            del df_consumo
+            df_pop_h, df_clima_h = _medir(etapas, 'harmonize_regions', harmonize_regions, df_pop, df_clima)
+            df_master = _medir(etapas, 'create_features', create_features, df_agg, df_pop_h, df_clima_h)
+            save_master_dataset(df_master, caminho=caminho_master)
+            _medir(etapas, 'train_and_save_models', _treinar, df_master, threads)
+            _medir(etapas, 'dashboard_load', _carregar_dashboard, caminho_master, df_master['Região'].iloc[0])
+
+    # Tempo: melhor repetição (menos sensível a ruído); memória: maior pico observado
+    resumo = {}
+    for nome, medidas in etapas.items():
+        picos = [m['pico_rss_mb'] for m in medidas if m['pico_rss_mb'] is not None]
+        acrescimos = [m['acrescimo_rss_mb'] for m in medidas if m['acrescimo_rss_mb'] is not None]
+        resumo[nome] = {
+            'segundos': min(m['segundos'] for m in medidas),
+            'segundos_todas': [m['segundos'] for m in medidas],
+            'pico_rss_mb': max(picos) if picos else None,
+            'acrescimo_rss_mb': max(acrescimos) if acrescimos else None,
+            'linhas_saida': medidas[0]['linhas_saida'],
+        }
+    return {'etapas': resumo, 'pico_rss_processo_mb': peak_rss_mb()}
+
+
+# --- 4. Suite (Um Subprocesso por Escala) e Resultados ---
+
+def _git_commit():
+    try:
+        saida = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                               capture_output=True, text=True, timeout=10)
+        return saida.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_suite(escalas=(1, 10, 100), repeticoes=1, threads=None, semente=42):
+    """Gera (se preciso) e mede cada escala em um processo novo, para que pico de memória
+    e caches de uma escala não contaminem a seguinte."""
+    import xgboost as xgb  # Só a versão, para o relatório; o treino roda nos processos filhos
+
+    resultado = {
+        'versao_formato': VERSAO_FORMATO,
+        'criado_em': datetime.now(timezone.utc).isoformat(),
+        'git_commit': _git_commit(),
+        'ambiente': {
+            'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+            'xgboost': xgb.__version__, 'cpus': os.cpu_count(), 'plataforma': platform.platform(),
+        },
+        'parametros': {'repeticoes': repeticoes, 'threads': threads, 'semente': semente},
+        'escalas': {},
+    }
+    for escala in escalas:
+        pasta = ensure_raw(escala, semente)
+        arquivo_consumo = pasta / "consumo_historico_por_regiao.csv"
+        print(f"\n⏱️ Medindo escala {escala}x ({repeticoes} repetição(ões))...")
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+            saida = Path(f.name)
+        comando = [sys.executable, __file__, '--medir-pasta', str(pasta), '--saida-interna', str(saida),
+                   '--repeticoes', str(repeticoes)] + (['--threads', str(threads)] if threads else [])
+        processo = subprocess.run(comando, capture_output=True, text=True)
+        if processo.returncode != 0:
+            print(f"❌ ERRO na escala {escala}x:\n{processo.stderr[-2000:]}")
+            continue
+        with open(saida, encoding='utf-8') as f:
+            medicao = json.load(f)
+        saida.unlink(missing_ok=True)
+
+        anos, n_classes = ESCALAS[escala]
+        medicao.update(anos=anos, classes=n_classes, bytes_brutos=arquivo_consumo.stat().st_size)
+        resultado['escalas'][f"{escala}x"] = medicao
+    return resultado
+
+def save_results(resultado, caminho=None):
+    if caminho is None:
+        RESULTADOS_DIR.mkdir(parents=True, exist_ok=True)
+        carimbo = datetime.now().strftime('%Y%m%d_%H%M%S')
+        caminho = RESULTADOS_DIR / f"benchmark_{carimbo}_{resultado['git_commit'] or 'sem-git'}.json"
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2)
+    return Path(caminho)
+
+def results_frame(resultado):
+    """Resultado em formato longo: uma linha por (escala, etapa)."""
+    linhas = [{'escala': escala, 'etapa': etapa, **{k: v for k, v in medida.items() if k != 'segundos_todas'}}
+              for escala, dados in resultado['escalas'].items() for etapa, medida in dados['etapas'].items()]
+    return pd.DataFrame(linhas).set_index(['escala', 'etapa'])
+
+def compare_results(atual, base, tolerancia=0.25):
+    """Etapas mais lentas (ou com mais memória) que a base além da tolerância relativa.
+
+    Diferenças absolutas pequenas (MINIMO_SEGUNDOS / MINIMO_MB) são ignoradas.
+    """
+    df_atual, df_base = results_frame(atual), results_frame(base)
+    comum = df_atual.index.intersection(df_base.index)
+    regressoes = []
+    for chave in comum:
+        for coluna, minimo in (('segundos', MINIMO_SEGUNDOS), ('acrescimo_rss_mb', MINIMO_MB)):
+            novo, antigo = df_atual.at[chave, coluna], df_base.at[chave, coluna]
+            if pd.isna(novo) or pd.isna(antigo):
+                continue
+            if novo > antigo * (1 + tolerancia) and novo - antigo > minimo:
+                regressoes.append({'escala': chave[0], 'etapa': chave[1], 'medida': coluna,
+                                   'base': antigo, 'atual': novo, 'razao': novo / antigo if antigo else np.inf})
+    return pd.DataFrame(regressoes, columns=['escala', 'etapa', 'medida', 'base', 'atual', 'razao'])
+
+
+# --- 5. Função Principal ---
+
+def main(escalas=(1, 10, 100), repeticoes=1, threads=None, comparar=None, tolerancia=0.25, saida=None):
+    print("--- INICIANDO BENCHMARK DO PIPELINE ---")
+    resultado = run_suite(escalas, repeticoes, threads)
+    caminho = save_results(resultado, saida)
+
+    with pd.option_context('display.float_format', '{:,.3f}'.format, 'display.width', 160,
+                           'display.max_columns', None):
+        print("\n📊 Tempo (melhor repetição) e memória por etapa")
+        print(results_frame(resultado)[['segundos', 'acrescimo_rss_mb', 'pico_rss_mb', 'linhas_saida']])
+    print(f"\nResultados salvos em: {caminho}")
+
+    if comparar:
+        with open(comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        regressoes = compare_results(resultado, base, tolerancia)
+        if regressoes.empty:
+            print(f"✅ Sem regressões em relação a {Path(comparar).name} (tolerância {tolerancia:.0%}).")
+        else:
+            print(f"⚠️ {len(regressoes)} regressão(ões) em relação a {Path(comparar).name}:")
+            print(regressoes.to_string(index=False))
+            return 1
+    return 0
+
+
+# --- Ponto de Entrada ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline com dados sintéticos em escala")
+    parser.add_argument("--escalas", type=int, nargs='+', default=[1, 10, 100], choices=sorted(ESCALAS),
+                        help="Multiplicadores do tamanho da amostra")
+    parser.add_argument("--repeticoes", type=int, default=1, help="Repetições por escala (vale a mais rápida)")
+    parser.add_argument("--threads", type=int, default=None, help="n_jobs do XGBoost (padrão: nº de CPUs)")
+    parser.add_argument("--comparar", default=None, help="JSON de uma execução anterior (base)")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Piora relativa aceita antes de acusar regressão")
+    parser.add_argument("--saida", default=None, help="Arquivo JSON de saída (padrão: reports/benchmarks/)")
+    parser.add_argument("--medir-pasta", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--saida-interna", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir_pasta:
+        # Subprocesso de uma escala (chamado pelo run_suite)
+        medicao = run_scale(args.medir_pasta, args.repeticoes, args.threads)
+        with open(args.saida_interna, 'w', encoding='utf-8') as f:
+            json.dump(medicao, f)
+    else:
+        sys.exit(main(args.escalas, args.repeticoes, args.threads, args.comparar, args.tolerancia, args.saida))
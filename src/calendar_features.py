@@ -0,0 +1,111 @@
+import pandas as pd
+import numpy as np
+from functools import lru_cache
+
+from config import DATA_PROCESSED_DIR, ESTADOS_POR_SUBMERCADO
+
+# --- 1. Configuração ---
+# Suba esta versão ao mudar a lógica da tabela (invalida o cache em disco)
+VERSAO_CALENDARIO = 1
+
+# Colunas comuns a todas as regiões e colunas específicas de cada Submercado
+COLUNAS_NACIONAIS = ['dia_semana', 'dia_mes', 'semana_ano', 'mes', 'trimestre', 'e_feriado', 'e_ponte']
+COLUNAS_REGIONAIS = ['feriado_estadual']
+
+
+# --- 2. Construção da Tabela ---
+
+def _datas_feriado(anos, subdiv=None):
+    """Datas (datetime64) dos feriados do Brasil ou de uma UF nos anos pedidos."""
+    import holidays  # Só carregado quando a tabela precisa ser (re)construída
+    feriados = holidays.country_holidays('BR', subdiv=subdiv, years=anos)
+    return pd.to_datetime(list(feriados.keys()))
+
+def build_calendar(inicio, fim):
+    """Monta a tabela de calendário (uma linha por dia) entre inicio e fim.
+
+    Inclui sazonalidade (dia da semana, semana ISO, mês, trimestre), feriados
+    nacionais, emendas (segunda antes de feriado na terça / sexta depois de feriado
+    na quinta) e, por Submercado, a fração de estados com feriado estadual no dia.
+    """
+    datas = pd.date_range(inicio, fim, freq='D')
+    anos = list(range(datas.min().year, datas.max().year + 1))
+
+    cal = pd.DataFrame(index=pd.Index(datas, name='Data'))
+    cal['dia_semana'] = datas.dayofweek.astype('int8')  # 0=Segunda, 6=Domingo
+    cal['dia_mes'] = datas.day.astype('int8')
+    cal['semana_ano'] = datas.isocalendar().week.to_numpy().astype('int8')
+    cal['mes'] = datas.month.astype('int8')
+    cal['trimestre'] = datas.quarter.astype('int8')
+
+    nacionais = _datas_feriado(anos)
+    cal['e_feriado'] = datas.isin(nacionais)
+
+    # Emenda: dia útil "preso" entre um feriado nacional e o fim de semana
+    amanha_feriado = (datas + pd.Timedelta(days=1)).isin(nacionais)
+    ontem_feriado = (datas - pd.Timedelta(days=1)).isin(nacionais)
+    cal['e_ponte'] = ~cal['e_feriado'] & (
+        ((cal['dia_semana'] == 0) & amanha_feriado) | ((cal['dia_semana'] == 4) & ontem_feriado)
+    )
+
+    # Feriados estaduais (sem os nacionais), agregados por Submercado
+    for regiao, ufs in ESTADOS_POR_SUBMERCADO.items():
+        flags = np.column_stack([
+            datas.isin(_datas_feriado(anos, uf).difference(nacionais)) for uf in ufs
+        ])
+        cal[f'feriado_estadual|{regiao}'] = flags.mean(axis=1)
+
+    return cal
+
+
+# --- 3. Cache (memória + disco) ---
+
+def _caminho_cache():
+    from importlib.metadata import version
+    return DATA_PROCESSED_DIR / f"calendario_v{VERSAO_CALENDARIO}_{version('holidays')}.parquet"
+
+@lru_cache(maxsize=8)
+def _calendario_anos(ano_inicio, ano_fim):
+    """Tabela para anos inteiros, lida do cache em disco quando ele cobre o período."""
+    caminho = _caminho_cache()
+    if caminho.exists():
+        cal = pd.read_parquet(caminho)
+        if cal.index.min().year <= ano_inicio and cal.index.max().year >= ano_fim:
+            return cal
+        ano_inicio = min(ano_inicio, cal.index.min().year)
+        ano_fim = max(ano_fim, cal.index.max().year)
+
+    cal = build_calendar(f"{ano_inicio}-01-01", f"{ano_fim}-12-31")
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    cal.to_parquet(caminho)
+    return cal
+
+def get_calendar(inicio, fim):
+    """Tabela de calendário (indexada por data) cobrindo [inicio, fim], via cache."""
+    inicio, fim = pd.Timestamp(inicio), pd.Timestamp(fim)
+    cal = _calendario_anos(inicio.year, fim.year)
+    return cal.loc[inicio:fim]
+
+
+# --- 4. Junção com os Dados ---
+
+def calendar_long(inicio, fim, regioes=None):
+    """Versão longa (Data, Região) da tabela: colunas nacionais + 'feriado_estadual' da região."""
+    cal = get_calendar(inicio, fim)
+    regioes = regioes if regioes is not None else list(ESTADOS_POR_SUBMERCADO)
+
+    partes = []
+    for regiao in regioes:
+        parte = cal[COLUNAS_NACIONAIS].copy()
+        coluna = f'feriado_estadual|{regiao}'
+        parte['feriado_estadual'] = cal[coluna] if coluna in cal else 0.0
+        parte['Região'] = regiao
+        partes.append(parte)
+    return pd.concat(partes).reset_index()
+
+def attach_calendar(df, col_data='Data', col_regiao='Região'):
+    """Junta as features de calendário a um DataFrame com (data, região) em um único merge."""
+    datas = df[col_data]
+    cal = calendar_long(datas.min(), datas.max(), regioes=pd.unique(df[col_regiao]).tolist())
+    cal = cal.rename(columns={'Data': col_data, 'Região': col_regiao})
+    return df.merge(cal, on=[col_data, col_regiao], how='left')
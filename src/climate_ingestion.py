@@ -0,0 +1,293 @@
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import os
+import json
+import time
+import hashlib
+import argparse
+import warnings
+
+from config import DATA_RAW_DIR, DATA_PROCESSED_DIR, ESTADOS_POR_SUBMERCADO
+
+# Ignorar avisos
+warnings.filterwarnings('ignore')
+
+# --- 1. Configuração de Caminhos ---
+# Arquivos horários das estações automáticas do INMET (um CSV por estação/ano)
+INMET_DIR = DATA_RAW_DIR / "inmet"
+CONSUMO_CSV = DATA_RAW_DIR / "consumo_historico_por_regiao.csv"
+POPULACAO_UF_CSV = DATA_RAW_DIR / "populacao_por_uf.csv"  # Opcional: colunas UF, População
+
+PESOS_ESTACOES_PARQUET = DATA_PROCESSED_DIR / "pesos_estacoes.parquet"
+CLIMA_DIARIO_PARQUET = DATA_PROCESSED_DIR / "clima_diario.parquet"
+CLIMA_MANIFESTO = DATA_PROCESSED_DIR / "clima_diario.json"
+
+# Suba esta versão ao mudar a lógica da agregação (invalida o cache)
+VERSAO_CLIMA = 2
+
+# As leituras do INMET são em UTC; o dia é agregado no horário de Brasília
+FUSO_HORAS = -3
+
+# Colunas do INMET (layout atual e o anterior a 2019) -> nomes internos
+COLUNAS_INMET = {
+    'Data': 'data', 'DATA (YYYY-MM-DD)': 'data',
+    'Hora UTC': 'hora', 'HORA (UTC)': 'hora',
+    'TEMPERATURA DO AR - BULBO SECO, HORARIA (°C)': 'Temperatura',
+    'UMIDADE RELATIVA DO AR, HORARIA (%)': 'Umidade',
+    'PRECIPITAÇÃO TOTAL, HORÁRIO (mm)': 'Chuva',
+}
+VARIAVEIS = ['Temperatura', 'Umidade', 'Chuva']
+LINHAS_CABECALHO = 8
+VALORES_AUSENTES = [-9999, -9999.0, -999.9]
+
+# Nome do estado (como no export da CCEE) -> UF
+UF_POR_NOME = {
+    'Acre': 'AC', 'Alagoas': 'AL', 'Amapá': 'AP', 'Amazonas': 'AM', 'Bahia': 'BA', 'Ceará': 'CE',
+    'Distrito Federal': 'DF', 'Espírito Santo': 'ES', 'Goiás': 'GO', 'Maranhão': 'MA',
+    'Mato Grosso': 'MT', 'Mato Grosso do Sul': 'MS', 'Minas Gerais': 'MG', 'Pará': 'PA',
+    'Paraíba': 'PB', 'Paraná': 'PR', 'Pernambuco': 'PE', 'Piauí': 'PI', 'Rio de Janeiro': 'RJ',
+    'Rio Grande do Norte': 'RN', 'Rio Grande do Sul': 'RS', 'Rondônia': 'RO', 'Roraima': 'RR',
+    'Santa Catarina': 'SC', 'São Paulo': 'SP', 'Sergipe': 'SE', 'Tocantins': 'TO',
+}
+
+
+# --- 2. Catálogo de Estações e Índice de Pesos ---
+
+def list_station_files(pasta=INMET_DIR):
+    pasta = Path(pasta)
+    return sorted(set(pasta.glob('*.csv')) | set(pasta.glob('*.CSV')))
+
+def read_station_header(caminho):
+    """Metadados do cabeçalho do arquivo do INMET (UF, código e nome da estação)."""
+    meta = {}
+    with open(caminho, encoding='latin-1') as f:
+        for _ in range(LINHAS_CABECALHO):
+            chave, _, valor = f.readline().strip().partition(';')
+            meta[chave.rstrip(':').strip()] = valor.strip()
+    return {
+        'estacao': meta.get('CODIGO (WMO)'),
+        'UF': meta.get('UF'),
+        'nome': meta.get('ESTACAO', meta.get('ESTAÇÃO')),
+        'arquivo': str(caminho),
+    }
+
+def station_catalog(arquivos):
+    """Uma linha por estação (só o cabeçalho de cada arquivo é lido)."""
+    catalogo = pd.DataFrame([read_station_header(a) for a in arquivos])
+    return catalogo.drop_duplicates('estacao').drop(columns='arquivo').reset_index(drop=True)
+
+def uf_weights(fonte='carga'):
+    """Peso de cada UF dentro do seu Submercado (tabela UF, Região, peso_uf).
+
+    - 'carga': consumo total da UF no export da CCEE (o próprio export diz o Submercado);
+    - 'populacao': tabela populacao_por_uf.csv (UF, População) + ESTADOS_POR_SUBMERCADO;
+    - 'uniforme': todas as UFs com o mesmo peso.
+    """
+    if fonte == 'carga':
+        df = pd.read_csv(CONSUMO_CSV, sep='\t', encoding='utf-16', thousands='.', decimal=',',
+                         usecols=['Submercado', 'Estado', 'Consumo (MWm)'])
+        df['UF'] = df['Estado'].str.strip().map(UF_POR_NOME)
+        df['Região'] = df['Submercado'].str.strip()
+        pesos = df.groupby(['UF', 'Região'])['Consumo (MWm)'].sum().rename('peso_uf').reset_index()
+    else:
+        pesos = pd.DataFrame(
+            [(uf, regiao) for regiao, ufs in ESTADOS_POR_SUBMERCADO.items() for uf in ufs],
+            columns=['UF', 'Região']
+        )
+        if fonte == 'populacao':
+            populacao = pd.read_csv(POPULACAO_UF_CSV).set_index('UF')['População']
+            pesos['peso_uf'] = pesos['UF'].map(populacao)
+        elif fonte == 'uniforme':
+            pesos['peso_uf'] = 1.0
+        else:
+            raise ValueError(f"Fonte de pesos desconhecida: {fonte!r} (use carga, populacao ou uniforme)")
+    return pesos.dropna(subset=['peso_uf'])
+
+def build_weight_index(catalogo, pesos_uf, caminho=PESOS_ESTACOES_PARQUET):
+    """Índice estação -> Submercado com o peso de cada estação (somam 1 por Submercado).
+
+    O peso da UF é dividido igualmente entre as estações dela; estações de UFs sem
+    peso (ex.: fora do SIN) ficam de fora. O índice é salvo para consulta/auditoria.
+    """
+    indice = catalogo.merge(pesos_uf, on='UF', how='inner')
+    indice['peso'] = indice['peso_uf'] / indice.groupby('UF')['estacao'].transform('size')
+    indice['peso'] /= indice.groupby('Região')['peso'].transform('sum')
+    indice = indice[['estacao', 'UF', 'nome', 'Região', 'peso']].sort_values(['Região', 'UF', 'estacao'])
+
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    indice.to_parquet(caminho, index=False)
+    return indice.reset_index(drop=True)
+
+
+# --- 3. Leitura das Estações (em Blocos) ---
+
+def _datas_locais(bloco):
+    """Dia local (Brasília) de cada leitura horária, convertendo só os valores distintos."""
+    datas = bloco['data'].cat.categories.str.replace('/', '-', regex=False)
+    datas = pd.Series(pd.to_datetime(datas, format='%Y-%m-%d'))
+    horas = pd.Series(bloco['hora'].cat.categories.str[:2].astype('int8'))
+    instante = (datas.to_numpy()[bloco['data'].cat.codes.to_numpy()]
+                + pd.to_timedelta(horas.to_numpy()[bloco['hora'].cat.codes.to_numpy()] + FUSO_HORAS, unit='h'))
+    return pd.DatetimeIndex(instante).normalize()
+
+def group_station_files(arquivos):
+    """Estação -> todos os seus arquivos (o INMET publica um CSV por estação por ano)."""
+    por_estacao = {}
+    for arquivo in arquivos:
+        por_estacao.setdefault(read_station_header(arquivo)['estacao'], []).append(arquivo)
+    return por_estacao
+
+def read_station_daily(caminhos, chunksize=200_000):
+    """Lê os arquivos horários de uma estação em blocos e devolve as médias/somas diárias.
+
+    'caminhos' é um arquivo ou a lista de arquivos (anos) da mesma estação. Cada bloco
+    vira somas e contagens parciais por dia (só as colunas usadas são lidas, data/hora
+    como categoria), então a memória não depende do tamanho dos arquivos. As parciais
+    de todos os anos são somadas antes da média: o dia local da virada do ano (UTC-3)
+    tem leituras nos dois arquivos.
+    """
+    if isinstance(caminhos, (str, Path)):
+        caminhos = [caminhos]
+    meta = read_station_header(caminhos[0])
+
+    acumulado = None
+    for caminho in caminhos:
+        leitor = pd.read_csv(
+            caminho, sep=';', skiprows=LINHAS_CABECALHO, encoding='latin-1', decimal=',',
+            usecols=lambda col: col in COLUNAS_INMET, na_values=VALORES_AUSENTES,
+            dtype={'Data': 'category', 'DATA (YYYY-MM-DD)': 'category',
+                   'Hora UTC': 'category', 'HORA (UTC)': 'category'},
+            chunksize=chunksize, index_col=False
+        )
+        for bloco in leitor:
+            bloco = bloco.rename(columns=COLUNAS_INMET)
+            for var in VARIAVEIS:
+                if var not in bloco.columns:
+                    bloco[var] = np.nan
+            bloco[VARIAVEIS] = bloco[VARIAVEIS].astype('float64')
+            parcial = bloco[VARIAVEIS].groupby(_datas_locais(bloco)).agg(['sum', 'count'])
+            acumulado = parcial if acumulado is None else acumulado.add(parcial, fill_value=0)
+
+    if acumulado is None:
+        return None
+
+    diario = pd.DataFrame(index=acumulado.index.rename('Data'))
+    for var in ['Temperatura', 'Umidade']:
+        diario[var] = acumulado[(var, 'sum')] / acumulado[(var, 'count')].replace(0, np.nan)
+    # Chuva é o total do dia (NaN se nenhuma leitura válida)
+    diario['Chuva'] = acumulado[('Chuva', 'sum')].where(acumulado[('Chuva', 'count')] > 0)
+    diario = diario.reset_index()
+    diario.insert(0, 'estacao', meta['estacao'])
+    return diario
+
+
+# --- 4. Agregação por Submercado ---
+
+def aggregate_regions(diario_estacoes, indice):
+    """Média ponderada diária por Submercado (pesos renormalizados entre as estações com leitura)."""
+    df = diario_estacoes.merge(indice[['estacao', 'Região', 'peso']], on='estacao', how='inner')
+
+    somas = {}
+    for var in VARIAVEIS:
+        valido = df[var].notna().to_numpy()
+        somas[f'{var}|wx'] = np.where(valido, df[var].to_numpy() * df['peso'].to_numpy(), 0.0)
+        somas[f'{var}|w'] = np.where(valido, df['peso'].to_numpy(), 0.0)
+    somas = pd.DataFrame(somas).groupby([df['Data'].to_numpy(), df['Região'].to_numpy()]).sum()
+
+    clima = pd.DataFrame(index=somas.index)
+    for var in VARIAVEIS:
+        clima[var] = somas[f'{var}|wx'] / somas[f'{var}|w'].replace(0, np.nan)
+    clima.index.names = ['Data', 'Região']
+    return clima.reset_index().astype({'Região': 'category'})
+
+
+# --- 5. Cache (Artefato + Manifesto) ---
+
+def assinatura(arquivos, fonte_pesos):
+    """Identidade das entradas: caminho/tamanho/mtime de cada arquivo (todos os anos de todas
+    as estações) + fonte dos pesos + versão."""
+    h = hashlib.sha256(f"{VERSAO_CLIMA}|{fonte_pesos}".encode())
+    for caminho in sorted(arquivos):
+        info = os.stat(caminho)
+        h.update(f"|{Path(caminho).resolve()}|{info.st_size}|{info.st_mtime_ns}".encode())
+    return h.hexdigest()
+
+def load_climate_daily(caminho=CLIMA_DIARIO_PARQUET):
+    """Clima diário por Submercado já processado (None se o artefato ainda não existe)."""
+    caminho = Path(caminho)
+    if not caminho.exists():
+        return None
+    return pd.read_parquet(caminho, memory_map=True)
+
+def build_climate_daily(pasta=INMET_DIR, fonte_pesos='carga', chunksize=200_000, workers=1, forcar=False):
+    """Lê todas as estações, agrega por Submercado e grava clima_diario.parquet.
+
+    Se as entradas não mudaram desde a última execução (manifesto), devolve o cache.
+    """
+    arquivos = list_station_files(pasta)
+    if not arquivos:
+        print(f"❌ ERRO: nenhum arquivo do INMET encontrado em {pasta}")
+        return None
+
+    chave = assinatura(arquivos, fonte_pesos)
+    if not forcar and CLIMA_MANIFESTO.exists() and CLIMA_DIARIO_PARQUET.exists():
+        with open(CLIMA_MANIFESTO, encoding='utf-8') as f:
+            if json.load(f).get('assinatura') == chave:
+                print("✅ Clima diário já atualizado (cache).")
+                return load_climate_daily()
+
+    inicio = time.perf_counter()
+    indice = build_weight_index(station_catalog(arquivos), uf_weights(fonte_pesos))
+    print(f"Índice de pesos: {len(indice)} estações em {indice['Região'].nunique()} Submercados "
+          f"(pesos por {fonte_pesos}).")
+
+    # Só as estações presentes no índice são lidas (cada uma com todos os seus anos)
+    estacoes_indice = set(indice['estacao'])
+    grupos = [lista for e, lista in group_station_files(arquivos).items() if e in estacoes_indice]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            diarios = list(executor.map(read_station_daily, grupos, [chunksize] * len(grupos)))
+    else:
+        diarios = [read_station_daily(lista, chunksize) for lista in grupos]
+    n_lidos = sum(len(lista) for lista in grupos)
+
+    diario_estacoes = pd.concat([d for d in diarios if d is not None], ignore_index=True)
+    clima = aggregate_regions(diario_estacoes, indice)
+
+    CLIMA_DIARIO_PARQUET.parent.mkdir(parents=True, exist_ok=True)
+    clima.to_parquet(CLIMA_DIARIO_PARQUET, index=False)
+    with open(CLIMA_MANIFESTO, 'w', encoding='utf-8') as f:
+        json.dump({'assinatura': chave, 'fonte_pesos': fonte_pesos, 'n_arquivos': len(arquivos),
+                   'n_estacoes': len(grupos), 'versao': VERSAO_CLIMA}, f, indent=2)
+
+    print(f"✅ {n_lidos} arquivo(s) de {len(grupos)} estação(ões) -> {len(clima):,} linhas (dia, Submercado) "
+          f"em {time.perf_counter() - inicio:.2f}s")
+    return clima
+
+
+# --- 6. Função Principal ---
+
+def main(pasta=INMET_DIR, fonte_pesos='carga', chunksize=200_000, workers=1, forcar=False):
+    print("--- INICIANDO INGESTÃO DE CLIMA (ESTAÇÕES INMET) ---")
+    clima = build_climate_daily(pasta, fonte_pesos, chunksize, workers, forcar)
+    if clima is None:
+        return
+    print(clima.groupby('Região', observed=True)[VARIAVEIS].mean())
+    print(f"\nClima diário salvo em: {CLIMA_DIARIO_PARQUET}")
+    print("Rode 'src/data_processing.py' para usá-lo no master dataset.")
+    return clima
+
+
+# --- Ponto de Entrada ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestão do clima diário por Submercado (estações INMET)")
+    parser.add_argument("--pasta", default=INMET_DIR, help="Pasta com os CSVs horários do INMET")
+    parser.add_argument("--pesos", default='carga', choices=['carga', 'populacao', 'uniforme'],
+                        help="Como ponderar as UFs dentro de cada Submercado")
+    parser.add_argument("--chunksize", type=int, default=200_000, help="Linhas por bloco de leitura")
+    parser.add_argument("--workers", type=int, default=1, help="Arquivos lidos em paralelo (processos)")
+    parser.add_argument("--forcar", action="store_true", help="Ignora o cache e reprocessa tudo")
+    args = parser.parse_args()
+    main(args.pasta, args.pesos, args.chunksize, args.workers, args.forcar)
@@ -0,0 +1,47 @@
+from pathlib import Path
+import os
+
+# Configuração única do projeto: caminhos, variáveis de ambiente e constantes de domínio.
+# Só usa a biblioteca padrão e não tem efeitos colaterais (não cria pastas, não imprime,
+# não lê o .env): importar este módulo é instantâneo.
+
+# --- 1. Caminhos ---
+try:
+    BASE_DIR = Path(__file__).resolve().parent.parent
+except NameError:
+    BASE_DIR = Path(os.getcwd()).resolve()
+
+DATA_DIR = BASE_DIR / "data"
+DATA_RAW_DIR = DATA_DIR / "raw"
+DATA_PROCESSED_DIR = DATA_DIR / "processed"
+MODELS_DIR = DATA_DIR / "models"
+CACHE_DIR = DATA_DIR / "cache"
+REPORTS_DIR = BASE_DIR / "reports"
+ENV_FILE = BASE_DIR / ".env"
+
+
+# --- 2. Variáveis de Ambiente ---
+# Lidas uma vez, na importação; o CLI 'peaksense' as define antes de importar os módulos.
+
+# Formato dos logs: 'texto' (mensagens legíveis no stdout) ou 'json' (uma linha por evento)
+FORMATO_LOG = os.getenv("PEAKSENSE_LOG", "texto")
+# Captura opcional por etapa: '' (nenhuma), 'cprofile' ou 'tracemalloc'
+PERFIL = os.getenv("PEAKSENSE_PERFIL", "")
+# Backend de inferência padrão: 'xgboost', 'numpy' ou 'auto' (ver tree_inference.py)
+BACKEND_INFERENCIA = os.getenv("PEAKSENSE_INFERENCIA", "xgboost")
+
+def load_env():
+    """Carrega o .env da raiz (API_KEY, NEWSAPI_URL); só chamado por quem precisa dos segredos."""
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
+
+
+# --- 3. Domínio ---
+
+# Estados (UF) de cada Submercado da CCEE, como aparecem no export de consumo
+ESTADOS_POR_SUBMERCADO = {
+    'Nordeste': ['AL', 'BA', 'CE', 'PB', 'PE', 'PI', 'RN', 'SE'],
+    'Norte': ['AP', 'AM', 'MA', 'PA', 'TO'],
+    'Sudeste/Centro-Oeste': ['AC', 'DF', 'ES', 'GO', 'MT', 'MS', 'MG', 'RJ', 'RO', 'SP'],
+    'Sul': ['PR', 'RS', 'SC'],
+}
@@ -1,63 +1,117 @@
 import streamlit as st
 import pandas as pd
-import xgboost as xgb
-from pathlib import Path
+import numpy as np
 import matplotlib.pyplot as plt
-import os
+
+from config import DATA_PROCESSED_DIR
+from dataset_store import load_master_dataset, MASTER_PARQUET, MASTER_HORARIO_PARQUET
+from prediction_store import dataset_hash, load_predictions, save_predictions
+from model_registry import ModelRegistry, REGISTRY_DIR, model_key
+from tree_inference import predictor
+from downsampling import downsample, PONTOS_PADRAO
+from instrumentation import etapa, registrar_leitura
 
 # --- 1. Configuração da Página e Caminhos ---
 st.set_page_config(page_title="Otimizador Energético", layout="wide")
 
-# Define o diretório base do projeto
-try:
-    BASE_DIR = Path(__file__).resolve().parent.parent
-except NameError:
-    BASE_DIR = Path(os.getcwd()).resolve()
-
-DATA_PROCESSED_DIR = BASE_DIR / "data" / "processed"
-MODELS_DIR = BASE_DIR / "models"
-
 # --- 2. Funções de Carregamento (com Cache) ---
 @st.cache_resource
-def load_model(regiao):
-    """Carrega o modelo XGBoost treinado para uma região."""
-    regiao_str = regiao.lower().replace('/', '_')
-    caminho_modelo = MODELS_DIR / f"xgb_model_{regiao_str}.json"
+def get_registry():
+    """Um único registry por processo: cache LRU limitado e troca de versão sem restart."""
+    return ModelRegistry()
+
+def load_model(regiao, granularidade='diario'):
+    """Carrega (via registry) o modelo XGBoost promovido para uma região."""
+    with etapa("load_model", regiao=regiao):
+        modelo = get_registry().get(model_key(regiao, granularidade))
     
-    if not caminho_modelo.exists():
-        st.error(f"Erro: Modelo não encontrado em {caminho_modelo}")
-        st.error("Por favor, rode 'src/ml_pipeline.py' primeiro para treinar os modelos.")
+    if modelo is None:
+        st.error(f"Erro: Nenhum modelo {granularidade} registrado para {regiao} em {REGISTRY_DIR}")
+        opcao = " --horario" if granularidade == 'horario' else ""
+        st.error(f"Por favor, rode 'src/ml_pipeline.py{opcao}' primeiro para treinar os modelos.")
         return None
         
-    model = xgb.XGBRegressor()
-    model.load_model(caminho_modelo)
-    return model
+    return modelo
 
 @st.cache_data
-def load_data():
-    """Carrega o master dataset processado."""
-    caminho_dados = DATA_PROCESSED_DIR / "master_dataset.csv"
-    if not caminho_dados.exists():
-        st.error(f"Erro: 'master_dataset.csv' não encontrado em {caminho_dados}")
+def load_data(granularidade='diario'):
+    """Carrega o master dataset processado (diário ou horário, já com tipos compactos)."""
+    caminho = MASTER_HORARIO_PARQUET if granularidade == 'horario' else MASTER_PARQUET
+    try:
+        # Só medido quando o cache do Streamlit não tem o dataset
+        with etapa("load_data") as medida:
+            df = load_master_dataset(caminho=caminho)
+            registrar_leitura(caminho)
+            medida.linhas_saida = len(df)
+    except FileNotFoundError:
+        st.error(f"Erro: master dataset não encontrado em {DATA_PROCESSED_DIR}")
         st.error("Por favor, rode 'src/data_processing.py' primeiro.")
         return None
-        
-    df = pd.read_csv(
-        caminho_dados, 
-        sep=';', 
-        decimal=',',
-        parse_dates=['ds']
-    )
+
     df = df.rename(columns={'População 2024': 'Populacao'})
     return df
 
+@st.cache_data
+def load_global_series(granularidade='diario'):
+    """Consumo real somado de todas as regiões por instante (calculado uma vez por granularidade)."""
+    df = load_data(granularidade)
+    with etapa("agregado_global", linhas_entrada=len(df)) as medida:
+        serie = df.groupby('ds', sort=True)['y'].sum().reset_index().rename(columns={'y': 'y_real'})
+        medida.linhas_saida = len(serie)
+    return serie
+
+@st.cache_data(max_entries=64)
+def load_global_view(granularidade, inicio, fim, pontos, metodo):
+    """Janela [inicio, fim] da série global, reduzida a ~'pontos' pontos para o gráfico.
+
+    Retorna (série reduzida, nº de pontos na janela, últimas linhas da janela). Cada
+    zoom (novo período) reduz só a janela pedida, com todo o detalhe que ela tem.
+    """
+    serie = load_global_series(granularidade)
+    ds = serie['ds'].to_numpy()
+    janela = serie.iloc[np.searchsorted(ds, np.datetime64(inicio)):np.searchsorted(ds, np.datetime64(fim), 'right')]
+    return downsample(janela, 'ds', ['y_real'], pontos, metodo), len(janela), janela.tail()
+
+def load_backtest(regiao, inicio, fim, granularidade='diario'):
+    """Previsões do modelo da região no período, lidas do prediction store.
+
+    O modelo só é executado se o store não tiver previsões para a versão atual do
+    modelo + dataset (ausente ou desatualizado); o resultado é gravado para as próximas vezes.
+    """
+    modelo = load_model(regiao, granularidade)
+    if modelo is None:
+        return None
+
+    chave = model_key(regiao, granularidade)
+    with etapa("load_backtest", regiao=regiao) as medida:
+        versao_dataset = dataset_hash(granularidade)
+        df_pred = load_predictions(chave, modelo.hash, versao_dataset, inicio, fim)
+        if df_pred is None:
+            df_regional = df_master[df_master['Região'] == regiao]
+            medida.linhas_entrada = len(df_regional)
+            X = df_regional[modelo.features].to_numpy(dtype=np.float32)
+            save_predictions(
+                chave, df_regional['ds'], df_regional['y'], predictor(modelo, X_verificacao=X)(X),
+                modelo.hash, versao_dataset
+            )
+            df_pred = load_predictions(chave, modelo.hash, versao_dataset, inicio, fim)
+        medida.linhas_saida = None if df_pred is None else len(df_pred)
+    return df_pred
+
 # --- 3. Interface do Dashboard ---
 
 st.title("💡 Otimizador de Consumo Energético")
 st.markdown("Dashboard de análise e previsão da demanda energética por região (Modelo V4: XGBoost-Only)")
 
+# Granularidade (o modo horário só aparece se o master horário já foi gerado)
+granularidades = {"Diária": 'diario'}
+if MASTER_HORARIO_PARQUET.exists():
+    granularidades["Horária"] = 'horario'
+with st.sidebar:
+    granularidade = granularidades[st.radio("Granularidade:", options=list(granularidades), horizontal=True)]
+
 # Carrega os dados
-df_master = load_data()
+df_master = load_data(granularidade)
 
 if df_master is not None:
     
@@ -71,41 +125,50 @@ if df_master is not None:
             "Selecione a Região:",
             options=regioes
         )
+        data_min, data_max = df_master['ds'].min().date(), df_master['ds'].max().date()
+        periodo = st.date_input(
+            "Período:",
+            value=(data_min, data_max),
+            min_value=data_min,
+            max_value=data_max
+        )
+        # Enquanto o usuário escolhe só a data inicial, usa o fim da série
+        inicio, fim = (periodo[0], periodo[-1]) if len(periodo) else (data_min, data_max)
+        # O fim inclui todas as horas do último dia (no modo horário)
+        inicio, fim = pd.Timestamp(inicio), pd.Timestamp(fim) + pd.Timedelta(days=1) - pd.Timedelta(1)
 
-    st.header(f"Análise de Performance: {regiao_selecionada}")
+        # O gráfico recebe ~1 ponto por pixel, escolhido no servidor dentro do período:
+        # estreitar o período (zoom) busca mais detalhe só daquela janela
+        pontos = st.slider("Pontos no gráfico:", min_value=200, max_value=5000, value=PONTOS_PADRAO, step=100)
+        metodos = {"LTTB (forma da curva)": 'lttb', "Mín/Máx por balde (picos)": 'minmax'}
+        metodo = metodos[st.radio("Redução:", options=list(metodos))]
 
-    # Define as features que o modelo precisa
-    features = [
-        'Temperatura', 'Umidade', 'Populacao', 'e_feriado', 
-        'dia_semana', 'dia_mes', 'semana_ano', 'mes', 'trimestre'
-    ]
+    st.header(f"Análise de Performance: {regiao_selecionada}")
 
     # --- Lógica de Plotagem ---
     
     fig, ax = plt.subplots(figsize=(15, 7))
     
     if regiao_selecionada == "Global (Todas as Regiões)":
-        df_plot = df_master.groupby('ds')['y'].sum().reset_index()
-        df_plot = df_plot.rename(columns={'y': 'y_real'})
-        df_plot['y_pred'] = None 
+        df_grafico, n_periodo, df_plot = load_global_view(granularidade, inicio, fim, pontos, metodo)
         st.info("Mostrando consumo real agregado para todas as regiões. A previsão é feita por região.")
         
         # Plota o Real Agregado
-        ax.plot(df_plot['ds'], df_plot['y_real'], label='Consumo Real (Agregado)', color='blue')
+        ax.plot(df_grafico['ds'], df_grafico['y_real'], label='Consumo Real (Agregado)', color='blue')
     
     else:
-        model = load_model(regiao_selecionada)
+        df_plot = load_backtest(regiao_selecionada, inicio, fim, granularidade)
         
-        if model:
-            df_plot = df_master[df_master['Região'] == regiao_selecionada].copy()
-            X_historical = df_plot[features]
-            df_plot['y_pred'] = model.predict(X_historical)
-            df_plot = df_plot.rename(columns={'y': 'y_real'})
+        if df_plot is not None:
+            n_periodo = len(df_plot)
+            with etapa("downsample", regiao=regiao_selecionada, linhas_entrada=n_periodo) as medida:
+                df_grafico = downsample(df_plot, 'ds', ['y_real', 'y_pred'], pontos, metodo)
+                medida.linhas_saida = len(df_grafico)
             
             # Plota o Real
-            ax.plot(df_plot['ds'], df_plot['y_real'], label='Valor Real', color='blue', alpha=0.8)
+            ax.plot(df_grafico['ds'], df_grafico['y_real'], label='Valor Real', color='blue', alpha=0.8)
             # Plota a Previsão
-            ax.plot(df_plot['ds'], df_plot['y_pred'], label='Previsão do Modelo (XGBoost)', color='red', linestyle='--')
+            ax.plot(df_grafico['ds'], df_grafico['y_pred'], label='Previsão do Modelo (XGBoost)', color='red', linestyle='--')
 
     # --- Configurações comuns do Gráfico ---
     ax.set_title(f"Consumo de Energia - {regiao_selecionada}")
@@ -114,6 +177,9 @@ if df_master is not None:
     ax.legend()
     ax.grid(True)
     st.pyplot(fig)
+    if df_plot is not None and len(df_grafico) < n_periodo:
+        st.caption(f"{len(df_grafico):,} de {n_periodo:,} pontos do período no gráfico (redução {metodo}). "
+                   "Reduza o período para ver mais detalhe.")
 
     st.markdown("---")
     
@@ -127,6 +193,10 @@ if df_master is not None:
     if regiao_selecionada == "Global (Todas as Regiões)":
         st.dataframe(df_plot[['ds', 'y_real']].tail())
         
-    # Se for uma região, mostra o dataframe completo (com features)
-    else:
-        st.dataframe(df_plot[['ds', 'y_real', 'y_pred'] + features].tail())
\ No newline at end of file
+    # Se for uma região, mostra o dataframe completo (com as features do modelo promovido,
+    # as mesmas do backtest: lags/eventos aparecem se o modelo foi treinado com eles)
+    elif df_plot is not None:
+        features = load_model(regiao_selecionada, granularidade).features
+        df_features = df_master.loc[df_master['Região'] == regiao_selecionada, ['ds'] + list(features)]
+        df_tail = df_plot[['ds', 'y_real', 'y_pred', 'residuo']].tail().merge(df_features, on='ds', how='left')
+        st.dataframe(df_tail)
\ No newline at end of file
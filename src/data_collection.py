@@ -1,81 +1,349 @@
-import requests
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
 import os
-from dotenv import load_dotenv  # <-- 1. IMPORTAR A BIBLIOTECA
+import time
+import math
+import random
+import hashlib
+import argparse
+import threading
 
-# --- 1. Configuração de Caminhos ---
-try:
-    BASE_DIR = Path(__file__).resolve().parent.parent
-except NameError:
-    BASE_DIR = Path(os.getcwd()).resolve()
-
-DATA_RAW_DIR = BASE_DIR / "data" / "raw"
-DATA_RAW_DIR.mkdir(parents=True, exist_ok=True)
-
-# --- 2. Carregar o .env ---
-print("Carregando variáveis de ambiente do arquivo .env...")
-load_dotenv(BASE_DIR / ".env")  # <-- 2. CARREGAR O ARQUIVO .env
+from config import DATA_RAW_DIR, load_env
+from instrumentation import get_logger, execucao, instrumentar, registrar_leitura
 
-# --- 3. Configuração da API ---
+log = get_logger("data_collection")
 
-# <-- 3. LER A CHAVE DO AMBIENTE (FORMA SEGURA)
-API_KEY = os.getenv("API_KEY") 
+# --- 1. Configuração de Caminhos ---
+NOTICIAS_CSV = DATA_RAW_DIR / "noticias_energia_raw.csv"   # Visão completa lida pelo nlp_analysis.ipynb
+NOTICIAS_DIR = DATA_RAW_DIR / "noticias"                    # Store append-only (um Parquet por coleta)
 
-if not API_KEY: # Se a chave não foi encontrada
-    print("ERRO: A variável 'API_KEY' não foi encontrada.")
-    print("Certifique-se de que ela existe no seu arquivo .env na raiz do projeto.")
-    exit()
+# --- 2. Configuração da API ---
+# A chave (API_KEY) só é lida do .env quando a coleta roda: importar o módulo não tem efeitos colaterais.
+NEWSAPI_URL = "https://newsapi.org/v2/everything"
 
-# Termos que queremos buscar
+# Termos que queremos buscar (uma consulta paginada por termo)
 KEYWORDS = [
     "apagão", "blecaute", "consumo de energia", "ANEEL", "ONS",
     "onda de calor", "frio intenso", "subestação", "linha de transmissão"
 ]
+FILTRO_REGIOES = "(Brasil OR Norte OR Nordeste OR Sul OR Sudeste)"
+
+TAMANHO_PAGINA = 100      # Máximo aceito pela NewsAPI
+MAX_PAGINAS = 5           # Por termo
+TENTATIVAS = 5            # Por página (429, 5xx e falhas de conexão)
+ESPERA_BASE = 1.0         # Segundos; dobra a cada tentativa (com jitter)
+ESPERA_MAXIMA = 60.0
+TIMEOUT = 30.0
+
+COLUNAS_CSV = ['publishedAt', 'source_name', 'title', 'description', 'content', 'url']
+COLUNAS_STORE = ['url_hash'] + COLUNAS_CSV + ['keyword', 'coletado_em']
+SCHEMA_STORE = pa.schema([(c, pa.string()) for c in COLUNAS_STORE])
+
+
+# --- 3. Store Append-Only (Deduplicado por Hash da URL) ---
+
+def url_hash(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+def list_lots(pasta=NOTICIAS_DIR):
+    return sorted(Path(pasta).glob("lote_*.parquet"))
+
+def load_news(pasta=NOTICIAS_DIR, columns=None):
+    """Todas as notícias do store (concatena os lotes; None se o store estiver vazio)."""
+    lotes = list_lots(pasta)
+    if not lotes:
+        return None
+    for lote in lotes:
+        registrar_leitura(lote)
+    return pa.concat_tables([pq.read_table(lote, columns=columns) for lote in lotes]).to_pandas()
+
+@instrumentar()
+def store_index(pasta=NOTICIAS_DIR):
+    """Hashes já armazenados e o 'publishedAt' mais recente (lê só essas duas colunas)."""
+    df = load_news(pasta, columns=['url_hash', 'publishedAt'])
+    if df is None or df.empty:
+        return set(), None
+    return set(df['url_hash']), df['publishedAt'].dropna().max()
 
-QUERY = " OR ".join(KEYWORDS)
+@instrumentar()
+def append_lot(df, pasta=NOTICIAS_DIR):
+    """Grava um novo lote (arquivo novo, escrita atômica); lotes anteriores nunca são reescritos."""
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    destino = pasta / f"lote_{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}_{time.time_ns() % 10**9:09d}.parquet"
+    temporario = pasta / f".{destino.name}.tmp"  # Prefixo '.': leitores ignoram arquivos incompletos
+    tabela = pa.Table.from_pandas(df.reindex(columns=COLUNAS_STORE), schema=SCHEMA_STORE, preserve_index=False)
+    pq.write_table(tabela, temporario)
+    os.replace(temporario, destino)
+    return destino
 
-url = (
-    f"https://newsapi.org/v2/everything?"
-    f"q=({QUERY}) AND (Brasil OR Norte OR Nordeste OR Sul OR Sudeste)"
-    f"&language=pt"
-    f"&sortBy=publishedAt"
-    f"&apiKey={API_KEY}" # <-- A chave é usada aqui
-)
+@instrumentar()
+def migrate_legacy_csv(caminho_csv=NOTICIAS_CSV, pasta=NOTICIAS_DIR):
+    """Importa o CSV das versões anteriores como primeiro lote (só quando o store está vazio)."""
+    if list_lots(pasta) or not Path(caminho_csv).exists():
+        return 0
+    df = pd.read_csv(caminho_csv, sep='|', dtype=str, encoding='utf-8').dropna(subset=['url'])
+    registrar_leitura(caminho_csv)
+    df = df.drop_duplicates('url')
+    df['url_hash'] = df['url'].map(url_hash)
+    append_lot(df, pasta)
+    log.info(f"✅ {len(df)} notícias do CSV existente importadas para o store ({pasta}).")
+    return len(df)
 
-print(f"Buscando notícias com a query: {QUERY}")
+@instrumentar()
+def export_csv(pasta=NOTICIAS_DIR, caminho_csv=NOTICIAS_CSV):
+    """Regrava o CSV '|' (mesmo formato de antes) com todo o conteúdo do store."""
+    df = load_news(pasta, columns=COLUNAS_CSV)
+    if df is None:
+        return None
+    df = df.sort_values('publishedAt', ascending=False, kind='stable')
+    temporario = Path(caminho_csv).with_suffix('.tmp')
+    df.to_csv(temporario, index=False, sep='|', encoding='utf-8')
+    os.replace(temporario, caminho_csv)
+    return caminho_csv
 
-# --- 4. Execução da Coleta ---
 
-def fetch_and_save_news():
+# --- 4. Requisições com Retentativas ---
+
+class Cadencia:
+    """Pausa compartilhada entre as threads: um 429 adia as próximas requisições de todas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ate = 0.0
+
+    def aguardar(self):
+        with self._lock:
+            espera = self._ate - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+
+    def pausar(self, segundos):
+        with self._lock:
+            self._ate = max(self._ate, time.monotonic() + segundos)
+
+def retry_after(resposta):
+    """Segundos pedidos pelo servidor no cabeçalho Retry-After (número ou data HTTP)."""
+    valor = resposta.headers.get('Retry-After')
+    if not valor:
+        return None
     try:
-        response = requests.get(url)
-        response.raise_for_status() 
-        
-        data = response.json()
-        articles = data.get('articles', [])
-        
-        if not articles:
-            print("Nenhum artigo encontrado para esta query.")
-            return
-
-        print(f"Sucesso! {len(articles)} artigos encontrados.")
-        
-        df_news = pd.DataFrame(articles)
-        df_news['source_name'] = df_news['source'].apply(lambda x: x.get('name'))
-        df_final = df_news[['publishedAt', 'source_name', 'title', 'description', 'content', 'url']]
-        
-        caminho_saida = DATA_RAW_DIR / "noticias_energia_raw.csv"
-        df_final.to_csv(caminho_saida, index=False, sep='|', encoding='utf-8')
-        
-        print(f"Notícias salvas com sucesso em: {caminho_saida}")
-
-    except requests.exceptions.HTTPError as http_err:
-        print(f"Erro HTTP: {http_err}")
-        print(f"Resposta da API: {response.text}")
-    except Exception as e:
-        print(f"Ocorreu um erro: {e}")
+        return max(0.0, float(valor))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def make_session(workers):
+    """Sessão com pool de conexões do tamanho do número de workers (keep-alive entre páginas)."""
+    import requests  # Só quem coleta paga o import (news_events e o CLI importam este módulo)
+    from requests.adapters import HTTPAdapter
+
+    sessao = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    sessao.mount("http://", adaptador)
+    sessao.mount("https://", adaptador)
+    return sessao
+
+def get_with_retry(sessao, url, params, headers, cadencia, tentativas=TENTATIVAS, espera_base=ESPERA_BASE):
+    """GET que repete em 429/5xx/falha de conexão, respeitando Retry-After (senão backoff exponencial)."""
+    import requests
+
+    for tentativa in range(tentativas):
+        cadencia.aguardar()
+        backoff = min(ESPERA_MAXIMA, espera_base * 2 ** tentativa) * (0.5 + random.random() / 2)
+        try:
+            resposta = sessao.get(url, params=params, headers=headers, timeout=TIMEOUT)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if tentativa == tentativas - 1:
+                raise
+            time.sleep(backoff)
+            continue
+
+        if resposta.status_code != 429 and resposta.status_code < 500:
+            return resposta
+        if tentativa == tentativas - 1:
+            return resposta
+
+        espera = retry_after(resposta)
+        espera = backoff if espera is None else min(espera, ESPERA_MAXIMA)
+        if resposta.status_code == 429:
+            cadencia.pausar(espera)
+        else:
+            time.sleep(espera)
+    return resposta
+
+def fetch_page(sessao, config, keyword, pagina, cadencia):
+    """Uma página de um termo: (artigos, totalResults, bytes recebidos), ou None se a API
+    não tem mais páginas para o plano."""
+    params = {
+        'q': f'"{keyword}" AND {FILTRO_REGIOES}',
+        'language': 'pt',
+        'sortBy': 'publishedAt',
+        'pageSize': config['tamanho_pagina'],
+        'page': pagina,
+    }
+    if config['desde']:
+        params['from'] = config['desde']
+    headers = {'X-Api-Key': config['api_key']} if config['api_key'] else {}
+
+    resposta = get_with_retry(sessao, config['base_url'], params, headers, cadencia,
+                              config['tentativas'], config['espera_base'])
+    if resposta.status_code in (400, 426):
+        # Plano gratuito: páginas além do limite de resultados voltam como 'maximumResultsReached'
+        try:
+            codigo = resposta.json().get('code')
+        except ValueError:
+            codigo = None
+        if codigo == 'maximumResultsReached':
+            return None
+    resposta.raise_for_status()
+    dados = resposta.json()
+    return dados.get('articles', []), int(dados.get('totalResults', 0)), len(resposta.content)
+
+
+# --- 5. Coleta Concorrente (Termo x Página) ---
+
+def to_records(artigos, keyword, coletado_em):
+    registros = []
+    for artigo in artigos:
+        url = artigo.get('url')
+        if not url:
+            continue
+        registros.append({
+            'url_hash': url_hash(url),
+            'publishedAt': artigo.get('publishedAt'),
+            'source_name': (artigo.get('source') or {}).get('name'),
+            'title': artigo.get('title'),
+            'description': artigo.get('description'),
+            'content': artigo.get('content'),
+            'url': url,
+            'keyword': keyword,
+            'coletado_em': coletado_em,
+        })
+    return registros
+
+@instrumentar()
+def collect(config, keywords=KEYWORDS, conhecidos=frozenset()):
+    """Busca todas as páginas de todos os termos em paralelo e devolve só os artigos novos.
+
+    A página 1 de cada termo informa o totalResults; as páginas seguintes (até
+    'max_paginas') entram na fila assim que ele chega. Artigos repetidos entre termos,
+    páginas ou coletas anteriores são descartados pelo hash da URL.
+    """
+    import requests
+
+    cadencia = Cadencia()
+    sessao = make_session(config['workers'])
+    coletado_em = pd.Timestamp.now(tz='UTC').strftime('%Y-%m-%dT%H:%M:%SZ')
+    vistos = set(conhecidos)
+    novos, requisicoes, falhas = [], 0, 0
+
+    with ThreadPoolExecutor(max_workers=config['workers']) as pool:
+        pendentes = {pool.submit(fetch_page, sessao, config, kw, 1, cadencia): (kw, 1) for kw in keywords}
+        while pendentes:
+            feitos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in feitos:
+                keyword, pagina = pendentes.pop(futuro)
+                requisicoes += 1
+                try:
+                    resultado = futuro.result()
+                except requests.exceptions.HTTPError as http_err:
+                    falhas += 1
+                    log.error(f"❌ '{keyword}' (página {pagina}): {http_err}")
+                    if http_err.response is not None and http_err.response.status_code == 401:
+                        log.error("Chave da API inválida; coleta interrompida.")
+                        for outro in pendentes:
+                            outro.cancel()
+                        pendentes.clear()
+                        break
+                    continue
+                except requests.exceptions.RequestException as erro:
+                    falhas += 1
+                    log.error(f"❌ '{keyword}' (página {pagina}): {erro}")
+                    continue
+                if resultado is None:
+                    continue
+
+                artigos, total, tamanho = resultado
+                registrar_leitura(tamanho)  # Na thread principal: conta na etapa 'collect'
+                for registro in to_records(artigos, keyword, coletado_em):
+                    if registro['url_hash'] not in vistos:
+                        vistos.add(registro['url_hash'])
+                        novos.append(registro)
+
+                if pagina == 1:
+                    paginas = min(config['max_paginas'], math.ceil(total / config['tamanho_pagina']))
+                    for proxima in range(2, paginas + 1):
+                        futuro_pagina = pool.submit(fetch_page, sessao, config, keyword, proxima, cadencia)
+                        pendentes[futuro_pagina] = (keyword, proxima)
+
+    sessao.close()
+    return pd.DataFrame(novos, columns=COLUNAS_STORE), requisicoes, falhas
+
+
+# --- 6. Execução da Coleta ---
+
+@execucao("data_collection")
+def fetch_and_save_news(base_url=None, workers=4, max_paginas=MAX_PAGINAS, tamanho_pagina=TAMANHO_PAGINA,
+                        tentativas=TENTATIVAS, espera_base=ESPERA_BASE, desde=None, pasta=NOTICIAS_DIR,
+                        caminho_csv=NOTICIAS_CSV):
+    """Coleta incremental: retoma do 'publishedAt' mais recente do store e grava só o que é novo.
+
+    'base_url' (ou a variável NEWSAPI_URL) permite apontar para um servidor local
+    que imite a NewsAPI, sem acesso à rede.
+    """
+    load_env()
+    api_key = os.getenv("API_KEY")
+    base_url = base_url or os.getenv("NEWSAPI_URL") or NEWSAPI_URL
+
+    if not api_key and base_url == NEWSAPI_URL:
+        log.error("ERRO: A variável 'API_KEY' não foi encontrada.")
+        log.error("Certifique-se de que ela existe no seu arquivo .env na raiz do projeto.")
+        return None
+
+    migrate_legacy_csv(caminho_csv, pasta)
+    conhecidos, mais_recente = store_index(pasta)
+    desde = desde or mais_recente
+    log.info(f"Buscando {len(KEYWORDS)} termos ({workers} workers, até {max_paginas} páginas cada) "
+             f"{'desde ' + desde if desde else 'sem data inicial'}...")
+
+    config = {
+        'base_url': base_url, 'api_key': api_key, 'workers': workers, 'max_paginas': max_paginas,
+        'tamanho_pagina': tamanho_pagina, 'tentativas': tentativas, 'espera_base': espera_base, 'desde': desde,
+    }
+    t0 = time.perf_counter()
+    df_novos, requisicoes, falhas = collect(config, KEYWORDS, conhecidos)
+    duracao = time.perf_counter() - t0
+
+    if df_novos.empty:
+        log.info(f"Nenhum artigo novo ({requisicoes} requisições, {falhas} falhas, {duracao:.1f}s).")
+    else:
+        lote = append_lot(df_novos, pasta)
+        log.info(f"✅ {len(df_novos)} artigos novos ({requisicoes} requisições, {falhas} falhas, {duracao:.1f}s) -> {lote.name}")
+
+    caminho = export_csv(pasta, caminho_csv)
+    if caminho is not None:
+        log.info(f"Notícias salvas com sucesso em: {caminho}")
+    return df_novos
 
 # --- Ponto de Entrada ---
+def cli(argv=None, prog=None):
+    """Linha de comando (também usada por 'peaksense collect')."""
+    parser = argparse.ArgumentParser(prog=prog, description="Coleta incremental e concorrente de notícias (NewsAPI)")
+    parser.add_argument("--base-url", default=None, help="Endpoint /v2/everything (ex.: servidor local de testes)")
+    parser.add_argument("--workers", type=int, default=4, help="Requisições simultâneas")
+    parser.add_argument("--paginas", type=int, default=MAX_PAGINAS, help="Máximo de páginas por termo")
+    parser.add_argument("--tamanho-pagina", type=int, default=TAMANHO_PAGINA, help="Artigos por página (máx. 100)")
+    parser.add_argument("--tentativas", type=int, default=TENTATIVAS, help="Tentativas por página (429/5xx)")
+    parser.add_argument("--desde", default=None, help="Data inicial (ISO); padrão: notícia mais recente do store")
+    args = parser.parse_args(argv)
+    fetch_and_save_news(args.base_url, args.workers, args.paginas, args.tamanho_pagina, args.tentativas, desde=args.desde)
+
 if __name__ == "__main__":
-    fetch_and_save_news()
\ No newline at end of file
+    cli()
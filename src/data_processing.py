@@ -1,64 +1,154 @@
 import pandas as pd
 import numpy as np
-import holidays  # Biblioteca para pegar feriados
 from pathlib import Path
-import os
+import argparse
+import hashlib
 import warnings
 
+from config import DATA_RAW_DIR, DATA_PROCESSED_DIR
+from calendar_features import attach_calendar
+from lag_features import add_lag_features, update_lag_features, LAG_COLUMNS
+from climate_ingestion import CLIMA_DIARIO_PARQUET, load_climate_daily
+from news_events import EVENTOS_DIARIOS_PARQUET, EVENT_COLUMNS, load_news_events
+from dataset_store import (
+    MASTER_PARQUET, MASTER_HORARIO_PARQUET, CONSUMO_AGG_PARQUET, ESTADO_INCREMENTAL, TIPOS_HORARIO,
+    optimize_dtypes, save_master_dataset, load_master_dataset, load_daily_view,
+    save_consumo_agg, load_consumo_agg, load_estado_incremental, save_estado_incremental,
+)
+from memory_report import RelatorioMemoria
+from instrumentation import get_logger, etapa, execucao, instrumentar, registrar_leitura
+
+log = get_logger("data_processing")
+
 # Ignorar avisos que podem aparecer durante a limpeza
 warnings.filterwarnings('ignore')
 
 # --- 1. Configuração de Caminhos ---
-# Define o diretório base do projeto (a pasta 'projeto/')
-# __file__ se refere a este arquivo (data_processing.py)
-BASE_DIR = Path(__file__).resolve().parent.parent
-DATA_RAW_DIR = BASE_DIR / "data" / "raw"
-DATA_PROCESSED_DIR = BASE_DIR / "data" / "processed"
+# Export horário da CCEE (mesmo layout do diário + coluna 'Hora')
+CONSUMO_HORARIO_CSV = DATA_RAW_DIR / "consumo_horario_por_regiao.csv"
 
-# Garante que a pasta 'processed' exista
-DATA_PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+# O export da CCEE traz o consumo com 3 casas decimais
+ESCALA_CONSUMO = 1000
 
-print(f"Diretório Base: {BASE_DIR}")
-print(f"Pasta Raw: {DATA_RAW_DIR}")
-print(f"Pasta Processed: {DATA_PROCESSED_DIR}")
+# Suba esta versão ao mudar as colunas/features do master dataset
+# (o processamento incremental faz rebuild completo quando ela muda)
+VERSAO_MASTER = 4
 
 
 # --- 2. Funções de Carga e Limpeza ---
 
-def load_raw_data():
-    """Carrega os 3 arquivos CSV da pasta raw."""
-    print("Carregando dados brutos...")
+@instrumentar()
+def load_raw_data(incluir_consumo=True, pasta=None):
+    """Carrega os 3 arquivos CSV da pasta raw (ou de 'pasta', com os mesmos nomes).
+
+    Com incluir_consumo=False o export da CCEE não é lido (ver load_consumo_chunked).
+    """
+    log.info("Carregando dados brutos...")
+    pasta = Path(pasta) if pasta is not None else DATA_RAW_DIR
     try:
-        df_consumo = pd.read_csv(
-            DATA_RAW_DIR / "consumo_historico_por_regiao.csv",
-            sep='\t', encoding='utf-16', decimal=','
-        )
+        df_consumo = None
+        if incluir_consumo:
+            df_consumo = pd.read_csv(
+                pasta / "consumo_historico_por_regiao.csv",
+                sep='\t', encoding='utf-16', decimal=','
+            )
+            registrar_leitura(pasta / "consumo_historico_por_regiao.csv")
         
         df_pop = pd.read_csv(
-            DATA_RAW_DIR / "crescimento_populacional_regioes_2020_2024.csv",
+            pasta / "crescimento_populacional_regioes_2020_2024.csv",
             sep=',', encoding='utf-8', decimal=','
         )
+        registrar_leitura(pasta / "crescimento_populacional_regioes_2020_2024.csv")
         # Remove a linha "Total/Brasil" se houver
         df_pop = df_pop[~df_pop['Região'].str.contains('Brasil|Total', case=False, na=False)]
 
         
         df_clima = pd.read_csv(
-            DATA_RAW_DIR / "medias_temperatura_umidade_2024.csv",
+            pasta / "medias_temperatura_umidade_2024.csv",
             sep=',', encoding='utf-8', decimal=','
         )
-        print("✅ Dados brutos carregados.")
+        registrar_leitura(pasta / "medias_temperatura_umidade_2024.csv")
+        log.info("✅ Dados brutos carregados.")
         return df_consumo, df_pop, df_clima
         
     except FileNotFoundError as e:
-        print(f"❌ ERRO: Arquivo não encontrado. {e}")
+        log.error(f"❌ ERRO: Arquivo não encontrado. {e}")
         return None, None, None
     except Exception as e:
-        print(f"❌ ERRO ao carregar dados: {e}")
+        log.error(f"❌ ERRO ao carregar dados: {e}")
         return None, None, None
 
+@instrumentar()
+def load_consumo_chunked(caminho=None, chunksize=500_000, por_hora=False, colunas_extras=()):
+    """Lê o export da CCEE em blocos e já devolve o consumo agregado por dia e região.
+
+    Só as colunas Data/Submercado/Consumo são lidas. O formato numérico brasileiro
+    ('2.331,865') é convertido pelo próprio parser C (thousands='.', decimal=','), sem
+    cópias de string. Cada bloco é reduzido a somas parciais por (Data, Submercado) e
+    somado a um agregado acumulado, então a memória depende do nº de grupos (dia, região),
+    não do nº de linhas brutas.
+
+    As somas são feitas em inteiros (milésimos de MWm, a precisão do export), o que as
+    torna exatas e independentes do tamanho do bloco. Retorna o mesmo formato do
+    df_consumo_agg de clean_data().
+
+    Com por_hora=True (export horário, com a coluna 'Hora'), agrega por (dia, hora,
+    região) e devolve também a coluna 'Hora' (0-23; exports com 1-24 são deslocados).
+    'colunas_extras' (ex.: ['Estado', 'Classe']) entram como chaves adicionais da agregação.
+    """
+    caminho = caminho or DATA_RAW_DIR / "consumo_historico_por_regiao.csv"
+    chaves = ['Data', 'Hora', 'Submercado'] if por_hora else ['Data', 'Submercado']
+    chaves += list(colunas_extras)
+    log.info(f"Lendo consumo em blocos de {chunksize:,} linhas...")
+    try:
+        leitor = pd.read_csv(
+            caminho, sep='\t', encoding='utf-16',
+            usecols=chaves + ['Consumo (MWm)'],
+            dtype={chave: 'category' for chave in chaves},
+            thousands='.', decimal=',', chunksize=chunksize
+        )
+        registrar_leitura(caminho)
+
+        acumulado = None
+        linhas = 0
+        for bloco in leitor:
+            linhas += len(bloco)
+            bloco['Consumo_Mil'] = np.rint(bloco['Consumo (MWm)'].to_numpy() * ESCALA_CONSUMO).astype('int64')
+            parcial = bloco.groupby(chaves, observed=True)['Consumo_Mil'].sum()
+            parcial.index = parcial.index.set_levels(
+                [lvl.astype(str) for lvl in parcial.index.levels]
+            )
+            acumulado = parcial if acumulado is None else acumulado.add(parcial, fill_value=0).astype('int64')
+
+        df_agg = acumulado.reset_index()
+        df_agg['Data'] = pd.to_datetime(df_agg['Data'], format='%d/%m/%Y')
+        df_agg['Região'] = df_agg['Submercado'].str.strip()
+        grupo = ['Data', 'Região']
+        if por_hora:
+            df_agg['Hora'] = df_agg['Hora'].astype('int8')
+            if df_agg['Hora'].min() == 1 and df_agg['Hora'].max() == 24:
+                df_agg['Hora'] -= 1
+            grupo.append('Hora')
+        for coluna in colunas_extras:
+            df_agg[coluna] = df_agg[coluna].str.strip()
+            grupo.append(coluna)
+        df_agg = df_agg.groupby(grupo)['Consumo_Mil'].sum().reset_index()
+        df_agg.insert(2, 'Ano', df_agg['Data'].dt.year)
+        df_agg.insert(3, 'Mes_Num', df_agg['Data'].dt.month)
+        df_agg['Consumo_Limpo'] = df_agg.pop('Consumo_Mil') / ESCALA_CONSUMO
+        log.info(f"✅ {linhas:,} linhas lidas -> {len(df_agg):,} grupos ({', '.join(grupo).lower()}).")
+        return df_agg
+    except FileNotFoundError as e:
+        log.error(f"❌ ERRO: Arquivo não encontrado. {e}")
+        return None
+    except Exception as e:
+        log.error(f"❌ ERRO ao ler consumo em blocos: {e}")
+        return None
+
+@instrumentar()
 def clean_data(df_consumo, df_pop, df_clima):
     """Limpa e formata os DataFrames."""
-    print("Iniciando limpeza...")
+    log.info("Iniciando limpeza...")
     
     # --- Limpando Consumo ---
     try:
@@ -72,11 +162,19 @@ def clean_data(df_consumo, df_pop, df_clima):
         
         # Agrega por dia e região
         df_consumo_agg = df_consumo.groupby(['Data', 'Região', 'Ano', 'Mes_Num'])['Consumo_Limpo'].sum().reset_index()
-        print("✅ df_consumo limpo e agregado por dia.")
+        log.info("✅ df_consumo limpo e agregado por dia.")
     except Exception as e:
-        print(f"❌ ERRO ao limpar df_consumo: {e}")
+        log.error(f"❌ ERRO ao limpar df_consumo: {e}")
         return None, None, None
 
+    df_pop, df_clima = clean_pop_clima(df_pop, df_clima)
+    if df_pop is None:
+        return None, None, None
+
+    return df_consumo_agg, df_pop, df_clima
+
+def clean_pop_clima(df_pop, df_clima):
+    """Limpa os DataFrames de população e clima (independente do consumo)."""
     # --- Limpando Clima ---
     try:
         df_clima['Temperatura'] = pd.to_numeric(df_clima['Temperatura (°C)'].str.replace(',', '.', regex=False), errors='coerce')
@@ -85,26 +183,27 @@ def clean_data(df_consumo, df_pop, df_clima):
         df_clima['Mes_Num'] = df_clima['Mês'].map(mapa_meses)
         df_clima['Ano'] = 2024 # Dado é de 2024
         df_clima['Região'] = df_clima['Região'].str.strip()
-        print("✅ df_clima limpo.")
+        log.info("✅ df_clima limpo.")
     except Exception as e:
-        print(f"❌ ERRO ao limpar df_clima: {e}")
-        return None, None, None
+        log.error(f"❌ ERRO ao limpar df_clima: {e}")
+        return None, None
 
     # --- Limpando População ---
     try:
         df_pop['Crescimento_Float'] = pd.to_numeric(df_pop['Crescimento (%)'].str.replace(',', '.', regex=False), errors='coerce')
         df_pop['Região'] = df_pop['Região'].str.strip()
         df_pop['Ano'] = 2024 # Dado é de 2024
-        print("✅ df_pop limpo.")
+        log.info("✅ df_pop limpo.")
     except Exception as e:
-        print(f"❌ ERRO ao limpar df_pop: {e}")
-        return None, None, None
+        log.error(f"❌ ERRO ao limpar df_pop: {e}")
+        return None, None
         
-    return df_consumo_agg, df_pop, df_clima
+    return df_pop, df_clima
 
+@instrumentar()
 def harmonize_regions(df_pop, df_clima):
     """Harmoniza as regiões de População e Clima para bater com Consumo."""
-    print("Harmonizando regiões...")
+    log.info("Harmonizando regiões...")
     
     # --- Harmonizando df_pop ---
     try:
@@ -114,9 +213,9 @@ def harmonize_regions(df_pop, df_clima):
         nova_linha_pop = {'Região': 'Sudeste/Centro-Oeste', 'População 2024': pop_se + pop_co, 'Ano': 2024}
         df_pop_harmonizado = df_pop[~df_pop['Região'].isin(['Sudeste', 'Centro-Oeste'])].copy()
         df_pop_harmonizado = pd.concat([df_pop_harmonizado, pd.DataFrame([nova_linha_pop])], ignore_index=True)
-        print("✅ df_pop harmonizado.")
+        log.info("✅ df_pop harmonizado.")
     except Exception as e:
-        print(f"❌ ERRO ao harmonizar df_pop: {e}")
+        log.error(f"❌ ERRO ao harmonizar df_pop: {e}")
         return None, None
 
     # --- Harmonizando df_clima (Média Ponderada) ---
@@ -139,9 +238,9 @@ def harmonize_regions(df_pop, df_clima):
         
         df_clima_harmonizado = df_clima[~df_clima['Região'].isin(['Sudeste', 'Centro-Oeste'])].copy()
         df_clima_harmonizado = pd.concat([df_clima_harmonizado, df_clima_seco], ignore_index=True)
-        print("✅ df_clima harmonizado.")
+        log.info("✅ df_clima harmonizado.")
     except Exception as e:
-        print(f"❌ ERRO ao harmonizar df_clima: {e}")
+        log.error(f"❌ ERRO ao harmonizar df_clima: {e}")
         return None, None
         
     return df_pop_harmonizado, df_clima_harmonizado
@@ -149,9 +248,17 @@ def harmonize_regions(df_pop, df_clima):
 
 # --- 3. Função de Engenharia de Features ---
 
-def create_features(df_consumo_agg, df_pop_harmonizado, df_clima_harmonizado):
-    """Junta tudo e cria as features de Sazonalidade e Feriados."""
-    print("Iniciando engenharia de features...")
+@instrumentar()
+def create_features(df_consumo_agg, df_pop_harmonizado, df_clima_harmonizado, df_clima_diario=None,
+                    df_eventos=None):
+    """Junta tudo e cria as features de Sazonalidade e Feriados.
+
+    Se houver clima diário das estações (climate_ingestion.py), ele substitui a média
+    mensal nos dias que cobre; os demais dias continuam com a média mensal.
+    Se houver a tabela de eventos das notícias (news_events.py), as contagens diárias
+    por Submercado entram como colunas (0 nos dias sem notícia).
+    """
+    log.info("Iniciando engenharia de features...")
     
     # --- Juntando (Merge) os dados ---
     # Seus dados de consumo são DIÁRIOS. Seus dados de clima são MENSAIS.
@@ -162,6 +269,26 @@ def create_features(df_consumo_agg, df_pop_harmonizado, df_clima_harmonizado):
         on=['Região', 'Ano', 'Mes_Num'],
         how='left'
     )
+
+    if df_clima_diario is not None:
+        df_master = pd.merge(
+            df_master,
+            df_clima_diario[['Data', 'Região', 'Temperatura', 'Umidade']].astype({'Região': str}),
+            on=['Data', 'Região'],
+            how='left',
+            suffixes=('', '_diaria')
+        )
+        for col in ['Temperatura', 'Umidade']:
+            df_master[col] = df_master.pop(f'{col}_diaria').fillna(df_master[col])
+    
+    if df_eventos is not None:
+        df_master = pd.merge(
+            df_master,
+            df_eventos[['Data', 'Região', *EVENT_COLUMNS]].astype({'Região': str}),
+            on=['Data', 'Região'],
+            how='left'
+        )
+        df_master[EVENT_COLUMNS] = df_master[EVENT_COLUMNS].fillna(0)
     
     # Agora juntamos a população (que é ANUAL)
     df_master = pd.merge(
@@ -172,22 +299,11 @@ def create_features(df_consumo_agg, df_pop_harmonizado, df_clima_harmonizado):
     )
     
     # --- Criando Features (Sazonalidade e Feriados) ---
-    print("Criando features de Sazonalidade e Feriados...")
+    log.info("Criando features de Sazonalidade e Feriados...")
     
-    # Sazonalidade (extraindo da data)
-    df_master['dia_semana'] = df_master['Data'].dt.dayofweek  # 0=Segunda, 6=Domingo
-    df_master['dia_mes'] = df_master['Data'].dt.day
-    df_master['semana_ano'] = df_master['Data'].dt.isocalendar().week
-    df_master['mes'] = df_master['Data'].dt.month
-    df_master['trimestre'] = df_master['Data'].dt.quarter
-    
-    # Feriados (Usando a biblioteca 'holidays')
-    # Pegando feriados nacionais do Brasil.
-    # NOTA: Para um modelo ideal, incluiríamos feriados estaduais.
-    feriados_br = holidays.country_holidays('BR')
-    
-    # Cria uma coluna 'e_feriado' (True se a data for feriado, False caso contrário)
-    df_master['e_feriado'] = df_master['Data'].apply(lambda x: x in feriados_br)
+    # Sazonalidade, feriados nacionais, emendas e feriados estaduais (por Submercado)
+    # vêm de uma tabela de calendário pré-computada e cacheada, juntada em um só merge.
+    df_master = attach_calendar(df_master)
     
     # Renomear colunas para o Prophet (ele exige 'ds' e 'y')
     df_master = df_master.rename(columns={
@@ -198,50 +314,316 @@ def create_features(df_consumo_agg, df_pop_harmonizado, df_clima_harmonizado):
     # Selecionar e ordenar colunas finais
     features_finais = [
         'ds', 'y', 'Região', 'Temperatura', 'Umidade', 'População 2024',
-        'e_feriado', 'dia_semana', 'dia_mes', 'semana_ano', 'mes', 'trimestre'
+        'e_feriado', 'dia_semana', 'dia_mes', 'semana_ano', 'mes', 'trimestre',
+        'e_ponte', 'feriado_estadual'
     ]
+    if df_eventos is not None:
+        features_finais += EVENT_COLUMNS
+    if 'Hora' in df_master.columns:
+        features_finais.append('Hora')
     df_master_final = df_master[features_finais]
     
-    print("✅ Master Dataset criado!")
+    log.info("✅ Master Dataset criado!")
     return df_master_final
 
 
-# --- 4. Função Principal (Main) ---
+# --- 4. Processamento Incremental (Watermark + Digests por Dia) ---
+
+def hash_arquivos(caminhos):
+    """Hash SHA-256 do conteúdo de um conjunto de arquivos."""
+    h = hashlib.sha256()
+    for caminho in caminhos:
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloco)
+    return h.hexdigest()
+
+def hash_auxiliares():
+    """Hash dos CSVs de população e clima (e dos artefatos diários opcionais): se mudarem, todos os dias são refeitos."""
+    caminhos = [
+        DATA_RAW_DIR / "crescimento_populacional_regioes_2020_2024.csv",
+        DATA_RAW_DIR / "medias_temperatura_umidade_2024.csv",
+    ]
+    for artefato in (CLIMA_DIARIO_PARQUET, EVENTOS_DIARIOS_PARQUET):
+        if artefato.exists():
+            caminhos.append(artefato)
+    return hash_arquivos(caminhos)
+
+def digest_por_dia(df_consumo):
+    """Impressão digital das linhas brutas de cada dia (formato {'AAAA-MM-DD': digest}).
+
+    A soma dos hashes por linha (uint64, com overflow) não depende da ordem das
+    linhas no arquivo, então só muda se alguma linha do dia for incluída/alterada/removida.
+    """
+    hashes = pd.util.hash_pandas_object(df_consumo, index=False)
+    grupos = hashes.groupby(df_consumo['Data'].to_numpy())
+    soma, contagem = grupos.sum(), grupos.size()
+    datas = pd.to_datetime(soma.index, format='%d/%m/%Y').strftime('%Y-%m-%d')
+    return {d: f"{s:016x}-{n}" for d, s, n in zip(datas, soma.to_numpy(), contagem.to_numpy())}
+
+def build_master(df_consumo, df_pop, df_clima, df_consumo_agg=None):
+    """Passos 2 a 4 (limpar, harmonizar, features). Retorna (df_consumo_agg, df_master).
+
+    Se df_consumo_agg já vier pronto (leitura em blocos), só população e clima são limpos.
+    """
+    if df_consumo_agg is None:
+        df_consumo_agg, df_pop, df_clima = clean_data(df_consumo, df_pop, df_clima)
+    else:
+        df_pop, df_clima = clean_pop_clima(df_pop, df_clima)
+    if df_consumo_agg is None or df_pop is None:
+        return None, None
+
+    df_pop_harmonizado, df_clima_harmonizado = harmonize_regions(df_pop, df_clima)
+    if df_pop_harmonizado is None:
+        return None, None
+
+    df_master = create_features(df_consumo_agg, df_pop_harmonizado, df_clima_harmonizado,
+                                load_climate_daily(), load_news_events())
+    return df_consumo_agg, df_master
+
+def _salvar_estado(digests):
+    """Grava watermark (último 'Data' processado), digests por dia e hash dos auxiliares."""
+    save_estado_incremental({
+        'watermark': max(digests) if digests else None,
+        'digests': digests,
+        'hash_auxiliares': hash_auxiliares(),
+        'versao_master': VERSAO_MASTER,
+    })
+
+@execucao("data_processing")
+def process_incremental(exportar_csv=False, verificar=False):
+    """Processa apenas os dias novos/alterados desde a última execução.
+
+    Cai no rebuild completo se não houver estado salvo, se clima/população mudaram
+    ou se a versão do master dataset (VERSAO_MASTER) mudou.
+    Com verificar=True, compara o resultado com um rebuild completo em memória.
+    """
+    log.info("--- INICIANDO PROCESSAMENTO INCREMENTAL ---")
+
+    estado = load_estado_incremental()
+    if (estado is None or estado.get('hash_auxiliares') != hash_auxiliares()
+            or estado.get('versao_master') != VERSAO_MASTER
+            or not MASTER_PARQUET.exists() or not CONSUMO_AGG_PARQUET.exists()):
+        log.info("ℹ️ Sem estado incremental válido (ou clima/população/versão mudaram). Fazendo rebuild completo.")
+        return main(exportar_csv=exportar_csv)
 
-def main():
-    """Orquestra todo o pipeline de processamento de dados."""
-    print("--- INICIANDO PIPELINE DE PROCESSAMENTO DE DADOS ---")
-    
-    # Passo 1: Carregar
     df_consumo, df_pop, df_clima = load_raw_data()
     if df_consumo is None:
         return
 
-    # Passo 2: Limpar
-    df_consumo_agg, df_pop, df_clima = clean_data(df_consumo, df_pop, df_clima)
-    if df_consumo_agg is None:
+    with etapa("digest_por_dia", linhas_entrada=len(df_consumo)) as medida:
+        digests = digest_por_dia(df_consumo)
+        medida.linhas_saida = len(digests)
+    antigos = estado['digests']
+    novos = sorted(d for d in digests if d not in antigos)
+    alterados = sorted(d for d in digests if d in antigos and antigos[d] != digests[d])
+    removidos = sorted(set(antigos) - set(digests))
+
+    log.info(f"Watermark anterior: {estado['watermark']}")
+    log.info(f"Dias novos: {len(novos)} | alterados: {len(alterados)} | removidos: {len(removidos)}")
+    if not (novos or alterados or removidos):
+        log.info("✅ Nada a processar: master dataset já está atualizado.")
         return
 
-    # Passo 3: Harmonizar
+    # Só os dias afetados passam por limpeza, agregação e features
+    datas_afetadas = novos + alterados
+    datas_brutas = set(pd.to_datetime(datas_afetadas).strftime('%d/%m/%Y'))
+    df_delta = df_consumo[df_consumo['Data'].isin(datas_brutas)].copy()
+
+    df_agg_delta, df_master_delta = None, None
+    if len(df_delta):
+        df_agg_delta, df_master_delta = build_master(df_delta, df_pop.copy(), df_clima.copy())
+        if df_master_delta is None:
+            return
+
+    # Substitui os dias afetados/removidos nos stores já processados
+    descartar = pd.to_datetime(datas_afetadas + removidos)
+    df_agg = load_consumo_agg()
+    df_agg = df_agg[~df_agg['Data'].isin(descartar)]
+    df_master = load_master_dataset()
+    df_master = df_master[~df_master['ds'].isin(descartar)].astype({'Região': str})
+    if df_master_delta is not None:
+        df_agg = pd.concat([df_agg, df_agg_delta], ignore_index=True)
+
+    # Defasagens só olham para trás: as linhas antes do primeiro dia afetado ficam como
+    # estão, e só a cauda (desse dia em diante) é recalculada, com os HISTORICO_NECESSARIO
+    # dias anteriores de cada região como contexto
+    corte = descartar.min()
+    df_historico = df_master[df_master['ds'] < corte]
+    df_cauda = df_master[df_master['ds'] >= corte].drop(columns=LAG_COLUMNS)
+    if df_master_delta is not None:
+        df_cauda = pd.concat([df_cauda, df_master_delta], ignore_index=True)
+    with etapa("update_lag_features", linhas_entrada=len(df_cauda)) as medida:
+        df_cauda = update_lag_features(df_historico, df_cauda)
+        medida.linhas_saida = len(df_cauda)
+    df_master = pd.concat([df_historico, df_cauda], ignore_index=True)
+
+    with etapa("save_master_dataset", linhas_entrada=len(df_master)):
+        save_consumo_agg(df_agg)
+        caminho_saida = save_master_dataset(df_master, exportar_csv=exportar_csv)
+        _salvar_estado(digests)
+
+    log.info("\n--- SUCESSO! ---")
+    log.info(f"Master Dataset atualizado em: {caminho_saida} (watermark: {max(digests)})")
+
+    if verificar:
+        verificar_rebuild_completo()
+
+def verificar_rebuild_completo():
+    """Confere se o master dataset salvo é idêntico a um rebuild completo em memória."""
+    log.info("Verificando contra rebuild completo...")
+    df_consumo, df_pop, df_clima = load_raw_data()
+    _, df_completo = build_master(df_consumo, df_pop, df_clima)
+    df_completo = add_lag_features(df_completo)
+
+    ordenar = lambda df: df.sort_values(['Região', 'ds']).reset_index(drop=True)
+    df_salvo = ordenar(load_master_dataset())
+    df_completo = ordenar(optimize_dtypes(df_completo))
+    pd.testing.assert_frame_equal(df_salvo, df_completo)
+    log.info("✅ Incremental idêntico ao rebuild completo.")
+
+
+# --- 5. Modo Horário (Tipos Compactos) ---
+
+@instrumentar()
+def create_features_horario(df_consumo_h, df_pop_harmonizado, df_clima_harmonizado):
+    """Master horário: as mesmas features do diário + 'hora', com tipos compactos.
+
+    'ds' passa a ser o início de cada hora. O calendário (feriados, emendas...) é o do dia.
+    """
+    df_master = create_features(df_consumo_h, df_pop_harmonizado, df_clima_harmonizado,
+                                load_climate_daily(), load_news_events())
+    df_master['ds'] = df_master['ds'] + pd.to_timedelta(df_master['Hora'], unit='h')
+    df_master = df_master.rename(columns={'Hora': 'hora'})
+    return optimize_dtypes(df_master, TIPOS_HORARIO)
+
+@execucao("data_processing_horario")
+def main_horario(caminho=None, chunksize=500_000):
+    """Pipeline horário (leitura em blocos), com relatório de memória por etapa.
+
+    Salva master_horario.parquet; a visão diária é derivada dele (load_daily_view).
+    """
+    log.info("--- INICIANDO PIPELINE HORÁRIO ---")
+    relatorio = RelatorioMemoria("pipeline horário")
+    relatorio.registrar("0. início")
+
+    # Passo 1: Consumo agregado por (dia, hora, região), já em tipos compactos
+    df_consumo_h = load_consumo_chunked(caminho or CONSUMO_HORARIO_CSV, chunksize=chunksize, por_hora=True)
+    if df_consumo_h is None:
+        return
+    df_consumo_h = df_consumo_h.astype({'Região': 'category', 'Ano': 'int16', 'Mes_Num': 'int8',
+                                        'Consumo_Limpo': 'float32'})
+    relatorio.registrar("1. consumo agregado", df_consumo_h)
+
+    # Passo 2: População e clima (pequenos)
+    _, df_pop, df_clima = load_raw_data(incluir_consumo=False)
+    if df_pop is None:
+        return
+    df_pop, df_clima = clean_pop_clima(df_pop, df_clima)
+    if df_pop is None:
+        return
     df_pop_harmonizado, df_clima_harmonizado = harmonize_regions(df_pop, df_clima)
     if df_pop_harmonizado is None:
         return
 
-    # Passo 4: Criar Features e Master Dataset
-    df_master = create_features(df_consumo_agg, df_pop_harmonizado, df_clima_harmonizado)
+    # Passo 3: Features
+    df_master_h = create_features_horario(df_consumo_h, df_pop_harmonizado, df_clima_harmonizado)
+    del df_consumo_h
+    relatorio.registrar("2. master horário", df_master_h)
+
+    # Passo 4: Salvar e derivar a visão diária
+    with etapa("save_master_dataset", linhas_entrada=len(df_master_h)):
+        caminho_saida = save_master_dataset(df_master_h, MASTER_HORARIO_PARQUET, tipos=TIPOS_HORARIO)
+    del df_master_h
+    relatorio.registrar("3. master horário salvo")
+    relatorio.registrar("4. master horário relido", load_master_dataset(caminho=caminho_saida))
+    relatorio.registrar("5. visão diária derivada", load_daily_view(caminho_saida))
+
+    log.info("\n--- SUCESSO! ---")
+    log.info(f"Master horário salvo em: {caminho_saida}")
+    relatorio.imprimir()
+    return relatorio
+
+
+# --- 6. Função Principal (Main) ---
+
+@execucao("data_processing")
+def main(exportar_csv=False, chunksize=None):
+    """Orquestra todo o pipeline de processamento de dados.
+
+    Com chunksize, o export da CCEE é lido em blocos (memória limitada pelo nº de
+    grupos dia/região) em vez de carregado inteiro.
+    """
+    log.info("--- INICIANDO PIPELINE DE PROCESSAMENTO DE DADOS ---")
+    log.info(f"Pasta Raw: {DATA_RAW_DIR}")
+    log.info(f"Pasta Processed: {DATA_PROCESSED_DIR}")
+
+    # Passo 1: Carregar
+    df_consumo_agg, digests = None, None
+    if chunksize:
+        df_consumo_agg = load_consumo_chunked(chunksize=chunksize)
+        if df_consumo_agg is None:
+            return
+        df_consumo, df_pop, df_clima = load_raw_data(incluir_consumo=False)
+        if df_pop is None:
+            return
+    else:
+        df_consumo, df_pop, df_clima = load_raw_data()
+        if df_consumo is None:
+            return
+
+        # Digests calculados antes da limpeza (clean_data altera o DataFrame bruto)
+        with etapa("digest_por_dia", linhas_entrada=len(df_consumo)) as medida:
+            digests = digest_por_dia(df_consumo)
+            medida.linhas_saida = len(digests)
+
+    # Passos 2 a 4: Limpar, Harmonizar, Criar Features e Master Dataset
+    df_consumo_agg, df_master = build_master(df_consumo, df_pop, df_clima, df_consumo_agg)
     if df_master is None:
         return
 
-    # Passo 5: Salvar o resultado
-    caminho_saida = DATA_PROCESSED_DIR / "master_dataset.csv"
-    df_master.to_csv(caminho_saida, index=False, sep=';', decimal=',')
+    # Passo 4b: Defasagens e janelas móveis de 'y' (sinal autorregressivo)
+    with etapa("add_lag_features", linhas_entrada=len(df_master)) as medida:
+        df_master = add_lag_features(df_master)
+        medida.linhas_saida = len(df_master)
+
+    # Passo 5: Salvar o resultado (Parquet tipado; CSV só se pedido)
+    with etapa("save_master_dataset", linhas_entrada=len(df_master)):
+        caminho_saida = save_master_dataset(df_master, exportar_csv=exportar_csv)
+
+        # Passo 6: Guardar agregados e estado para as próximas execuções incrementais
+        save_consumo_agg(df_consumo_agg)
+        if digests is not None:
+            _salvar_estado(digests)
+        else:
+            # Sem digests por dia (leitura em blocos): o próximo incremental fará rebuild completo
+            ESTADO_INCREMENTAL.unlink(missing_ok=True)
     
-    print(f"\n--- SUCESSO! ---")
-    print(f"Master Dataset salvo em: {caminho_saida}")
-    print("Primeiras 5 linhas do dataset final:")
-    print(df_master.head())
+    log.info("\n--- SUCESSO! ---")
+    log.info(f"Master Dataset salvo em: {caminho_saida}")
+    log.info("Primeiras 5 linhas do dataset final:")
+    log.info(df_master.head().to_string())
 
 
 # --- Ponto de Entrada: Executa o 'main' se o script for chamado diretamente ---
+def cli(argv=None, prog=None):
+    """Linha de comando (também usada por 'peaksense process')."""
+    parser = argparse.ArgumentParser(prog=prog, description="Pipeline de processamento de dados")
+    parser.add_argument("--csv", action="store_true", help="Também exporta master_dataset.csv")
+    parser.add_argument("--incremental", action="store_true", help="Processa só os dias novos/alterados")
+    parser.add_argument("--verificar", action="store_true", help="Confere o incremental contra um rebuild completo")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Lê o export da CCEE em blocos de N linhas (memória limitada)")
+    parser.add_argument("--horario", action="store_true",
+                        help="Processa o export horário (master_horario.parquet + relatório de memória)")
+    parser.add_argument("--arquivo-horario", default=None, help=f"Export horário (padrão: {CONSUMO_HORARIO_CSV.name})")
+    args = parser.parse_args(argv)
+    if args.horario:
+        main_horario(args.arquivo_horario, chunksize=args.chunksize or 500_000)
+    elif args.incremental:
+        process_incremental(exportar_csv=args.csv, verificar=args.verificar)
+    else:
+        main(exportar_csv=args.csv, chunksize=args.chunksize)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    cli()
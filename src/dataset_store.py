@@ -0,0 +1,169 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+import json
+
+from config import DATA_PROCESSED_DIR
+from lag_features import LAG_COLUMNS
+from news_events import EVENT_COLUMNS
+
+# --- 1. Configuração de Caminhos ---
+MASTER_PARQUET = DATA_PROCESSED_DIR / "master_dataset.parquet"
+MASTER_CSV = DATA_PROCESSED_DIR / "master_dataset.csv"
+MASTER_HORARIO_PARQUET = DATA_PROCESSED_DIR / "master_horario.parquet"
+CONSUMO_AGG_PARQUET = DATA_PROCESSED_DIR / "consumo_agg.parquet"
+ESTADO_INCREMENTAL = DATA_PROCESSED_DIR / "estado_incremental.json"
+
+# Tipos compactos do master dataset (o CSV perdia tudo isso a cada leitura)
+COLUNAS_CALENDARIO = ['dia_semana', 'dia_mes', 'semana_ano', 'mes', 'trimestre']
+TIPOS_MASTER = {
+    'y': 'float64',
+    'Temperatura': 'float64',
+    'Umidade': 'float64',
+    'População 2024': 'float64',  # Só existe para 2024: NaN nos outros anos
+    'e_feriado': 'bool',
+    'e_ponte': 'bool',
+    'feriado_estadual': 'float64',
+    **{col: 'float64' for col in LAG_COLUMNS},
+    **{col: 'int16' for col in EVENT_COLUMNS},
+    **{col: 'int8' for col in COLUNAS_CALENDARIO},
+}
+
+# O modo horário tem 24x as linhas: medidas e população em float32
+# (os valores da CCEE têm 3 casas decimais; float32 guarda ~7 dígitos significativos)
+TIPOS_HORARIO = {
+    'y': 'float32',
+    'Temperatura': 'float32',
+    'Umidade': 'float32',
+    'População 2024': 'float32',
+    'e_feriado': 'bool',
+    'e_ponte': 'bool',
+    'feriado_estadual': 'float32',
+    'hora': 'int8',
+    **{col: 'int16' for col in EVENT_COLUMNS},
+    **{col: 'int8' for col in COLUNAS_CALENDARIO},
+}
+
+
+# --- 2. Tipagem ---
+
+def optimize_dtypes(df, tipos=TIPOS_MASTER):
+    """Converte o master dataset para os tipos compactos (Região categórica, calendário int8)."""
+    df = df.copy()
+    for col, tipo in tipos.items():
+        if col in df.columns:
+            df[col] = df[col].astype(tipo)
+    if 'Região' in df.columns:
+        df['Região'] = df['Região'].astype('category')
+    if 'ds' in df.columns:
+        df['ds'] = pd.to_datetime(df['ds'])
+    return df
+
+
+# --- 3. Escrita ---
+
+def save_master_dataset(df, caminho=MASTER_PARQUET, exportar_csv=False, tipos=TIPOS_MASTER):
+    """Salva o master dataset em Parquet, com um row group por região.
+
+    Um row group por região permite que os leitores carreguem só a(s) região(ões)
+    pedida(s) sem decodificar o resto do arquivo. O CSV é apenas uma exportação opcional.
+    """
+    df = optimize_dtypes(df, tipos)
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+
+    df = df.sort_values(['Região', 'ds'], kind='stable').reset_index(drop=True)
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+
+    with pq.ParquetWriter(caminho, tabela.schema) as writer:
+        for regiao in df['Região'].cat.categories:
+            mascara = pa.array((df['Região'] == regiao).to_numpy())
+            parte = tabela.filter(mascara)
+            if parte.num_rows:
+                writer.write_table(parte)
+
+    if exportar_csv:
+        df.sort_values(['ds', 'Região'], kind='stable').to_csv(
+            MASTER_CSV, index=False, sep=';', decimal=','
+        )
+
+    return caminho
+
+
+# --- 4. Leitura ---
+
+def load_master_dataset(columns=None, regioes=None, caminho=MASTER_PARQUET):
+    """Lê o master dataset via memory-map, opcionalmente só algumas colunas/regiões.
+
+    Se o Parquet ainda não existir, cai no CSV legado (mais lento).
+    """
+    caminho = Path(caminho)
+    if isinstance(regioes, str):
+        regioes = [regioes]
+
+    if caminho.exists():
+        filtros = [('Região', 'in', list(regioes))] if regioes else None
+        tabela = pq.read_table(caminho, columns=columns, filters=filtros, memory_map=True)
+        return tabela.to_pandas()
+
+    if not MASTER_CSV.exists():
+        raise FileNotFoundError(f"Nem {caminho.name} nem {MASTER_CSV.name} existem em {caminho.parent}")
+
+    df = pd.read_csv(MASTER_CSV, sep=';', decimal=',', parse_dates=['ds'])
+    if regioes:
+        df = df[df['Região'].isin(regioes)]
+    if columns:
+        df = df[columns]
+    return optimize_dtypes(df)
+
+
+def load_daily_view(caminho=MASTER_HORARIO_PARQUET, regioes=None):
+    """Visão diária derivada do master horário (mesmo formato do master diário, sem 'hora').
+
+    'y' é a média das horas do dia: o consumo está em MWm (MW médios), então a média
+    horária é o MWm do dia. As demais colunas são constantes dentro do dia.
+    """
+    df = load_master_dataset(regioes=regioes, caminho=caminho)
+    dia = df['ds'].dt.normalize()
+    grupos = df.drop(columns=['ds', 'hora', 'Região']).groupby(
+        [df['Região'], dia.rename('ds')], observed=True, sort=True
+    )
+    df_diario = grupos.first()
+    df_diario['y'] = grupos['y'].mean()
+    df_diario = df_diario.reset_index()
+    return df_diario[['ds', 'y', 'Região'] + [c for c in df_diario.columns if c not in ('ds', 'y', 'Região')]]
+
+
+# --- 5. Armazenamento Incremental ---
+# Agregados diários por Submercado já calculados + watermark/digests por dia,
+# para que o processamento incremental só refaça os dias novos ou alterados.
+
+def save_consumo_agg(df_consumo_agg, caminho=CONSUMO_AGG_PARQUET):
+    """Salva os agregados diários por região (saída do clean_data)."""
+    df = df_consumo_agg.sort_values(['Data', 'Região'], kind='stable').reset_index(drop=True)
+    Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(caminho, index=False)
+    return caminho
+
+
+def load_consumo_agg(caminho=CONSUMO_AGG_PARQUET):
+    """Lê os agregados diários por região já processados."""
+    return pd.read_parquet(caminho, memory_map=True)
+
+
+def load_estado_incremental(caminho=ESTADO_INCREMENTAL):
+    """Lê o estado do processamento incremental (None se não houver)."""
+    caminho = Path(caminho)
+    if not caminho.exists():
+        return None
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_estado_incremental(estado, caminho=ESTADO_INCREMENTAL):
+    """Grava o estado do processamento incremental."""
+    Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, indent=2, sort_keys=True)
+    return caminho
@@ -0,0 +1,94 @@
+import numpy as np
+
+# --- 1. Configuração ---
+
+# Pontos desenhados por padrão: ~1 por pixel da figura do dashboard (15" x 100 dpi)
+PONTOS_PADRAO = 1500
+METODOS = ('lttb', 'minmax')
+
+
+def _eixo_numerico(x):
+    """Eixo x como float64 (datas viram nanossegundos), para as áreas do LTTB."""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+# --- 2. Seleção de Pontos (Índices) ---
+
+def lttb_indices(x, y, pontos):
+    """Largest-Triangle-Three-Buckets: índices de 'pontos' amostras que preservam a forma.
+
+    Mantém o primeiro e o último ponto; em cada um dos pontos-2 baldes do meio escolhe
+    a amostra que forma o maior triângulo com a escolhida no balde anterior e a média
+    do balde seguinte. Picos e vales sobrevivem, ao contrário de uma média ou de um
+    passo fixo. NaN em y são ignorados.
+    """
+    n = len(y)
+    if pontos >= n or pontos < 3:
+        return np.arange(n)
+    x, y = _eixo_numerico(x), np.asarray(y, dtype=np.float64)
+    validos = ~np.isnan(y)
+    if not validos.all():
+        return np.flatnonzero(validos)[lttb_indices(x[validos], y[validos], pontos)]
+
+    limites = np.linspace(1, n - 1, pontos - 1).astype(np.int64)  # pontos-2 baldes em [1, n-1)
+    escolhidos = np.empty(pontos, dtype=np.int64)
+    escolhidos[0], escolhidos[-1] = 0, n - 1
+    anterior = 0
+    for i in range(pontos - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        # Média do balde seguinte (o último ponto, no último balde)
+        prox_inicio, prox_fim = fim, limites[i + 2] if i + 2 < len(limites) else n
+        media_x, media_y = x[prox_inicio:prox_fim].mean(), y[prox_inicio:prox_fim].mean()
+        # Dobro da área do triângulo (anterior, candidato, média) para cada candidato do balde
+        areas = np.abs((x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+                       - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior]))
+        anterior = inicio + int(np.argmax(areas))
+        escolhidos[i + 1] = anterior
+    return escolhidos
+
+def minmax_indices(y, pontos):
+    """Mínimo e máximo de cada balde (pontos/2 baldes de largura igual), em ordem temporal.
+
+    Garante que nenhum pico ou vale some na redução (o desenho de cada "pixel" cobre a
+    faixa inteira de valores do balde). Vetorizado: um único lexsort por (balde, y).
+    Pode devolver até 2 pontos a mais (o primeiro e o último da série).
+    """
+    n = len(y)
+    baldes = max(1, pontos // 2)
+    if baldes * 2 >= n:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    validos = np.flatnonzero(~np.isnan(y))
+    if not len(validos):
+        return validos
+    balde = validos * baldes // n
+    ordem = validos[np.lexsort((y[validos], balde))]  # Dentro de cada balde, do menor ao maior y
+    balde_ordenado = ordem * baldes // n
+    primeiros = np.flatnonzero(np.r_[True, balde_ordenado[1:] != balde_ordenado[:-1]])
+    ultimos = np.r_[primeiros[1:] - 1, len(ordem) - 1]
+    # Primeiro e último pontos sempre entram: o traço cobre o período inteiro
+    return np.unique(np.concatenate([validos[[0, -1]], ordem[primeiros], ordem[ultimos]]))
+
+
+# --- 3. DataFrames ---
+
+def downsample(df, coluna_x, colunas_y, pontos=PONTOS_PADRAO, metodo='lttb'):
+    """Reduz df (ordenado por coluna_x) a ~'pontos' linhas por série de colunas_y.
+
+    Os índices escolhidos para cada série são unidos, então as séries continuam
+    alinhadas no mesmo x (ex.: real e previsto) e cada uma preserva os próprios picos.
+    Retorna o DataFrame reduzido (o próprio df se já for pequeno o bastante).
+    """
+    if metodo not in METODOS:
+        raise ValueError(f"Método de redução inválido: {metodo} (use {', '.join(METODOS)})")
+    if len(df) <= pontos:
+        return df
+    x = df[coluna_x].to_numpy()
+    indices = []
+    for coluna in colunas_y:
+        y = df[coluna].to_numpy(dtype=np.float64, na_value=np.nan)
+        indices.append(lttb_indices(x, y, pontos) if metodo == 'lttb' else minmax_indices(y, pontos))
+    return df.iloc[np.unique(np.concatenate(indices))]
@@ -0,0 +1,184 @@
+import pandas as pd
+import numpy as np
+import time
+import argparse
+import warnings
+
+from config import DATA_PROCESSED_DIR
+from calendar_features import calendar_long, ESTADOS_POR_SUBMERCADO
+from data_processing import load_raw_data, clean_pop_clima, harmonize_regions
+from dataset_store import load_master_dataset
+from model_registry import ModelRegistry
+from lag_features import EstadoLags, LAG_COLUMNS
+from news_events import EVENT_COLUMNS
+from tree_inference import predictor
+from instrumentation import get_logger
+
+# Ignorar avisos
+warnings.filterwarnings('ignore')
+
+log = get_logger("forecasting")
+
+# --- 1. Configuração de Caminhos ---
+FORECAST_PARQUET = DATA_PROCESSED_DIR / "forecast.parquet"
+
+
+# --- 2. Entradas Exógenas (Clima e População) ---
+
+def load_exogenous():
+    """Clima mensal e população por Submercado, já harmonizados (mesma fonte do master)."""
+    _, df_pop, df_clima = load_raw_data(incluir_consumo=False)
+    if df_pop is None:
+        return None, None
+    df_pop, df_clima = clean_pop_clima(df_pop, df_clima)
+    if df_pop is None:
+        return None, None
+    df_pop_h, df_clima_h = harmonize_regions(df_pop, df_clima)
+    if df_pop_h is None:
+        return None, None
+
+    clima = df_clima_h[['Região', 'Mes_Num', 'Temperatura', 'Umidade']].rename(columns={'Mes_Num': 'mes'})
+    pop = df_pop_h[['Região', 'População 2024']].rename(columns={'População 2024': 'Populacao'})
+    return clima, pop
+
+
+# --- 3. Frames Futuros (Vetorizados) ---
+
+def build_future_frame(horizonte, inicio=None, regioes=None, deltas=None, overrides=None):
+    """Monta as features de todos os dias futuros x regiões de uma vez.
+
+    Calendário vem da mesma tabela cacheada do create_features(); clima (normal
+    mensal) e população vêm do harmonize_regions(). Cenários:
+      - deltas: {coluna: valor} somado à coluna (ex.: {'Temperatura': 2.0});
+      - overrides: DataFrame com 'ds', 'Região' e colunas cujos valores substituem
+        os do frame nas linhas correspondentes.
+    """
+    if inicio is None:
+        inicio = load_master_dataset(columns=['ds'])['ds'].max() + pd.Timedelta(days=1)
+    inicio = pd.Timestamp(inicio)
+    fim = inicio + pd.Timedelta(days=horizonte - 1)
+    regioes = regioes or list(ESTADOS_POR_SUBMERCADO)
+
+    df = calendar_long(inicio, fim, regioes).rename(columns={'Data': 'ds'})
+
+    clima, pop = load_exogenous()
+    if clima is None:
+        return None
+    df = df.merge(clima, on=['Região', 'mes'], how='left').merge(pop, on='Região', how='left')
+
+    for coluna, valor in (deltas or {}).items():
+        df[coluna] = df[coluna] + valor
+
+    if overrides is not None:
+        chaves = ['ds', 'Região']
+        df = df.set_index(chaves)
+        df.update(overrides.assign(ds=pd.to_datetime(overrides['ds'])).set_index(chaves))
+        df = df.reset_index()
+
+    return df.sort_values(['Região', 'ds'], kind='stable').reset_index(drop=True)
+
+
+# --- 4. Previsão em Lote ---
+
+def predict_recursive(prever, X, posicoes, colunas, estado, regiao, datas=None):
+    """Previsão passo a passo para modelos com defasagens de 'y'.
+
+    Cada previsão alimenta o estado incremental (O(1) por passo), que fornece as
+    defasagens/janelas móveis do passo seguinte. Com 'datas', dias entre o fim do
+    histórico e o início da previsão contam como ausentes (defasagens em dias).
+    """
+    y = np.empty(len(X))
+    for i in range(len(X)):
+        data = None if datas is None else datas[i]
+        feats = estado.features(regiao, data)
+        X[i, posicoes] = [feats[c] for c in colunas]
+        y[i] = prever(X[i:i + 1])[0]
+        estado.update(regiao, y[i], data)
+    return y
+
+def predict_frame(df, registry=None, estado=None, backend=None):
+    """Pontua todas as linhas de um frame com uma única chamada de predict por modelo regional.
+
+    Modelos treinados com defasagens de 'y' (FEATURES_LAGS) são previstos de forma
+    recursiva, com o estado aquecido pelo fim do histórico do master dataset.
+    Contagens de eventos das notícias ausentes no frame (futuro) valem 0.
+    'backend' escolhe o motor de inferência (ver tree_inference.predictor).
+    """
+    registry = registry or ModelRegistry()
+    df = df.sort_values(['Região', 'ds'], kind='stable').reset_index(drop=True)
+    y_pred = np.full(len(df), np.nan)
+
+    for regiao, indices in df.groupby('Região', sort=False).indices.items():
+        modelo = registry.get(regiao)
+        if modelo is None:
+            log.warning(f"⚠️ Sem modelo registrado para {regiao}; previsões ficam vazias.")
+            continue
+        X = (df.reindex(columns=modelo.features).iloc[indices]
+             .fillna({c: 0 for c in EVENT_COLUMNS if c in modelo.features}).to_numpy(dtype=np.float32))
+        prever = predictor(modelo, backend)
+
+        colunas_lag = [c for c in modelo.features if c in LAG_COLUMNS]
+        if not colunas_lag:
+            y_pred[indices] = prever(X)
+            continue
+
+        if estado is None:
+            estado = EstadoLags.from_history(load_master_dataset(columns=['ds', 'Região', 'y']))
+        posicoes = [modelo.features.index(c) for c in colunas_lag]
+        y_pred[indices] = predict_recursive(prever, X, posicoes, colunas_lag, estado, regiao,
+                                            df['ds'].to_numpy()[indices])
+
+    df['y_pred'] = y_pred
+    return df
+
+def forecast(horizonte=30, inicio=None, regioes=None, deltas=None, overrides=None, registry=None):
+    """Previsão de 'horizonte' dias para todas as regiões (frame vetorizado + predict em lote)."""
+    t0 = time.perf_counter()
+    df_futuro = build_future_frame(horizonte, inicio, regioes, deltas, overrides)
+    if df_futuro is None:
+        return None
+    t1 = time.perf_counter()
+    df_prev = predict_frame(df_futuro, registry)
+    t2 = time.perf_counter()
+    log.info(f"✅ {len(df_prev):,} previsões ({horizonte} dias x {df_prev['Região'].nunique()} regiões) | "
+             f"frame: {t1 - t0:.3f}s, predict: {t2 - t1:.3f}s",
+             extra={'metricas': {'linhas': len(df_prev), 'horizonte': horizonte,
+                                 'segundos_frame': t1 - t0, 'segundos_predict': t2 - t1}})
+    return df_prev
+
+
+# --- 5. Função Principal ---
+
+def main(horizonte=30, inicio=None, delta_temperatura=0.0, delta_umidade=0.0):
+    """Gera a previsão futura, salva em Parquet e mostra o resumo por região."""
+    log.info("--- INICIANDO PREVISÃO FUTURA ---")
+    deltas = {k: v for k, v in {'Temperatura': delta_temperatura, 'Umidade': delta_umidade}.items() if v}
+    df_prev = forecast(horizonte, inicio, deltas=deltas)
+    if df_prev is None:
+        return
+
+    df_prev.to_parquet(FORECAST_PARQUET, index=False)
+
+    resumo = df_prev.groupby('Região').agg(media_mwm=('y_pred', 'mean'), pico_mwm=('y_pred', 'max'))
+    resumo['dia_pico'] = df_prev.loc[df_prev.groupby('Região')['y_pred'].idxmax(), 'ds'].dt.date.to_numpy()
+    # Uma linha de log por região (com os números em 'metricas', para os logs JSON)
+    for regiao, linha in resumo.iterrows():
+        log.info(f"  {regiao}: média {linha['media_mwm']:,.1f} MWm, pico {linha['pico_mwm']:,.1f} MWm "
+                 f"em {linha['dia_pico']}", extra={'metricas': {'regiao': regiao, **linha.to_dict()}})
+    log.info(f"\nPrevisão salva em: {FORECAST_PARQUET}")
+    return df_prev
+
+
+# --- Ponto de Entrada ---
+def cli(argv=None, prog=None):
+    """Linha de comando (também usada por 'peaksense forecast')."""
+    parser = argparse.ArgumentParser(prog=prog, description="Previsão multi-passo para todas as regiões")
+    parser.add_argument("--dias", type=int, default=30, help="Horizonte da previsão (dias)")
+    parser.add_argument("--inicio", default=None, help="Primeiro dia (padrão: dia seguinte ao fim do histórico)")
+    parser.add_argument("--delta-temperatura", type=float, default=0.0, help="Cenário: °C somados à normal mensal")
+    parser.add_argument("--delta-umidade", type=float, default=0.0, help="Cenário: pontos % somados à umidade")
+    args = parser.parse_args(argv)
+    main(args.dias, args.inicio, args.delta_temperatura, args.delta_umidade)
+
+if __name__ == "__main__":
+    cli()
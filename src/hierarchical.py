@@ -0,0 +1,265 @@
+import pandas as pd
+import numpy as np
+import time
+import argparse
+import warnings
+
+from config import DATA_PROCESSED_DIR
+from calendar_features import calendar_long, COLUNAS_NACIONAIS
+from data_processing import load_consumo_chunked
+from forecasting import load_exogenous
+from ml_pipeline import PARAMS_V4
+
+# Ignorar avisos
+warnings.filterwarnings('ignore')
+
+# --- 1. Configuração ---
+HIERARQUIA_PARQUET = DATA_PROCESSED_DIR / "hierarquia_previsoes.parquet"
+
+# Níveis da hierarquia (do topo à base) e as colunas que identificam cada série.
+# A base é Estado x Classe; cada nível é a soma exata das séries abaixo dele.
+NIVEIS = {
+    'Brasil': [],
+    'Submercado': ['Região'],
+    'Estado': ['Região', 'Estado'],
+    'Classe': ['Região', 'Estado', 'Classe'],
+}
+COLUNAS_SERIE = NIVEIS['Classe']
+
+# Features do modelo global de cada nível: calendário + clima + identidade e escala da série
+FEATURES_HIERARQUIA = (
+    COLUNAS_NACIONAIS + ['feriado_estadual', 'Temperatura', 'Umidade']
+    + ['cod_regiao', 'cod_estado', 'cod_classe', 'log_escala']
+)
+
+METODOS_RECONCILIACAO = ('bu', 'ols', 'wls')
+
+
+# --- 2. Séries e Matriz de Agregação ---
+
+def load_bottom_series(chunksize=500_000):
+    """Consumo diário por (Submercado, Estado, Classe), lido em blocos do export da CCEE."""
+    df = load_consumo_chunked(chunksize=chunksize, colunas_extras=['Estado', 'Classe'])
+    if df is None:
+        return None
+    return df[['Data'] + COLUNAS_SERIE + ['Consumo_Limpo']].rename(columns={'Consumo_Limpo': 'y'})
+
+def build_hierarchy(df_base):
+    """Monta as séries de todos os níveis a partir da base.
+
+    Retorna (series, S, Y): 'series' descreve cada linha (nível, rótulo e chaves),
+    S é a matriz de agregação (n_series x n_base, 0/1) e Y o consumo observado
+    (n_series x n_datas), com Y = S @ Y_base. Dias sem registro de uma série valem 0.
+    """
+    tabela = df_base.pivot_table(index=COLUNAS_SERIE, columns='Data', values='y', aggfunc='sum', fill_value=0.0)
+    base = tabela.index.to_frame(index=False)
+
+    partes, blocos = [], []
+    for nivel, colunas in NIVEIS.items():
+        if colunas:
+            chaves = base[colunas].astype(str).agg('|'.join, axis=1)
+            # A base já vem ordenada: a ordem de aparição mantém a base como identidade em S
+            codigos, rotulos = pd.factorize(chaves, sort=False)
+        else:
+            codigos, rotulos = np.zeros(len(base), dtype=np.int64), pd.Index(['Brasil'])
+
+        bloco = np.zeros((len(rotulos), len(base)))
+        bloco[codigos, np.arange(len(base))] = 1.0
+        blocos.append(bloco)
+
+        primeiro = pd.Series(np.arange(len(base))).groupby(codigos).first().to_numpy()
+        parte = pd.DataFrame({'nivel': nivel, 'serie': rotulos})
+        for coluna in COLUNAS_SERIE:
+            parte[coluna] = base[coluna].to_numpy()[primeiro] if coluna in colunas else None
+        partes.append(parte)
+
+    series = pd.concat(partes, ignore_index=True)
+    S = np.vstack(blocos)
+    Y = S @ tabela.to_numpy()
+    return series, S, Y, pd.DatetimeIndex(tabela.columns)
+
+
+# --- 3. Features (Frame Longo por Nível) ---
+
+def build_level_frame(series, datas, escalas, clima):
+    """Features de todas as séries de um nível em todas as datas (uma linha por série x dia).
+
+    As linhas seguem a ordem (série, data), então as previsões voltam para uma matriz
+    n_series x n_datas com um reshape.
+    """
+    n_series, n_datas = len(series), len(datas)
+    df = pd.DataFrame({
+        'serie': np.repeat(np.arange(n_series), n_datas),
+        'Data': np.tile(datas.to_numpy(), n_series),
+        'Região': np.repeat(series['Região'].fillna('Brasil').to_numpy(), n_datas),
+    })
+
+    # Brasil usa o calendário nacional (feriado_estadual = 0) e a média do clima dos Submercados
+    cal = calendar_long(datas.min(), datas.max(), regioes=df['Região'].unique().tolist())
+    df = df.merge(cal, on=['Data', 'Região'], how='left')
+    clima_brasil = clima.groupby('mes', as_index=False)[['Temperatura', 'Umidade']].mean().assign(Região='Brasil')
+    df = df.merge(pd.concat([clima, clima_brasil]), on=['Região', 'mes'], how='left')
+    df = df.sort_values(['serie', 'Data'], kind='stable').reset_index(drop=True)
+
+    for coluna, destino in [('Região', 'cod_regiao'), ('Estado', 'cod_estado'), ('Classe', 'cod_classe')]:
+        df[destino] = np.repeat(series[coluna].astype('category').cat.codes.to_numpy(), n_datas)
+    df['log_escala'] = np.repeat(np.log1p(escalas), n_datas)
+    return df
+
+
+# --- 4. Treino e Previsão em Lote (um modelo global por nível) ---
+
+def train_level(X, y, n_jobs=None):
+    import xgboost as xgb  # Import pesado: só quando há treino (importar o módulo fica leve)
+    model_xgb = xgb.XGBRegressor(**PARAMS_V4, n_jobs=n_jobs)
+    model_xgb.fit(X, y)
+    model_xgb.get_booster().feature_names = list(FEATURES_HIERARQUIA)
+    return model_xgb
+
+def fit_and_score(series, Y, datas, datas_treino, datas_alvo, clima, n_jobs=None):
+    """Treina um modelo global por nível e prevê todas as séries de cada nível em um predict.
+
+    O alvo é normalizado pela escala (média do treino) de cada série, para que séries
+    de tamanhos muito diferentes caibam no mesmo modelo. Retorna (Y_base, tempos).
+    """
+    em_treino = datas.isin(datas_treino)
+    escalas = Y[:, em_treino].mean(axis=1)
+    escalas = np.where(escalas > 0, escalas, 1.0)
+
+    Y_base = np.empty((len(series), len(datas_alvo)))
+    tempos = {}
+    for nivel in NIVEIS:
+        linhas = np.flatnonzero(series['nivel'].to_numpy() == nivel)
+        serie_nivel = series.iloc[linhas].reset_index(drop=True)
+
+        inicio = time.perf_counter()
+        frame = build_level_frame(serie_nivel, datas_treino, escalas[linhas], clima)
+        X = frame[FEATURES_HIERARQUIA].to_numpy(dtype=np.float32)
+        y = (Y[linhas][:, em_treino] / escalas[linhas, None]).ravel().astype(np.float32)
+        model_xgb = train_level(X, y, n_jobs)
+        segundos_treino = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        frame = build_level_frame(serie_nivel, datas_alvo, escalas[linhas], clima)
+        X = frame[FEATURES_HIERARQUIA].to_numpy(dtype=np.float32)
+        previsto = model_xgb.get_booster().inplace_predict(X).reshape(len(linhas), len(datas_alvo))
+        Y_base[linhas] = previsto * escalas[linhas, None]
+        segundos_score = time.perf_counter() - inicio
+
+        tempos[nivel] = {'n_series': len(linhas), 'linhas_treino': len(y), 'linhas_score': len(X),
+                         'treino_s': segundos_treino, 'score_s': segundos_score}
+        print(f"  ✅ {nivel}: {len(linhas)} série(s) | treino {segundos_treino:.2f}s | score {segundos_score:.3f}s")
+    return Y_base, tempos
+
+
+# --- 5. Reconciliação (Vetorizada) ---
+
+def reconciliation_matrix(S, metodo='wls'):
+    """Matriz P (n_base x n_series) tal que S @ P @ Y_base é coerente.
+
+    - 'bu': bottom-up (só as previsões da base);
+    - 'ols': projeção ortogonal, P = (S'S)^-1 S';
+    - 'wls': mínimos quadrados ponderados pela estrutura (variância proporcional ao
+      nº de séries da base em cada série), P = (S'WS)^-1 S'W com W = diag(1/S·1).
+    """
+    n_series, n_base = S.shape
+    if metodo == 'bu':
+        return np.hstack([np.zeros((n_base, n_series - n_base)), np.eye(n_base)])
+    if metodo == 'ols':
+        pesos = np.ones(n_series)
+    elif metodo == 'wls':
+        pesos = 1.0 / S.sum(axis=1)
+    else:
+        raise ValueError(f"Método desconhecido: {metodo!r} (use {', '.join(METODOS_RECONCILIACAO)})")
+    StW = S.T * pesos
+    return np.linalg.solve(StW @ S, StW)
+
+def reconcile(Y_base, S, metodo='wls'):
+    """Previsões coerentes de todos os níveis e dias com duas multiplicações de matriz."""
+    Y_rec = S @ (reconciliation_matrix(S, metodo) @ Y_base)
+    # Coerência: cada nível agregado é a soma exata das séries da base reconciliadas
+    n_base = S.shape[1]
+    assert np.allclose(S @ Y_rec[-n_base:], Y_rec, rtol=1e-9, atol=1e-6), \
+        f"Reconciliação ({metodo}) incoerente: os níveis agregados não batem com S @ base"
+    return Y_rec
+
+
+# --- 6. Avaliação e Função Principal ---
+
+def wape(y_real, y_prev):
+    """Erro absoluto ponderado (robusto a séries pequenas, ao contrário da MAPE)."""
+    return float(np.abs(y_real - y_prev).sum() / np.abs(y_real).sum())
+
+def to_long(series, datas, **matrizes):
+    """Matrizes n_series x n_datas -> frame longo (ds, nível, série, chaves, valores)."""
+    df = series.loc[series.index.repeat(len(datas))].reset_index(drop=True)
+    df.insert(0, 'ds', np.tile(datas.to_numpy(), len(series)))
+    for nome, matriz in matrizes.items():
+        df[nome] = matriz.ravel()
+    return df
+
+def main(horizonte=30, metodo='wls', futuro=False, threads=None, chunksize=500_000):
+    """Treina/prevê a hierarquia Classe -> Estado -> Submercado -> Brasil e reconcilia.
+
+    Padrão: backtest nos últimos 'horizonte' dias. Com futuro=True, treina em todo o
+    histórico e prevê os 'horizonte' dias seguintes.
+    """
+    print("--- INICIANDO PREVISÃO HIERÁRQUICA ---")
+    inicio_total = time.perf_counter()
+
+    df_base = load_bottom_series(chunksize)
+    clima, _ = load_exogenous()
+    if df_base is None or clima is None:
+        return
+
+    series, S, Y, datas = build_hierarchy(df_base)
+    n_base = int((series['nivel'] == 'Classe').sum())
+    print("Hierarquia: " + ", ".join(f"{n} {nivel}" for nivel, n in series['nivel'].value_counts(sort=False).items())
+          + f" | {len(datas)} dias")
+
+    if futuro:
+        datas_treino = datas
+        datas_alvo = pd.date_range(datas.max() + pd.Timedelta(days=1), periods=horizonte, freq='D')
+        Y_real = np.full((len(series), horizonte), np.nan)
+    else:
+        datas_treino, datas_alvo = datas[:-horizonte], datas[-horizonte:]
+        Y_real = Y[:, -horizonte:]
+
+    # threads=None: o XGBoost usa todos os núcleos
+    Y_base, tempos = fit_and_score(series, Y, datas, datas_treino, datas_alvo, clima, threads)
+
+    inicio = time.perf_counter()
+    Y_rec = reconcile(Y_base, S, metodo)
+    segundos_rec = time.perf_counter() - inicio
+    incoerencia = np.abs(S @ Y_rec[-n_base:] - Y_rec).max()
+    print(f"  ✅ Reconciliação ({metodo}): {segundos_rec * 1000:.1f} ms | "
+          f"maior incoerência após reconciliar: {incoerencia:.2e} MWm")
+
+    resumo = pd.DataFrame(tempos).T
+    if not futuro:
+        for nivel in NIVEIS:
+            linhas = (series['nivel'] == nivel).to_numpy()
+            resumo.loc[nivel, 'wape_base_%'] = 100 * wape(Y_real[linhas], Y_base[linhas])
+            resumo.loc[nivel, 'wape_reconciliado_%'] = 100 * wape(Y_real[linhas], Y_rec[linhas])
+
+    df_prev = to_long(series, datas_alvo, y_real=Y_real, y_base=Y_base, y_reconciliado=Y_rec)
+    df_prev.to_parquet(HIERARQUIA_PARQUET, index=False)
+
+    with pd.option_context('display.float_format', '{:,.3f}'.format, 'display.width', 160, 'display.max_columns', None):
+        print(resumo)
+    print(f"\n⏱️ Tempo total: {time.perf_counter() - inicio_total:.2f}s "
+          f"(treino: {resumo['treino_s'].sum():.2f}s, score: {resumo['score_s'].sum():.3f}s)")
+    print(f"Previsões salvas em: {HIERARQUIA_PARQUET}")
+    return df_prev
+
+
+# --- Ponto de Entrada ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Previsão hierárquica Classe -> Estado -> Submercado -> Brasil")
+    parser.add_argument("--horizonte", type=int, default=30, help="Dias avaliados (backtest) ou previstos (--futuro)")
+    parser.add_argument("--metodo", default='wls', choices=METODOS_RECONCILIACAO, help="Método de reconciliação")
+    parser.add_argument("--futuro", action="store_true", help="Treina em todo o histórico e prevê os próximos dias")
+    parser.add_argument("--threads", type=int, default=None, help="Threads do XGBoost (padrão: nº de CPUs)")
+    parser.add_argument("--chunksize", type=int, default=500_000, help="Linhas por bloco na leitura do export")
+    args = parser.parse_args()
+    main(args.horizonte, args.metodo, args.futuro, args.threads, args.chunksize)
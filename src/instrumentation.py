@@ -0,0 +1,328 @@
+import pandas as pd
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import pstats
+import logging
+import cProfile
+import threading
+import tracemalloc
+import contextvars
+
+from config import REPORTS_DIR, FORMATO_LOG, PERFIL
+from memory_report import MonitorRSS, peak_rss_mb
+
+# --- 1. Configuração ---
+RELATORIOS_DIR = REPORTS_DIR / "execucoes"
+HISTORICO_JSONL = RELATORIOS_DIR / "execucoes.jsonl"   # Uma linha por execução (fácil de raspar)
+# Formato dos logs (FORMATO_LOG) e perfil por etapa (PERFIL) vêm de config.py
+TOP_PERFIL = 15
+
+_etapa_atual = contextvars.ContextVar('etapa_atual', default=None)
+_execucao = None
+_perfil_ativo = threading.Lock()  # Só um cProfile por vez (o das etapas mais externas)
+
+
+# --- 2. Logs Estruturados ---
+
+class FormatoTexto(logging.Formatter):
+    """Só a mensagem, como os print() que os módulos usavam."""
+
+    def format(self, record):
+        return record.getMessage()
+
+class FormatoJSON(logging.Formatter):
+    """Um objeto JSON por linha, com a etapa/região/execução em andamento e as métricas."""
+
+    def format(self, record):
+        evento = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensagem': record.getMessage(),
+        }
+        etapa = _etapa_atual.get()
+        if etapa is not None:
+            evento['etapa'] = etapa.nome
+            if etapa.regiao is not None:
+                evento['regiao'] = etapa.regiao
+        if _execucao is not None:
+            evento['execucao'] = _execucao.id
+        metricas = getattr(record, 'metricas', None)
+        if metricas:
+            evento['metricas'] = metricas
+        if record.exc_info:
+            evento['erro'] = self.formatException(record.exc_info)
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+class _ContadorErros(logging.Handler):
+    """Conta os erros logados durante cada etapa (os módulos capturam exceções e devolvem None)."""
+
+    def emit(self, record):
+        etapa = _etapa_atual.get()
+        if etapa is not None and record.levelno >= logging.ERROR:
+            etapa.erros += 1
+
+def _configurar_raiz():
+    raiz = logging.getLogger("peaksense")
+    if raiz.handlers:
+        return raiz
+    saida = logging.StreamHandler(sys.stdout)
+    saida.setFormatter(FormatoJSON() if FORMATO_LOG == 'json' else FormatoTexto())
+    raiz.addHandler(saida)
+    raiz.addHandler(_ContadorErros())
+    raiz.setLevel(logging.INFO)
+    raiz.propagate = False
+    return raiz
+
+def get_logger(nome):
+    """Logger de um módulo ('peaksense.<nome>'), com a saída configurada uma única vez."""
+    _configurar_raiz()
+    return logging.getLogger(f"peaksense.{nome}")
+
+log = get_logger("instrumentation")
+
+
+# --- 3. Etapas (Tempo, CPU, Memória, Linhas e Bytes) ---
+
+class Etapa:
+    """Medidas de uma etapa; 'linhas_saida' e 'bytes_lidos' podem ser preenchidos dentro do bloco."""
+
+    def __init__(self, nome, regiao=None, linhas_entrada=None):
+        self.nome = nome
+        self.regiao = regiao
+        self.linhas_entrada = linhas_entrada
+        self.linhas_saida = None
+        self.bytes_lidos = 0
+        self.erros = 0
+        self.status = 'ok'
+        self.erro = None
+        self.inicio = datetime.now(timezone.utc)
+        self.segundos = self.cpu_segundos = None
+        self.pico_rss_mb = self.acrescimo_rss_mb = None
+        self.perfil = None
+
+    def registro(self):
+        return {
+            'etapa': self.nome, 'regiao': self.regiao, 'status': self.status, 'erro': self.erro,
+            'inicio': self.inicio.isoformat(), 'segundos': self.segundos, 'cpu_segundos': self.cpu_segundos,
+            'pico_rss_mb': self.pico_rss_mb, 'acrescimo_rss_mb': self.acrescimo_rss_mb,
+            'linhas_entrada': self.linhas_entrada, 'linhas_saida': self.linhas_saida,
+            'bytes_lidos': self.bytes_lidos, 'erros_logados': self.erros, 'perfil': self.perfil,
+        }
+
+def etapa_atual():
+    return _etapa_atual.get()
+
+def registrar_leitura(origem):
+    """Soma à etapa atual os bytes lidos: um caminho (tamanho do arquivo) ou um nº de bytes."""
+    etapa = _etapa_atual.get()
+    if etapa is None:
+        return
+    if isinstance(origem, (str, Path)):
+        caminho = Path(origem)
+        origem = caminho.stat().st_size if caminho.exists() else 0
+    etapa.bytes_lidos += int(origem)
+
+def _resumo_cprofile(perfilador):
+    texto = io.StringIO()
+    pstats.Stats(perfilador, stream=texto).sort_stats('cumulative').print_stats(TOP_PERFIL)
+    return texto.getvalue()
+
+def _resumo_tracemalloc(snapshot):
+    return [{'local': str(estatistica.traceback), 'kb': estatistica.size / 1024, 'blocos': estatistica.count}
+            for estatistica in snapshot.statistics('lineno')[:TOP_PERFIL]]
+
+@contextmanager
+def etapa(nome, regiao=None, linhas_entrada=None, perfil=None):
+    """Mede um bloco: tempo de parede, CPU do processo, pico de RSS, linhas e bytes lidos.
+
+    Em etapas paralelas (threads), o tempo de CPU é o do processo inteiro no intervalo.
+    'perfil' ('cprofile' ou 'tracemalloc'; padrão: PEAKSENSE_PERFIL) guarda no relatório
+    as funções mais caras (só nas etapas mais externas) ou as linhas que mais alocaram.
+    """
+    atual = Etapa(nome, regiao, linhas_entrada)
+    token = _etapa_atual.set(atual)
+    perfil = PERFIL if perfil is None else perfil
+
+    perfilador = None
+    if perfil == 'cprofile' and _perfil_ativo.acquire(blocking=False):
+        perfilador = cProfile.Profile()
+        perfilador.enable()
+    rastreando = perfil == 'tracemalloc' and not tracemalloc.is_tracing()
+    if rastreando:
+        tracemalloc.start()
+
+    monitor = MonitorRSS()
+    inicio, inicio_cpu = time.perf_counter(), time.process_time()
+    try:
+        with monitor:
+            yield atual
+    except BaseException as exc:
+        atual.status, atual.erro = 'erro', f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        atual.segundos = time.perf_counter() - inicio
+        atual.cpu_segundos = time.process_time() - inicio_cpu
+        atual.pico_rss_mb, atual.acrescimo_rss_mb = monitor.pico_mb, monitor.acrescimo_mb
+        if atual.status == 'ok' and atual.erros:
+            atual.status = 'falhou'
+
+        if perfilador is not None:
+            perfilador.disable()
+            _perfil_ativo.release()
+            atual.perfil = {'tipo': 'cprofile', 'top': _resumo_cprofile(perfilador)}
+        if rastreando:
+            _, pico = tracemalloc.get_traced_memory()
+            atual.perfil = {'tipo': 'tracemalloc', 'pico_mb': pico / 1024 ** 2,
+                            'top': _resumo_tracemalloc(tracemalloc.take_snapshot())}
+            tracemalloc.stop()
+
+        _log_etapa(atual)  # Ainda dentro da etapa: o log JSON leva 'etapa'/'regiao'
+        _etapa_atual.reset(token)
+        if _execucao is not None:
+            _execucao.adicionar(atual)
+
+def _log_etapa(atual):
+    partes = [f"{atual.segundos:.3f}s (CPU {atual.cpu_segundos:.3f}s)"]
+    if atual.linhas_entrada is not None or atual.linhas_saida is not None:
+        entrada = '?' if atual.linhas_entrada is None else f"{atual.linhas_entrada:,}"
+        saida = '?' if atual.linhas_saida is None else f"{atual.linhas_saida:,}"
+        partes.append(f"linhas {entrada} -> {saida}")
+    if atual.bytes_lidos:
+        partes.append(f"{atual.bytes_lidos / 1024 ** 2:,.1f} MB lidos")
+    if atual.pico_rss_mb is not None:
+        partes.append(f"pico RSS {atual.pico_rss_mb:,.0f} MB")
+    rotulo = atual.nome if atual.regiao is None else f"{atual.nome} [{atual.regiao}]"
+    nivel = logging.INFO if atual.status == 'ok' else logging.WARNING
+    metricas = {k: v for k, v in atual.registro().items() if k not in ('etapa', 'regiao', 'perfil')}
+    log.log(nivel, f"⏱️ {rotulo}: {', '.join(partes)}" + ("" if atual.status == 'ok' else f" ({atual.status})"),
+            extra={'metricas': metricas})
+
+def _linhas(valor):
+    """Linhas de um DataFrame (ou do primeiro DataFrame de uma tupla); None se não houver."""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return len(valor)
+    if isinstance(valor, tuple):
+        for item in valor:
+            if isinstance(item, (pd.DataFrame, pd.Series)):
+                return len(item)
+    return None
+
+def instrumentar(nome=None):
+    """Decorator: cada chamada vira uma etapa; linhas de entrada/saída vêm dos DataFrames
+    recebidos (soma) e do primeiro DataFrame devolvido."""
+    def decorador(funcao):
+        rotulo = nome or funcao.__name__
+
+        @wraps(funcao)
+        def medida(*args, **kwargs):
+            entradas = [_linhas(a) for a in list(args) + list(kwargs.values())]
+            entradas = [n for n in entradas if n is not None]
+            with etapa(rotulo, linhas_entrada=sum(entradas) if entradas else None) as atual:
+                resultado = funcao(*args, **kwargs)
+                atual.linhas_saida = _linhas(resultado)
+                return resultado
+        return medida
+    return decorador
+
+
+# --- 4. Relatório da Execução (JSON) ---
+
+class Execucao:
+    """Todas as etapas de uma execução de script, gravadas em JSON ao final."""
+
+    def __init__(self, nome):
+        self.id = uuid.uuid4().hex[:12]
+        self.nome = nome
+        self.inicio = datetime.now(timezone.utc)
+        self.etapas = []
+        self.status = 'ok'
+        self._lock = threading.Lock()
+
+    def adicionar(self, atual):
+        with self._lock:
+            self.etapas.append(atual.registro())
+
+    def incorporar(self, registros):
+        """Acrescenta etapas já registradas em outro processo (ver etapas_isoladas)."""
+        with self._lock:
+            self.etapas.extend(registros)
+
+    def relatorio(self, segundos, cpu_segundos):
+        return {
+            'id': self.id, 'nome': self.nome, 'status': self.status,
+            'inicio': self.inicio.isoformat(), 'fim': datetime.now(timezone.utc).isoformat(),
+            'segundos': segundos, 'cpu_segundos': cpu_segundos, 'pico_rss_mb': peak_rss_mb(),
+            'perfil': PERFIL or None, 'argv': sys.argv, 'pid': os.getpid(),
+            'etapas': self.etapas,
+        }
+
+def save_report(relatorio, pasta=RELATORIOS_DIR):
+    """Grava '<nome>_ultima.json' (a execução mais recente) e acrescenta uma linha ao histórico JSONL."""
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    caminho = pasta / f"{relatorio['nome']}_ultima.json"
+    temporario = caminho.with_suffix('.tmp')
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False, default=str)
+    os.replace(temporario, caminho)
+    with open(pasta / HISTORICO_JSONL.name, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(relatorio, ensure_ascii=False, default=str) + "\n")
+    return caminho
+
+@contextmanager
+def execucao(nome, salvar=True):
+    """Coleta as etapas do bloco e grava o relatório da execução ao sair.
+
+    Execuções aninhadas (ex.: o incremental que cai no rebuild completo) usam a externa.
+    """
+    global _execucao
+    if _execucao is not None:
+        yield _execucao
+        return
+
+    atual = _execucao = Execucao(nome)
+    inicio, inicio_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield atual
+    except BaseException:
+        atual.status = 'erro'
+        raise
+    finally:
+        _execucao = None
+        if atual.status == 'ok' and any(e['status'] != 'ok' for e in atual.etapas):
+            atual.status = 'falhou'
+        relatorio = atual.relatorio(time.perf_counter() - inicio, time.process_time() - inicio_cpu)
+        if salvar:
+            caminho = save_report(relatorio)
+            log.info(f"📊 Relatório da execução ({len(atual.etapas)} etapas): {caminho}",
+                     extra={'metricas': {'segundos': relatorio['segundos'], 'status': atual.status}})
+
+@contextmanager
+def etapas_isoladas(nome="subprocesso"):
+    """Coleta à parte as etapas do bloco, sem gravar relatório.
+
+    Para processos filhos (ProcessPoolExecutor): lá o _execucao é uma cópia (fork) ou
+    não existe (spawn), e as etapas se perderiam. O filho devolve 'atual.etapas' junto
+    do resultado e o pai as junta à própria execução com incorporar_etapas.
+    """
+    global _execucao
+    anterior, atual = _execucao, Execucao(nome)
+    _execucao = atual
+    try:
+        yield atual
+    finally:
+        _execucao = anterior
+
+def incorporar_etapas(registros):
+    """Junta à execução atual (se houver) etapas registradas em outro processo."""
+    if _execucao is not None:
+        _execucao.incorporar(registros)
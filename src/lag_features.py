@@ -0,0 +1,204 @@
+import pandas as pd
+import numpy as np
+from collections import deque
+
+# --- 1. Configuração ---
+
+# Defasagens e janelas móveis, em dias de calendário (não em linhas da série).
+# Todas olham só para o passado: a linha do dia t usa y[t-1], y[t-2], ...
+# Dias sem observação contam como ausentes: a defasagem que cai neles e as janelas
+# que os incluem ficam NaN (em vez de "pular" para a observação anterior).
+LAGS = [1, 7, 14]
+JANELAS = [7, 28]
+HISTORICO_NECESSARIO = max(LAGS + JANELAS)
+
+# Os valores são quantizados em milésimos de MWm (a precisão do export da CCEE):
+# assim as somas das janelas são exatas (inteiros, guardados em float64 para admitir
+# NaN), e o cálculo em lote (vetorizado) e o incremental (O(1) por observação) dão
+# exatamente o mesmo resultado.
+ESCALA = 1000
+
+LAG_COLUMNS = (
+    [f'y_lag_{lag}' for lag in LAGS]
+    + [f'y_media_{j}' for j in JANELAS]
+    + [f'y_max_{j}' for j in JANELAS]
+)
+
+
+def _quantizar(valores):
+    return np.rint(np.asarray(valores, dtype=np.float64) * ESCALA)
+
+
+# --- 2. Cálculo em Lote (Treino / Processamento) ---
+
+def add_lag_features(df, col_regiao='Região', col_data='ds', col_y='y'):
+    """Adiciona as colunas de LAG_COLUMNS a um DataFrame com várias séries (uma por região).
+
+    Cada região é estendida a um calendário diário completo antes do shift e das
+    somas/máximos móveis, então 'y_lag_7' é sempre o valor de 7 dias antes, mesmo com
+    dias faltando no export. Linhas sem histórico suficiente ficam com NaN (o XGBoost
+    trata valores ausentes nativamente). Espera uma linha por dia em cada região.
+    """
+    df = df.sort_values([col_regiao, col_data], kind='stable').reset_index(drop=True)
+    q = _quantizar(df[col_y])
+    datas = pd.DatetimeIndex(df[col_data]).normalize()
+
+    ordem = [f'y_lag_{lag}' for lag in LAGS]
+    for j in JANELAS:
+        ordem += [f'y_media_{j}', f'y_max_{j}']
+    novas = {coluna: np.full(len(df), np.nan) for coluna in ordem}
+
+    for regiao, linhas in df.groupby(col_regiao, sort=False, observed=True).indices.items():
+        # Posição de cada linha no calendário diário da região (dia 0 = primeira data)
+        posicoes = (datas[linhas] - datas[linhas[0]]).days.to_numpy()
+        if np.any(np.diff(posicoes) == 0):
+            raise ValueError(f"add_lag_features: mais de uma linha por dia em {regiao}")
+        diaria = np.full(posicoes[-1] + 1, np.nan)
+        diaria[posicoes] = q[linhas]
+        diaria = pd.Series(diaria)
+
+        for lag in LAGS:
+            novas[f'y_lag_{lag}'][linhas] = diaria.shift(lag).to_numpy()[posicoes] / ESCALA
+        passado = diaria.shift(1)
+        for j in JANELAS:
+            # Soma exata (inteiros), convertida no fim com a mesma conta do modo incremental
+            janela = passado.rolling(j, min_periods=j)
+            novas[f'y_media_{j}'][linhas] = janela.sum().to_numpy()[posicoes] / j / ESCALA
+            novas[f'y_max_{j}'][linhas] = janela.max().to_numpy()[posicoes] / ESCALA
+
+    for coluna, valores in novas.items():
+        df[coluna] = valores
+    return df
+
+def update_lag_features(df_historico, df_novo, col_regiao='Região', col_data='ds', col_y='y'):
+    """Calcula as colunas de LAG_COLUMNS só para as linhas de df_novo (processamento incremental).
+
+    df_novo são as linhas a partir do primeiro dia afetado; de df_historico (as linhas
+    anteriores, já com as defasagens) só entram, como contexto, os HISTORICO_NECESSARIO
+    dias antes desse primeiro dia. O resultado é o mesmo do add_lag_features na série toda.
+    """
+    inicio_contexto = pd.Timestamp(df_novo[col_data].min()) - pd.Timedelta(days=HISTORICO_NECESSARIO)
+    contexto = df_historico[df_historico[col_data] >= inicio_contexto]
+    juntos = pd.concat([
+        contexto[[col_regiao, col_data, col_y]].assign(_linha=-1),
+        df_novo[[col_regiao, col_data, col_y]].assign(_linha=np.arange(len(df_novo))),
+    ], ignore_index=True).astype({col_regiao: str})
+    juntos = add_lag_features(juntos, col_regiao, col_data, col_y)
+    juntos = juntos[juntos['_linha'] >= 0].sort_values('_linha')
+
+    df_novo = df_novo.drop(columns=LAG_COLUMNS, errors='ignore').reset_index(drop=True)
+    for coluna in LAG_COLUMNS:
+        df_novo[coluna] = juntos[coluna].to_numpy()
+    return df_novo
+
+
+# --- 3. Estado Incremental (Streaming / Previsão Recursiva) ---
+
+class EstadoJanelas:
+    """Estado das features de defasagem de uma série diária, atualizado em O(1) por dia.
+
+    Guarda um buffer circular com os últimos HISTORICO_NECESSARIO dias (valor e se houve
+    observação), a soma corrente e o nº de dias ausentes de cada janela e, para os
+    máximos, uma deque monotônica por janela (O(1) amortizado). Se as datas forem
+    informadas, os dias pulados entram como ausentes, como no cálculo em lote.
+    """
+
+    def __init__(self):
+        self.buffer = np.zeros(HISTORICO_NECESSARIO, dtype=np.int64)
+        self.observado = np.zeros(HISTORICO_NECESSARIO, dtype=bool)
+        self.n = 0  # Total de dias vistos (observados ou ausentes)
+        self.ultima_data = None
+        self.somas = {j: 0 for j in JANELAS}
+        self.ausentes = {j: 0 for j in JANELAS}
+        self.maximos = {j: deque() for j in JANELAS}  # (posição, valor), valores decrescentes
+
+    def _posicao(self, atras):
+        return (self.n - atras) % HISTORICO_NECESSARIO
+
+    def _tem(self, atras):
+        """Se houve observação 'atras' dias antes do próximo (1 = o último dia)."""
+        return self.n >= atras and self.observado[self._posicao(atras)]
+
+    def _registrar(self, v):
+        """Avança um dia: v é o valor quantizado (int) ou None para dia ausente."""
+        for j in JANELAS:
+            if v is None:
+                self.ausentes[j] += 1
+            else:
+                self.somas[j] += v
+            if self.n >= j:
+                if self._tem(j):
+                    self.somas[j] -= int(self.buffer[self._posicao(j)])
+                else:
+                    self.ausentes[j] -= 1
+
+            fila = self.maximos[j]
+            if v is not None:
+                while fila and fila[-1][1] <= v:
+                    fila.pop()
+                fila.append((self.n, v))
+            while fila and fila[0][0] <= self.n - j:
+                fila.popleft()
+
+        self.buffer[self.n % HISTORICO_NECESSARIO] = 0 if v is None else v
+        self.observado[self.n % HISTORICO_NECESSARIO] = v is not None
+        self.n += 1
+
+    def _avancar(self, data):
+        """Registra como ausentes os dias entre a última observação e 'data'."""
+        if data is None:
+            return
+        data = pd.Timestamp(data).normalize()
+        if self.ultima_data is not None:
+            pulados = (data - self.ultima_data).days - 1
+            if pulados < 0:
+                raise ValueError(f"Datas fora de ordem: {data.date()} depois de {self.ultima_data.date()}")
+            # Depois de HISTORICO_NECESSARIO dias ausentes nada mais do buffer é usado
+            for _ in range(min(pulados, HISTORICO_NECESSARIO)):
+                self._registrar(None)
+        self.ultima_data = data - pd.Timedelta(days=1)
+
+    def update(self, y, data=None):
+        """Registra a observação (ou previsão, na previsão recursiva) de um dia."""
+        self._avancar(data)
+        self._registrar(None if np.isnan(y) else int(_quantizar(y)))
+        if data is not None:
+            self.ultima_data = pd.Timestamp(data).normalize()
+
+    def features(self, data=None):
+        """Features do próximo dia (ou do dia 'data') a partir das observações já registradas."""
+        self._avancar(data)
+        feats = {}
+        for lag in LAGS:
+            feats[f'y_lag_{lag}'] = self.buffer[self._posicao(lag)] / ESCALA if self._tem(lag) else np.nan
+        completas = {j: self.n >= j and self.ausentes[j] == 0 for j in JANELAS}
+        for j in JANELAS:
+            feats[f'y_media_{j}'] = self.somas[j] / j / ESCALA if completas[j] else np.nan
+        for j in JANELAS:
+            feats[f'y_max_{j}'] = self.maximos[j][0][1] / ESCALA if completas[j] else np.nan
+        return feats
+
+
+class EstadoLags:
+    """Um EstadoJanelas por região, aquecido a partir do fim do histórico."""
+
+    def __init__(self):
+        self.regioes = {}
+
+    @classmethod
+    def from_history(cls, df, col_regiao='Região', col_data='ds', col_y='y'):
+        """Aquece o estado com os últimos HISTORICO_NECESSARIO dias de cada região."""
+        estado = cls()
+        df = df.sort_values([col_regiao, col_data], kind='stable')
+        for regiao, grupo in df.groupby(col_regiao, sort=False, observed=True):
+            datas = pd.DatetimeIndex(grupo[col_data]).normalize()
+            recentes = datas > datas.max() - pd.Timedelta(days=HISTORICO_NECESSARIO)
+            for data, valor in zip(datas[recentes], grupo[col_y].to_numpy()[recentes]):
+                estado.update(regiao, valor, data)
+        return estado
+
+    def update(self, regiao, y, data=None):
+        self.regioes.setdefault(regiao, EstadoJanelas()).update(y, data)
+
+    def features(self, regiao, data=None):
+        return self.regioes.setdefault(regiao, EstadoJanelas()).features(data)
@@ -0,0 +1,133 @@
+import pandas as pd
+import numpy as np
+import os
+import sys
+import threading
+
+try:
+    import resource  # Só existe em Unix (Linux/Mac)
+except ImportError:
+    resource = None
+
+
+# --- 1. Medições ---
+
+def peak_rss_mb():
+    """Pico de memória residente do processo até agora (MB), ou None se indisponível."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return pico / 1024 ** 2 if sys.platform == 'darwin' else pico / 1024
+
+def current_rss_mb():
+    """Memória residente atual do processo (MB), ou None se indisponível (lê /proc, só Linux)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class MonitorRSS:
+    """Pico de RSS durante um bloco 'with', amostrado por uma thread a cada 'intervalo' segundos.
+
+    Diferente do peak_rss_mb() (pico desde o início do processo), mede só o bloco.
+    Sem /proc, cai no pico do processo.
+    """
+
+    def __init__(self, intervalo=0.005):
+        self.intervalo = intervalo
+        self.inicio_mb = self.pico_mb = None
+        self._parar = threading.Event()
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            self.pico_mb = max(self.pico_mb, current_rss_mb())
+
+    def __enter__(self):
+        self.inicio_mb = current_rss_mb()
+        if self.inicio_mb is not None:
+            self.pico_mb = self.inicio_mb
+            self._thread = threading.Thread(target=self._amostrar, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.inicio_mb is None:
+            self.pico_mb = peak_rss_mb()
+            return False
+        self._parar.set()
+        self._thread.join()
+        self.pico_mb = max(self.pico_mb, current_rss_mb())
+        return False
+
+    @property
+    def acrescimo_mb(self):
+        """Quanto o pico do bloco passou da memória no início dele."""
+        if self.inicio_mb is None or self.pico_mb is None:
+            return None
+        return self.pico_mb - self.inicio_mb
+
+def frame_bytes(df):
+    """Memória real de um DataFrame (inclui o conteúdo das strings/categorias)."""
+    return int(df.memory_usage(index=False, deep=True).sum())
+
+def naive_frame_bytes(df):
+    """Memória que o mesmo DataFrame ocuparia com os tipos padrão do pandas.
+
+    Números como int64/float64, bool como bool e texto/categorias como object
+    (uma string por linha) — o que create_features() produzia antes dos tipos compactos.
+    """
+    total = 0
+    for col in df.columns:
+        serie = df[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype) or serie.dtype == object:
+            total += int(serie.astype(object).memory_usage(index=False, deep=True))
+        elif serie.dtype == bool:
+            total += len(serie)
+        else:
+            total += 8 * len(serie)
+    return total
+
+
+# --- 2. Relatório por Etapa ---
+
+class RelatorioMemoria:
+    """Memória de cada etapa de um pipeline: tamanho do DataFrame e pico de RSS do processo."""
+
+    def __init__(self, titulo):
+        self.titulo = titulo
+        self.etapas = []
+
+    def registrar(self, etapa, df=None):
+        """Registra uma etapa (com o DataFrame que ela produziu, se houver)."""
+        registro = {'etapa': etapa, 'linhas': None, 'mb': None, 'mb_tipos_padrao': None,
+                    'bytes_por_linha': None, 'pico_rss_mb': peak_rss_mb()}
+        if df is not None:
+            nbytes = frame_bytes(df)
+            registro.update(
+                linhas=len(df),
+                mb=nbytes / 1024 ** 2,
+                mb_tipos_padrao=naive_frame_bytes(df) / 1024 ** 2,
+                bytes_por_linha=nbytes / len(df) if len(df) else 0.0,
+            )
+        self.etapas.append(registro)
+        return registro
+
+    def to_frame(self):
+        return pd.DataFrame(self.etapas).set_index('etapa').astype({'linhas': 'Int64'})
+
+    def imprimir(self):
+        """Loga a tabela: um evento por etapa, com os números da etapa em 'metricas' (logs JSON)."""
+        from instrumentation import get_logger  # instrumentation importa este módulo: import tardio
+        log = get_logger("memory_report")
+
+        log.info(f"\n📊 Memória por etapa — {self.titulo}")
+        with pd.option_context('display.float_format', '{:,.2f}'.format, 'display.width', 160, 'display.max_columns', None):
+            cabecalho, *linhas = self.to_frame().to_string(index_names=False).split('\n')
+        log.info(cabecalho)
+        for linha, registro in zip(linhas, self.etapas):
+            log.info(linha, extra={'metricas': {'relatorio': self.titulo, **registro}})
+        pico = max((e['pico_rss_mb'] for e in self.etapas if e['pico_rss_mb'] is not None), default=np.nan)
+        log.info(f"Pico de RSS do processo: {pico:,.1f} MB",
+                 extra={'metricas': {'relatorio': self.titulo, 'pico_rss_mb': pico}})
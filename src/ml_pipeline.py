@@ -1,111 +1,238 @@
 import pandas as pd
-import xgboost as xgb
-from pathlib import Path
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
 import os
+import time
+import argparse
 import warnings
 
+from config import DATA_PROCESSED_DIR, MODELS_DIR
+from dataset_store import load_master_dataset, MASTER_PARQUET, MASTER_HORARIO_PARQUET
+from prediction_store import dataset_hash, save_predictions
+from model_registry import register_model, model_key
+from memory_report import RelatorioMemoria
+from lag_features import LAG_COLUMNS
+from news_events import EVENT_COLUMNS
+from instrumentation import (get_logger, etapa, execucao, instrumentar, registrar_leitura, etapas_isoladas,
+                             incorporar_etapas)
+
 # Ignorar avisos
 warnings.filterwarnings('ignore')
 
-# --- 1. Configuração de Caminhos ---
-# Define o diretório base do projeto (a pasta 'projeto/')
-try:
-    BASE_DIR = Path(__file__).resolve().parent.parent
-except NameError:
-    BASE_DIR = Path(os.getcwd()).resolve()
-
-DATA_PROCESSED_DIR = BASE_DIR / "data" / "processed"
-MODELS_DIR = BASE_DIR / "data" / "models"
-
-# Garante que a pasta 'models' exista
-MODELS_DIR.mkdir(parents=True, exist_ok=True)
-
-print(f"Diretório Base: {BASE_DIR}")
-print(f"Pasta de Dados Processados: {DATA_PROCESSED_DIR}")
-print(f"Pasta de Modelos: {MODELS_DIR}")
+log = get_logger("ml_pipeline")
 
 # --- 2. Função de Treinamento ---
 
-def load_data():
-    """Carrega o master dataset processado."""
-    print("Carregando master_dataset.csv...")
+@instrumentar()
+def load_data(granularidade='diario'):
+    """Carrega o master dataset processado (diário ou horário)."""
+    log.info(f"Carregando master dataset ({granularidade})...")
+    caminho = MASTER_HORARIO_PARQUET if granularidade == 'horario' else MASTER_PARQUET
     try:
-        df = pd.read_csv(
-            DATA_PROCESSED_DIR / "master_dataset.csv", 
-            sep=';', 
-            decimal=',',
-            parse_dates=['ds']
-        )
+        df = load_master_dataset(caminho=caminho)
+        registrar_leitura(caminho)
         # Renomear colunas se necessário (para o XGBoost)
         df = df.rename(columns={'População 2024': 'Populacao'})
-        print("✅ Dados carregados.")
+        log.info("✅ Dados carregados.")
         return df
     except FileNotFoundError:
-        print(f"❌ ERRO: 'master_dataset.csv' não encontrado em {DATA_PROCESSED_DIR}")
-        print("Por favor, rode 'src/data_processing.py' primeiro.")
+        log.error(f"❌ ERRO: master dataset não encontrado em {DATA_PROCESSED_DIR}")
+        log.error("Por favor, rode 'src/data_processing.py' primeiro.")
         return None
 
-def train_and_save_models(df):
-    """Treina o modelo V4 (XGBoost-Only) em 100% dos dados e salva."""
+# Esta é a lista de features vencedora da nossa V4
+FEATURES_V4 = [
+    'Temperatura', 'Umidade', 'Populacao', 'e_feriado', 
+    'dia_semana', 'dia_mes', 'semana_ano', 'mes', 'trimestre'
+]
+
+# V4 + sinal autorregressivo (defasagens e janelas móveis de 'y', ver lag_features.py)
+FEATURES_LAGS = FEATURES_V4 + LAG_COLUMNS
+
+# Modo horário: V4 + hora do dia
+FEATURES_HORARIO = FEATURES_V4 + ['hora']
+
+# O alvo (target) que queremos prever
+TARGET = 'y'
+
+# Parâmetros do XGBoost (os mesmos do notebook) + 'hist', o método de árvore mais rápido na CPU
+PARAMS_V4 = dict(
+    objective='reg:squarederror',
+    n_estimators=1000,
+    learning_rate=0.01,
+    max_depth=5,
+    subsample=0.8,
+    random_state=42,
+    tree_method='hist',
+    # NOTA: Removemos 'early_stopping_rounds' 
+    # pois estamos treinando no set COMPLETO (não há set de validação)
+)
+
+def build_regional_matrices(df, features=FEATURES_V4, target=TARGET):
+    """Monta X (float32 contíguo), y e ds uma única vez e devolve fatias (views) por região.
+
+    As linhas de cada região ficam na mesma ordem do filtro df[df['Região'] == regiao],
+    então os modelos treinados são idênticos aos do loop original.
+    """
+    codigos = df['Região'].astype('category')
+    regioes = codigos.cat.categories
+    codigos = codigos.cat.codes.to_numpy()
+
+    X = df[features].to_numpy(dtype=np.float32)
+    y = df[target].to_numpy(dtype=np.float32)
+    ds = df['ds'].to_numpy()
+
+    # O Parquet já vem ordenado por região; só reordena (uma cópia) se precisar
+    if np.any(np.diff(codigos) < 0):
+        ordem = np.argsort(codigos, kind='stable')
+        X, y, ds, codigos = X[ordem], y[ordem], ds[ordem], codigos[ordem]
+
+    limites = np.searchsorted(codigos, np.arange(len(regioes) + 1))
+    fatias = {
+        regiao: slice(limites[i], limites[i + 1])
+        for i, regiao in enumerate(regioes) if limites[i + 1] > limites[i]
+    }
+    return {regiao: (X[f], y[f], ds[f]) for regiao, f in fatias.items()}
+
+def _treinar_regiao(regiao, X_train, y_train, features, n_jobs):
+    """Treina o modelo de uma região (roda dentro do pool de threads/processos)."""
+    import xgboost as xgb  # Import pesado: só quando há treino (importar o módulo fica leve)
+
+    inicio = time.perf_counter()
+    with etapa("treino", regiao=regiao, linhas_entrada=len(y_train)):
+        model_xgb = xgb.XGBRegressor(**PARAMS_V4, n_jobs=n_jobs)
+        model_xgb.fit(X_train, y_train)
+        model_xgb.get_booster().feature_names = list(features)
+    return regiao, model_xgb, time.perf_counter() - inicio
+
+def _treinar_regiao_processo(*tarefa):
+    """_treinar_regiao num processo filho: devolve também as etapas medidas lá."""
+    with etapas_isoladas("treino") as filho:
+        resultado = _treinar_regiao(*tarefa)
+    return resultado, filho.etapas
+
+def _com_etapas_do_filho(saida):
+    """Junta ao relatório da execução as etapas do filho e devolve o resultado do treino."""
+    resultado, etapas = saida
+    incorporar_etapas(etapas)
+    return resultado
+
+def train_and_save_models(df, workers=1, threads=None, processos=False, features=FEATURES_V4,
+                          granularidade='diario'):
+    """Treina o modelo V4 (XGBoost-Only) em 100% dos dados e registra no model registry.
+
+    Também grava no prediction store as previsões in-sample (e resíduos) de cada
+    modelo, chaveadas pelo hash do modelo e do dataset, para o dashboard.
+
+    'features' escolhe o conjunto de features (FEATURES_V4 ou FEATURES_LAGS); ele fica
+    registrado junto do modelo, e é por ele que dashboard/serviço/previsão montam o X.
+    Modelos horários são registrados como 'Região@horario' (ver model_key).
+
+    Com workers > 1 as regiões são treinadas em paralelo (threads, ou processos se
+    processos=True). O orçamento global de threads (padrão: nº de CPUs) é dividido
+    entre os workers e o n_jobs de cada XGBoost. Retorna o tempo (s) por região e o total.
+    """
     if df is None:
-        print("Treinamento cancelado devido a erro no carregamento.")
+        log.error("Treinamento cancelado devido a erro no carregamento.")
         return
 
-    # Esta é a lista de features vencedora da nossa V4
-    features = [
-        'Temperatura', 'Umidade', 'Populacao', 'e_feriado', 
-        'dia_semana', 'dia_mes', 'semana_ano', 'mes', 'trimestre'
-    ]
-    
-    # O alvo (target) que queremos prever
-    target = 'y'
-
-    print("Iniciando treinamento dos 4 modelos regionais...")
-
-    # Loop por cada região
-    for regiao in df['Região'].unique():
-        print(f"\n--- Treinando para Região: {regiao} ---")
-        
-        # Filtra os dados apenas para esta região
-        df_regional = df[df['Região'] == regiao].copy()
-        
-        X_train = df_regional[features]
-        y_train = df_regional[target]
-        
-        # Define o modelo XGBoost
-        # (Usamos os mesmos parâmetros do notebook)
-        model_xgb = xgb.XGBRegressor(
-            objective='reg:squarederror',
-            n_estimators=1000,
-            learning_rate=0.01,
-            max_depth=5,
-            subsample=0.8,
-            random_state=42
-            # NOTA: Removemos 'early_stopping_rounds' 
-            # pois estamos treinando no set COMPLETO (não há set de validação)
-        )
-        
-        # Treina o modelo em 100% dos dados da região
-        model_xgb.fit(X_train, y_train)
-        
-        # Define o caminho de saída
-        caminho_modelo = MODELS_DIR / f"xgb_model_{regiao.lower().replace('/', '_')}.json"
-        
-        # Salva o modelo
-        model_xgb.save_model(caminho_modelo)
-        
-        print(f"  ✅ Modelo para {regiao} treinado e salvo em:")
-        print(f"     {caminho_modelo}")
+    inicio_total = time.perf_counter()
+    relatorio = RelatorioMemoria(f"treinamento ({granularidade})")
+    relatorio.registrar("master dataset", df)
+    with etapa("build_regional_matrices", linhas_entrada=len(df)) as medida:
+        matrizes = build_regional_matrices(df, features)
+        medida.linhas_saida = sum(len(y) for _, y, _ in matrizes.values())
+    relatorio.registrar("matrizes float32")
+
+    orcamento = threads or os.cpu_count() or 1
+    workers = max(1, min(workers, len(matrizes)))
+    n_jobs = max(1, orcamento // workers)
+
+    log.info(f"Iniciando treinamento dos {len(matrizes)} modelos regionais "
+             f"({workers} worker(s) x {n_jobs} thread(s) do XGBoost)...")
+
+    versao_dataset = dataset_hash(granularidade)
+    tempos = {}
+    tarefas = [(regiao, X, y, features, n_jobs) for regiao, (X, y, _) in matrizes.items()]
+    # O 'with' encerra o pool mesmo se o treino/registro de uma região falhar
+    with ExitStack() as pilha:
+        if workers == 1:
+            resultados = (_treinar_regiao(*tarefa) for tarefa in tarefas)
+        elif processos:
+            # As etapas medidas nos filhos voltam com o resultado e entram no relatório do pai
+            executor = pilha.enter_context(ProcessPoolExecutor(max_workers=workers))
+            futuros = [executor.submit(_treinar_regiao_processo, *tarefa) for tarefa in tarefas]
+            resultados = (_com_etapas_do_filho(futuro.result()) for futuro in as_completed(futuros))
+        else:
+            executor = pilha.enter_context(ThreadPoolExecutor(max_workers=workers))
+            futuros = [executor.submit(_treinar_regiao, *tarefa) for tarefa in tarefas]
+            resultados = (futuro.result() for futuro in as_completed(futuros))
+
+        for regiao, model_xgb, segundos in resultados:
+            X, y, ds = matrizes[regiao]
+            chave = model_key(regiao, granularidade)
+            with etapa("registro", regiao=regiao, linhas_entrada=len(y)) as medida:
+                registro = register_model(chave, model_xgb, features, {
+                    'params': PARAMS_V4,
+                    'n_linhas': len(y),
+                    'data_inicio': pd.Timestamp(ds.min()).isoformat(),
+                    'data_fim': pd.Timestamp(ds.max()).isoformat(),
+                    'dataset_hash': versao_dataset,
+                    'segundos_treino': segundos,
+                    'granularidade': granularidade,
+                })
+                tempos[regiao] = segundos
+
+                save_predictions(chave, ds, y, model_xgb.predict(X), registro['hash'], versao_dataset)
+                medida.linhas_saida = len(y)
+
+            log.info(f"  ✅ Modelo para {chave} treinado em {segundos:.2f}s e registrado como "
+                     f"{registro['versao']} (hash {registro['hash'][:12]})")
+
+    tempos['total'] = time.perf_counter() - inicio_total
+    relatorio.registrar("modelos treinados")
+    log.info(f"\n⏱️ Tempo total de treinamento: {tempos['total']:.2f}s")
+    relatorio.imprimir()
+    return tempos
 
 # --- 3. Função Principal ---
 
-def main():
+@execucao("ml_pipeline")
+def main(workers=1, threads=None, processos=False, lags=False, horario=False, eventos=False):
     """Orquestra o pipeline de ML: carrega dados, treina e salva modelos."""
-    print("--- INICIANDO PIPELINE DE TREINAMENTO DE ML ---")
-    df = load_data()
-    train_and_save_models(df)
-    print("\n--- PIPELINE DE TREINAMENTO CONCLUÍDO ---")
+    log.info("--- INICIANDO PIPELINE DE TREINAMENTO DE ML ---")
+    log.info(f"Pasta de Dados Processados: {DATA_PROCESSED_DIR}")
+    log.info(f"Pasta de Modelos: {MODELS_DIR}")
+    if horario and lags:
+        log.error("❌ ERRO: as defasagens (--lags) só existem no master diário.")
+        return
+    granularidade = 'horario' if horario else 'diario'
+    df = load_data(granularidade)
+    features = FEATURES_HORARIO if horario else FEATURES_LAGS if lags else FEATURES_V4
+    if eventos:
+        if df is None or not set(EVENT_COLUMNS).issubset(df.columns):
+            log.error("❌ ERRO: o master dataset não tem as contagens de eventos. "
+                      "Rode 'src/news_events.py' e depois 'src/data_processing.py'.")
+            return
+        features = features + EVENT_COLUMNS
+    train_and_save_models(df, workers=workers, threads=threads, processos=processos, features=features,
+                          granularidade=granularidade)
+    log.info("\n--- PIPELINE DE TREINAMENTO CONCLUÍDO ---")
 
 # --- Ponto de Entrada ---
+def cli(argv=None, prog=None):
+    """Linha de comando (também usada por 'peaksense train')."""
+    parser = argparse.ArgumentParser(prog=prog, description="Pipeline de treinamento de ML")
+    parser.add_argument("--workers", type=int, default=1, help="Regiões treinadas em paralelo")
+    parser.add_argument("--threads", type=int, default=None, help="Orçamento total de threads (padrão: nº de CPUs)")
+    parser.add_argument("--processos", action="store_true", help="Usa pool de processos em vez de threads")
+    parser.add_argument("--lags", action="store_true", help="Inclui as features de defasagem/janelas móveis de 'y'")
+    parser.add_argument("--horario", action="store_true", help="Treina no master horário (master_horario.parquet)")
+    parser.add_argument("--eventos", action="store_true", help="Inclui as contagens diárias de eventos das notícias")
+    args = parser.parse_args(argv)
+    main(workers=args.workers, threads=args.threads, processos=args.processos, lags=args.lags, horario=args.horario,
+         eventos=args.eventos)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    cli()
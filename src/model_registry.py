@@ -0,0 +1,214 @@
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+import hashlib
+import json
+import os
+import argparse
+import threading
+
+from config import MODELS_DIR, ESTADOS_POR_SUBMERCADO
+
+# --- 1. Configuração de Caminhos ---
+REGISTRY_DIR = MODELS_DIR / "registry"
+
+# Layout do registry:
+#   registry/<regiao>/<versao>/model.ubj       -> booster no formato binário UBJ
+#   registry/<regiao>/<versao>/metadata.json   -> hash, features e metadados de treino
+#   registry/<regiao>/<versao>/compilado.npz   -> árvores achatadas (tree_inference.py, sob demanda)
+#   registry/<regiao>/PROMOVIDO                -> versão em produção (troca atômica)
+ARQUIVO_MODELO = "model.ubj"
+ARQUIVO_METADADOS = "metadata.json"
+ARQUIVO_PROMOVIDO = "PROMOVIDO"
+
+# O xgboost (import de ~1s) só é importado nas funções que leem/gravam boosters:
+# consultar versões e metadados não depende dele.
+
+ModeloCarregado = namedtuple('ModeloCarregado', ['regiao', 'versao', 'hash', 'features', 'metadata', 'model'])
+
+
+def _slug(regiao):
+    return regiao.lower().replace('/', '_')
+
+def model_key(regiao, granularidade='diario'):
+    """Chave da região no registry: os modelos horários ficam em 'Região@horario'."""
+    return regiao if granularidade == 'diario' else f"{regiao}@{granularidade}"
+
+def version_dir(regiao, versao):
+    """Pasta de uma versão no registry."""
+    return REGISTRY_DIR / _slug(regiao) / versao
+
+def legacy_model_path(regiao):
+    """Caminho antigo (JSON solto) do modelo de uma região."""
+    return MODELS_DIR / f"xgb_model_{_slug(regiao)}.json"
+
+
+# --- 2. Escrita (Registro e Promoção) ---
+
+def _escrever_atomico(caminho, conteudo):
+    tmp = caminho.with_suffix(caminho.suffix + '.tmp')
+    tmp.write_text(conteudo, encoding='utf-8')
+    os.replace(tmp, caminho)
+
+def _proxima_versao(pasta_regiao):
+    versoes = [int(p.name[1:]) for p in pasta_regiao.glob('v*') if p.name[1:].isdigit()]
+    return f"v{max(versoes, default=0) + 1:04d}"
+
+def register_model(regiao, model, features, metadados=None, promover=True):
+    """Salva um novo artefato versionado (UBJ + metadados) e, por padrão, promove.
+
+    O hash é o SHA-256 do arquivo UBJ, então duas versões com o mesmo conteúdo
+    têm o mesmo hash (é ele que chaveia o prediction store).
+    """
+    import xgboost as xgb
+
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    pasta_regiao = REGISTRY_DIR / _slug(regiao)
+    pasta_regiao.mkdir(parents=True, exist_ok=True)
+
+    versao = _proxima_versao(pasta_regiao)
+    pasta = pasta_regiao / versao
+    pasta.mkdir()
+
+    conteudo = booster.save_raw(raw_format='ubj')
+    (pasta / ARQUIVO_MODELO).write_bytes(conteudo)
+
+    metadata = {
+        'regiao': regiao,
+        'versao': versao,
+        'hash': hashlib.sha256(conteudo).hexdigest(),
+        'features': list(features),
+        'formato': 'ubj',
+        'xgboost_version': xgb.__version__,
+        'criado_em': datetime.now(timezone.utc).isoformat(),
+        **(metadados or {}),
+    }
+    _escrever_atomico(pasta / ARQUIVO_METADADOS, json.dumps(metadata, indent=2, default=str))
+
+    if promover:
+        promote(regiao, versao)
+    return metadata
+
+def promote(regiao, versao):
+    """Aponta a região para uma versão; processos rodando pegam a troca no próximo get()."""
+    pasta_regiao = REGISTRY_DIR / _slug(regiao)
+    if not (pasta_regiao / versao / ARQUIVO_MODELO).exists():
+        raise FileNotFoundError(f"Versão {versao} de {regiao} não existe no registry")
+    _escrever_atomico(pasta_regiao / ARQUIVO_PROMOVIDO, versao)
+
+def promoted_version(regiao):
+    """Versão promovida de uma região (None se a região não tem modelo registrado)."""
+    caminho = REGISTRY_DIR / _slug(regiao) / ARQUIVO_PROMOVIDO
+    if not caminho.exists():
+        return None
+    return caminho.read_text(encoding='utf-8').strip()
+
+def load_metadata(regiao, versao=None):
+    """Metadados de uma versão (padrão: a promovida)."""
+    versao = versao or promoted_version(regiao)
+    if versao is None:
+        return None
+    with open(REGISTRY_DIR / _slug(regiao) / versao / ARQUIVO_METADADOS, encoding='utf-8') as f:
+        return json.load(f)
+
+def import_legacy_model(regiao):
+    """Registra o JSON solto antigo (xgb_model_<regiao>.json) como primeira versão da região."""
+    caminho = legacy_model_path(regiao)
+    if not caminho.exists():
+        return None
+    import xgboost as xgb
+
+    booster = xgb.Booster()
+    booster.load_model(caminho)
+    return register_model(regiao, booster, booster.feature_names or [], {'origem': caminho.name})
+
+def import_legacy_models(regioes=None, forcar=False):
+    """Migração única: registra os JSONs legados das regiões que ainda não têm versão no registry."""
+    importados = {}
+    for regiao in regioes or ESTADOS_POR_SUBMERCADO:
+        if promoted_version(regiao) is not None and not forcar:
+            continue
+        registro = import_legacy_model(regiao)
+        if registro is not None:
+            importados[regiao] = registro['versao']
+    return importados
+
+
+# --- 3. Leitura (Lazy, com Cache LRU Limitado) ---
+
+class ModelRegistry:
+    """Carrega modelos sob demanda, com cache LRU limitado pelo tamanho dos artefatos.
+
+    A cada get() a versão promovida é relida (um arquivo minúsculo); se mudou, a nova
+    versão é carregada e passa a ser servida, sem reiniciar o processo.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self._cache = OrderedDict()  # (regiao, versao) -> (ModeloCarregado, tamanho)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, regiao):
+        """Modelo promovido da região (None se não houver versão registrada).
+
+        Só lê: os JSONs legados entram no registry pela migração explícita
+        ('python src/model_registry.py --importar-legados'), nunca numa leitura.
+        """
+        versao = promoted_version(regiao)
+        if versao is None:
+            return None
+
+        chave = (regiao, versao)
+        with self._lock:
+            if chave in self._cache:
+                self._cache.move_to_end(chave)
+                return self._cache[chave][0]
+
+        carregado, tamanho = self._carregar(regiao, versao)
+        with self._lock:
+            # Outra thread pode ter carregado a mesma versão enquanto esta lia o arquivo:
+            # fica a que já está no cache, sem somar os bytes de novo
+            if chave in self._cache:
+                self._cache.move_to_end(chave)
+                return self._cache[chave][0]
+            self._cache[chave] = (carregado, tamanho)
+            self._bytes += tamanho
+            self._evict()
+        return carregado
+
+    def _carregar(self, regiao, versao):
+        import xgboost as xgb
+
+        caminho = REGISTRY_DIR / _slug(regiao) / versao / ARQUIVO_MODELO
+        metadata = load_metadata(regiao, versao)
+        model = xgb.XGBRegressor()
+        model.load_model(caminho)
+        carregado = ModeloCarregado(regiao, versao, metadata['hash'], metadata['features'], metadata, model)
+        return carregado, caminho.stat().st_size
+
+    def _evict(self):
+        # Remove os menos usados até caber no limite (sempre mantém o mais recente)
+        while self._bytes > self.max_bytes and len(self._cache) > 1:
+            _, (_, tamanho) = self._cache.popitem(last=False)
+            self._bytes -= tamanho
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._bytes = 0
+
+
+# --- Ponto de Entrada (migração dos modelos legados) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Model registry: migração dos JSONs legados")
+    parser.add_argument("--importar-legados", action="store_true",
+                        help="Registra os xgb_model_<regiao>.json das regiões ainda sem versão no registry")
+    parser.add_argument("--forcar", action="store_true", help="Importa mesmo se a região já tiver versão")
+    args = parser.parse_args()
+    if not args.importar_legados:
+        parser.error("nada a fazer (use --importar-legados)")
+    importados = import_legacy_models(forcar=args.forcar)
+    for regiao, versao in importados.items():
+        print(f"✅ {regiao}: modelo legado registrado como {versao}")
+    if not importados:
+        print("Nenhum modelo legado a importar.")
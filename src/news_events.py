@@ -0,0 +1,205 @@
+import pandas as pd
+from pathlib import Path
+import time
+import argparse
+import warnings
+
+from config import DATA_PROCESSED_DIR, ESTADOS_POR_SUBMERCADO
+from climate_ingestion import UF_POR_NOME, FUSO_HORAS
+from data_collection import NOTICIAS_CSV, url_hash
+
+# Ignorar avisos
+warnings.filterwarnings('ignore')
+
+# --- 1. Configuração de Caminhos ---
+EVENTOS_CACHE_PARQUET = DATA_PROCESSED_DIR / "eventos_cache.parquet"     # Uma linha por artigo (hash da URL)
+EVENTOS_DIARIOS_PARQUET = DATA_PROCESSED_DIR / "eventos_diarios.parquet"  # (Data, Região) -> contagens
+
+MODELO_SPACY = "pt_core_news_lg"
+# Só o NER é usado: o resto do pipeline nem é carregado
+COMPONENTES_EXCLUIDOS = ['morphologizer', 'parser', 'lemmatizer', 'attribute_ruler', 'senter']
+
+# Suba esta versão ao mudar regras/gazetteer (invalida o cache de classificações)
+VERSAO_EVENTOS = 1
+
+
+# --- 2. Regras de Tema e Gazetteer de Regiões ---
+
+# Mesmas regras do nlp_analysis.ipynb, em ordem de prioridade, aplicadas à manchete
+REGRAS_TEMA = [
+    ('Problema Operacional', ["apagão", "falha", "blecaute", "instabilidade"]),
+    ('Evento Climático Extremo', ["onda de calor", "frio intenso", "inmet", "alerta laranja"]),
+    ('Regulatório/Empresarial', ["aneel", "bandeira tarifária", "tarifa", "alupar", "transmissão"]),
+    ('Manutenção', ["manutenção", "programada"]),
+]
+OUTROS = "Outros"
+
+# Tema -> coluna de contagem diária no master dataset
+COLUNA_POR_TEMA = {
+    'Problema Operacional': 'eventos_operacionais',
+    'Evento Climático Extremo': 'eventos_climaticos',
+    'Regulatório/Empresarial': 'eventos_regulatorios',
+    'Manutenção': 'eventos_manutencao',
+}
+EVENT_COLUMNS = list(COLUNA_POR_TEMA.values())
+
+CAPITAIS = {
+    'AC': 'Rio Branco', 'AL': 'Maceió', 'AP': 'Macapá', 'AM': 'Manaus', 'BA': 'Salvador',
+    'CE': 'Fortaleza', 'DF': 'Brasília', 'ES': 'Vitória', 'GO': 'Goiânia', 'MA': 'São Luís',
+    'MT': 'Cuiabá', 'MS': 'Campo Grande', 'MG': 'Belo Horizonte', 'PA': 'Belém', 'PB': 'João Pessoa',
+    'PR': 'Curitiba', 'PE': 'Recife', 'PI': 'Teresina', 'RJ': 'Rio de Janeiro', 'RN': 'Natal',
+    'RS': 'Porto Alegre', 'RO': 'Porto Velho', 'SC': 'Florianópolis', 'SP': 'São Paulo',
+    'SE': 'Aracaju', 'TO': 'Palmas',
+}
+REGIOES_POR_TERMO = {
+    'norte': 'Norte', 'nordeste': 'Nordeste', 'sul': 'Sul',
+    'sudeste': 'Sudeste/Centro-Oeste', 'centro-oeste': 'Sudeste/Centro-Oeste',
+}
+
+def build_gazetteer():
+    """Nome de lugar (minúsculo) -> Submercado: estados, capitais e nomes das regiões."""
+    submercado_por_uf = {uf: regiao for regiao, ufs in ESTADOS_POR_SUBMERCADO.items() for uf in ufs}
+    gazetteer = dict(REGIOES_POR_TERMO)
+    gazetteer.update({f'região {termo}': regiao for termo, regiao in REGIOES_POR_TERMO.items()})
+    for nome, uf in UF_POR_NOME.items():
+        if uf in submercado_por_uf:
+            gazetteer[nome.lower()] = submercado_por_uf[uf]
+    for uf, capital in CAPITAIS.items():
+        gazetteer[capital.lower()] = submercado_por_uf[uf]
+    return gazetteer
+
+GAZETTEER = build_gazetteer()
+
+
+# --- 3. Classificação ---
+
+def classify_theme(manchete):
+    """Classificador por palavras-chave (o mesmo do notebook)."""
+    if not isinstance(manchete, str):
+        return OUTROS
+    texto = manchete.lower()
+    for tema, palavras in REGRAS_TEMA:
+        if any(palavra in texto for palavra in palavras):
+            return tema
+    return OUTROS
+
+def regions_from_doc(doc):
+    """Submercados citados nas entidades de local (LOC) do texto, em ordem alfabética."""
+    regioes = {GAZETTEER.get(ent.text.strip().lower()) for ent in doc.ents if ent.label_ == 'LOC'}
+    regioes.discard(None)
+    return sorted(regioes)
+
+def load_nlp(modelo=MODELO_SPACY):
+    import spacy  # Dependência pesada: só carregada quando há artigos a classificar
+    return spacy.load(modelo, exclude=COMPONENTES_EXCLUIDOS)
+
+def classify_articles(df, nlp=None, batch_size=64, n_process=1):
+    """Tema (manchete) e Submercados (NER no texto) de cada artigo.
+
+    Só os artigos com tema relevante passam pelo spaCy, em lote (nlp.pipe).
+    Retorna um DataFrame com 'url_hash', 'publishedAt', 'tema' e 'regioes' ('|'-separadas).
+    """
+    temas = df['title'].map(classify_theme)
+    relevantes = temas != OUTROS
+    regioes = pd.Series('', index=df.index)
+
+    if relevantes.any():
+        nlp = nlp or load_nlp()
+        textos = (df.loc[relevantes, 'title'].fillna('') + '. '
+                  + df.loc[relevantes, 'content'].fillna(df.loc[relevantes, 'description']).fillna(''))
+        docs = nlp.pipe(textos.tolist(), batch_size=batch_size, n_process=n_process)
+        regioes[relevantes] = ['|'.join(regions_from_doc(doc)) for doc in docs]
+
+    return pd.DataFrame({
+        'url_hash': df['url_hash'].to_numpy(),
+        'publishedAt': df['publishedAt'].to_numpy(),
+        'tema': temas.to_numpy(),
+        'regioes': regioes.to_numpy(),
+        'versao': f"{VERSAO_EVENTOS}|{MODELO_SPACY}",
+    })
+
+
+# --- 4. Cache por Artigo e Tabela Diária ---
+
+def load_event_cache(caminho=EVENTOS_CACHE_PARQUET):
+    """Classificações já feitas (só as da versão atual de regras/modelo)."""
+    caminho = Path(caminho)
+    if not caminho.exists():
+        return None
+    cache = pd.read_parquet(caminho)
+    return cache[cache['versao'] == f"{VERSAO_EVENTOS}|{MODELO_SPACY}"]
+
+def load_news_events(caminho=EVENTOS_DIARIOS_PARQUET):
+    """Contagem diária de eventos por Submercado (None se o artefato ainda não existe)."""
+    caminho = Path(caminho)
+    if not caminho.exists():
+        return None
+    return pd.read_parquet(caminho, memory_map=True)
+
+def daily_event_counts(classificacoes):
+    """(Data, Região) -> nº de artigos por tema.
+
+    O dia é o de Brasília. Artigos sem região identificada são nacionais e contam
+    para todos os Submercados.
+    """
+    eventos = classificacoes[classificacoes['tema'] != OUTROS].copy()
+    if eventos.empty:
+        return pd.DataFrame(columns=['Data', 'Região', *EVENT_COLUMNS])
+
+    publicado = pd.to_datetime(eventos['publishedAt'], utc=True).dt.tz_localize(None)
+    eventos['Data'] = (publicado + pd.Timedelta(hours=FUSO_HORAS)).dt.normalize()
+    todas = '|'.join(ESTADOS_POR_SUBMERCADO)
+    eventos['Região'] = eventos['regioes'].replace('', todas).str.split('|')
+    eventos = eventos.explode('Região')
+
+    contagens = pd.crosstab([eventos['Data'], eventos['Região']], eventos['tema'])
+    contagens = contagens.rename(columns=COLUNA_POR_TEMA).reindex(columns=EVENT_COLUMNS, fill_value=0)
+    return contagens.astype('int16').reset_index().rename_axis(columns=None)
+
+def build_news_events(caminho_csv=NOTICIAS_CSV, batch_size=64, n_process=1, nlp=None):
+    """Classifica só os artigos ainda fora do cache e regrava a tabela diária de eventos."""
+    df = pd.read_csv(caminho_csv, sep='|', dtype=str, encoding='utf-8').dropna(subset=['url'])
+    df['url_hash'] = df['url'].map(url_hash)
+    df = df.drop_duplicates('url_hash')
+
+    cache = load_event_cache()
+    conhecidos = set(cache['url_hash']) if cache is not None else set()
+    novos = df[~df['url_hash'].isin(conhecidos)]
+    print(f"{len(df)} artigos no CSV | {len(df) - len(novos)} em cache | {len(novos)} a classificar")
+
+    if len(novos):
+        inicio = time.perf_counter()
+        classificados = classify_articles(novos, nlp, batch_size, n_process)
+        print(f"✅ {len(novos)} artigos classificados em {time.perf_counter() - inicio:.2f}s "
+              f"({(classificados['tema'] != OUTROS).sum()} relevantes)")
+        cache = pd.concat([cache, classificados], ignore_index=True) if cache is not None else classificados
+        EVENTOS_CACHE_PARQUET.parent.mkdir(parents=True, exist_ok=True)
+        cache.to_parquet(EVENTOS_CACHE_PARQUET, index=False)
+
+    # A tabela diária reflete só os artigos presentes no CSV atual
+    diario = daily_event_counts(cache[cache['url_hash'].isin(df['url_hash'])])
+    diario.to_parquet(EVENTOS_DIARIOS_PARQUET, index=False)
+    return diario
+
+
+# --- 5. Função Principal ---
+
+def main(batch_size=64, n_process=1):
+    print("--- INICIANDO CLASSIFICAÇÃO DE EVENTOS (NOTÍCIAS) ---")
+    if not NOTICIAS_CSV.exists():
+        print(f"❌ ERRO: {NOTICIAS_CSV.name} não encontrado. Rode 'src/data_collection.py' primeiro.")
+        return None
+    diario = build_news_events(NOTICIAS_CSV, batch_size, n_process)
+    print(diario.groupby('Região')[EVENT_COLUMNS].sum())
+    print(f"\nEventos diários salvos em: {EVENTOS_DIARIOS_PARQUET}")
+    print("Rode 'src/data_processing.py' para usá-los no master dataset.")
+    return diario
+
+
+# --- Ponto de Entrada ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classificação de eventos das notícias (spaCy em lote, com cache)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Textos por lote do nlp.pipe")
+    parser.add_argument("--processos", type=int, default=1, help="n_process do nlp.pipe")
+    args = parser.parse_args()
+    main(args.batch_size, args.processos)
@@ -0,0 +1,107 @@
+from pathlib import Path
+import os
+import sys
+import time
+import argparse
+import importlib
+import subprocess
+
+# CLI único do projeto: 'python src/peaksense.py <subcomando> [opções do subcomando]'.
+# Só usa a biblioteca padrão; o módulo de cada subcomando (e com ele pandas, xgboost,
+# requests...) só é importado quando o subcomando roda.
+
+# --- 1. Subcomandos ---
+# nome -> (módulo com a função cli(argv, prog), descrição)
+SUBCOMANDOS = {
+    'process': ('data_processing', "Processa os dados brutos -> master dataset"),
+    'train': ('ml_pipeline', "Treina e registra os modelos regionais"),
+    'collect': ('data_collection', "Coleta incremental de notícias (NewsAPI)"),
+    'serve': ('serving', "Serviço HTTP local de previsão (micro-batching)"),
+    'forecast': ('forecasting', "Previsão dos próximos N dias para todas as regiões"),
+}
+
+# Opções globais -> variáveis de ambiente lidas por config.py (antes de qualquer import)
+VARIAVEIS_GLOBAIS = {
+    'log': "PEAKSENSE_LOG",
+    'perfil': "PEAKSENSE_PERFIL",
+    'inferencia': "PEAKSENSE_INFERENCIA",
+}
+
+# Tempo de inicialização aceitável por subcomando ('--help' em um processo novo)
+LIMITE_INICIALIZACAO_MS = 1000
+
+
+# --- 2. Tempo de Inicialização ---
+
+def _tempo_processo(argv, repeticoes):
+    """Melhor tempo (ms) de um processo Python novo rodando argv até o fim."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, *argv], check=True, stdout=subprocess.DEVNULL)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return min(tempos)
+
+def measure_startup(repeticoes=5, limite_ms=LIMITE_INICIALIZACAO_MS):
+    """Mede o '--help' de cada subcomando (import do módulo + parser) em processos novos.
+
+    Desconta o custo do interpretador vazio, para que o número reflita só o projeto.
+    Retorna {subcomando: ms} e a lista dos que passaram do limite.
+    """
+    cli = str(Path(__file__).resolve())
+    base = _tempo_processo(['-c', 'pass'], repeticoes)
+    print(f"Interpretador vazio: {base:,.0f} ms (descontado abaixo)")
+
+    tempos = {'(ajuda)': _tempo_processo([cli, '--help'], repeticoes) - base}
+    for nome in SUBCOMANDOS:
+        tempos[nome] = _tempo_processo([cli, nome, '--help'], repeticoes) - base
+
+    lentos = [nome for nome, ms in tempos.items() if ms > limite_ms]
+    for nome, ms in tempos.items():
+        print(f"  {'⚠️' if nome in lentos else '✅'} {nome:<10} {ms:>7,.0f} ms")
+    if lentos:
+        print(f"⚠️ {len(lentos)} subcomando(s) acima de {limite_ms:,} ms: {', '.join(lentos)}")
+    return tempos, lentos
+
+
+# --- 3. Ponto de Entrada ---
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="peaksense", description="Pipeline PeakSense: dados, treino, coleta, serviço e previsão",
+        epilog="Use 'peaksense <subcomando> --help' para as opções de cada subcomando.",
+    )
+    parser.add_argument("--log", choices=['texto', 'json'], help="Formato dos logs (PEAKSENSE_LOG)")
+    parser.add_argument("--perfil", choices=['cprofile', 'tracemalloc'],
+                        help="Perfil por etapa no relatório da execução (PEAKSENSE_PERFIL)")
+    parser.add_argument("--inferencia", choices=['xgboost', 'numpy', 'auto'],
+                        help="Backend de inferência (PEAKSENSE_INFERENCIA)")
+    subcomandos = parser.add_subparsers(dest='subcomando', metavar='subcomando', required=True)
+    for nome, (_, descricao) in SUBCOMANDOS.items():
+        # As opções de cada subcomando são do parser do próprio módulo (repassadas sem análise)
+        subcomandos.add_parser(nome, help=descricao, add_help=False)
+    startup = subcomandos.add_parser('startup', help="Mede o tempo de inicialização de cada subcomando")
+    startup.add_argument("--repeticoes", type=int, default=5, help="Processos por medida (vale o melhor)")
+    startup.add_argument("--limite-ms", type=int, default=LIMITE_INICIALIZACAO_MS,
+                         help="Tempo máximo aceitável; acima dele o código de saída é 1")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args, resto = parser.parse_known_args(argv)
+    for opcao, variavel in VARIAVEIS_GLOBAIS.items():
+        if getattr(args, opcao):
+            os.environ[variavel] = getattr(args, opcao)
+
+    if args.subcomando == 'startup':
+        if resto:
+            parser.error(f"argumentos não reconhecidos: {' '.join(resto)}")
+        _, lentos = measure_startup(args.repeticoes, args.limite_ms)
+        return 1 if lentos else 0
+
+    modulo, _ = SUBCOMANDOS[args.subcomando]
+    importlib.import_module(modulo).cli(resto, prog=f"peaksense {args.subcomando}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
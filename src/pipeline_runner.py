@@ -0,0 +1,403 @@
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+import os
+import json
+import time
+import pickle
+import hashlib
+import inspect
+import argparse
+import threading
+import warnings
+
+import config
+import data_processing
+import calendar_features
+import climate_ingestion
+import news_events
+import lag_features
+import dataset_store
+import ml_pipeline
+from config import DATA_RAW_DIR, CACHE_DIR, ESTADOS_POR_SUBMERCADO
+from data_processing import (
+    VERSAO_MASTER, load_raw_data, load_consumo_chunked, clean_pop_clima, harmonize_regions, create_features,
+    hash_arquivos,
+)
+from climate_ingestion import CLIMA_DIARIO_PARQUET, load_climate_daily
+from news_events import EVENTOS_DIARIOS_PARQUET, EVENT_COLUMNS, load_news_events
+from lag_features import add_lag_features, LAG_COLUMNS
+from dataset_store import MASTER_PARQUET, ESTADO_INCREMENTAL, save_master_dataset, save_consumo_agg
+from ml_pipeline import FEATURES_V4, PARAMS_V4, build_regional_matrices, _treinar_regiao
+from model_registry import register_model, load_metadata, model_key
+from prediction_store import dataset_hash, save_predictions
+
+# Ignorar avisos
+warnings.filterwarnings('ignore')
+
+# --- 1. Configuração de Caminhos ---
+ESTAGIOS_DIR = CACHE_DIR / "estagios"
+PUBLICADO_JSON = ESTAGIOS_DIR / "publicado.json"  # Hash da saída de 'features' que está no master_dataset.parquet
+LIMITE_CACHE_MB = 1024
+
+# Suba esta versão só se mudar algo fora do código hasheado (o hash de código cobre
+# o fonte inteiro dos módulos de que cada estágio depende, não só as funções chamadas)
+VERSAO_PIPELINE = 2
+
+CONSUMO_CSV = DATA_RAW_DIR / "consumo_historico_por_regiao.csv"
+ARQUIVOS_AUXILIARES = [
+    DATA_RAW_DIR / "crescimento_populacional_regioes_2020_2024.csv",
+    DATA_RAW_DIR / "medias_temperatura_umidade_2024.csv",
+]
+
+
+# --- 2. Estágios e Chaves ---
+
+class Estagio:
+    """Uma etapa cacheável: funcao(*saídas das dependências, **params).
+
+    A chave é o hash de: nome, código-fonte das funções e módulos em 'codigo', params,
+    'versoes' (valores que só entram na chave, ex.: parâmetros do XGBoost),
+    conteúdo dos 'arquivos' de entrada e hash do conteúdo da saída de cada
+    dependência. Se uma dependência for refeita mas produzir a mesma saída, os
+    estágios seguintes continuam em cache.
+    """
+
+    def __init__(self, nome, funcao, deps=(), params=None, arquivos=(), codigo=None, versoes=None):
+        self.nome = nome
+        self.funcao = funcao
+        self.deps = list(deps)
+        self.params = params or {}
+        self.versoes = versoes or {}
+        self.arquivos = [Path(a) for a in arquivos]
+        self.codigo = codigo or [funcao]
+
+    def chave(self, hashes_deps):
+        h = hashlib.sha256(f"{VERSAO_PIPELINE}|{self.nome}".encode())
+        for funcao in self.codigo:
+            h.update(inspect.getsource(funcao).encode())
+        h.update(json.dumps([self.params, self.versoes], sort_keys=True, default=str).encode())
+        for caminho in self.arquivos:
+            h.update(f"|{caminho.name}|{hash_arquivos([caminho])}".encode())
+        for dep in self.deps:
+            h.update(f"|{dep}|{hashes_deps[dep]}".encode())
+        return h.hexdigest()
+
+
+# --- 3. Cache em Disco (LRU Limitado por Tamanho) ---
+
+class CacheEstagios:
+    """Saídas dos estágios em pickle + índice JSON (chave -> arquivo, bytes, hash da saída, último uso)."""
+
+    def __init__(self, pasta=ESTAGIOS_DIR, limite_mb=LIMITE_CACHE_MB):
+        self.pasta = Path(pasta)
+        self.limite = limite_mb * 1024 ** 2
+        self.caminho_indice = self.pasta / "indice.json"
+        self._lock = threading.Lock()
+        self.indice = {}
+        if self.caminho_indice.exists():
+            with open(self.caminho_indice, encoding='utf-8') as f:
+                self.indice = json.load(f)
+        # Entradas cujo arquivo sumiu são descartadas
+        self.indice = {k: v for k, v in self.indice.items() if (self.pasta / v['arquivo']).exists()}
+
+    def _salvar_indice(self):
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        temporario = self.caminho_indice.with_suffix('.tmp')
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(self.indice, f, indent=2)
+        os.replace(temporario, self.caminho_indice)
+
+    def consultar(self, chave):
+        """Hash da saída se a chave está em cache, senão None.
+
+        O uso é marcado só em memória; o índice vai para o disco uma vez, no aplicar_limite.
+        """
+        with self._lock:
+            entrada = self.indice.get(chave)
+            if entrada is None:
+                return None
+            entrada['ultimo_uso'] = time.time()
+            return entrada['hash_saida']
+
+    def carregar(self, chave):
+        with open(self.pasta / self.indice[chave]['arquivo'], 'rb') as f:
+            return pickle.load(f)
+
+    def guardar(self, estagio, chave, saida, protegidas=()):
+        """Grava a saída e devolve o hash do seu conteúdo; depois aplica o limite de tamanho."""
+        conteudo = pickle.dumps(saida, protocol=pickle.HIGHEST_PROTOCOL)
+        hash_saida = hashlib.sha256(conteudo).hexdigest()
+        arquivo = f"{estagio.replace('|', '_').replace('/', '-')}-{chave[:16]}.pkl"
+
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        temporario = self.pasta / f".{arquivo}.tmp"
+        temporario.write_bytes(conteudo)
+        os.replace(temporario, self.pasta / arquivo)
+
+        with self._lock:
+            self.indice[chave] = {'estagio': estagio, 'arquivo': arquivo, 'bytes': len(conteudo),
+                                  'hash_saida': hash_saida, 'ultimo_uso': time.time()}
+            self._evict(set(protegidas) | {chave})
+            self._salvar_indice()
+        return hash_saida
+
+    def _evict(self, protegidas):
+        """Remove as entradas usadas há mais tempo até o total caber no limite (nunca as da execução atual)."""
+        total = sum(e['bytes'] for e in self.indice.values())
+        for chave, entrada in sorted(self.indice.items(), key=lambda item: item[1]['ultimo_uso']):
+            if total <= self.limite:
+                break
+            if chave in protegidas:
+                continue
+            (self.pasta / entrada['arquivo']).unlink(missing_ok=True)
+            total -= entrada['bytes']
+            del self.indice[chave]
+
+    def aplicar_limite(self, protegidas=()):
+        with self._lock:
+            self._evict(set(protegidas))
+            self._salvar_indice()
+
+    def tamanho_mb(self):
+        return sum(e['bytes'] for e in self.indice.values()) / 1024 ** 2
+
+
+# --- 4. Execução (Estágios Independentes em Paralelo) ---
+
+class EstagioSemSaida(RuntimeError):
+    """Um estágio devolveu None (ou uma tupla com None): as funções do pipeline sinalizam
+    erro assim, e uma saída dessas nunca pode ir para o cache."""
+
+def _saida_invalida(saida):
+    return saida is None or (isinstance(saida, tuple) and any(parte is None for parte in saida))
+
+class PipelineRunner:
+    """Executa um grafo de estágios, pulando os que estão em cache.
+
+    Um estágio entra na fila assim que todas as dependências estão resolvidas, então
+    estágios independentes (ex.: o treino de cada região) rodam em paralelo. Saídas em
+    cache só são lidas do disco se algum estágio seguinte precisar ser refeito.
+    """
+
+    def __init__(self, estagios, cache=None, workers=4, forcar=False):
+        self.estagios = {e.nome: e for e in estagios}
+        self.cache = cache or CacheEstagios()
+        self.workers = workers
+        self.forcar = forcar
+        self.hashes, self.chaves, self.status, self.tempos = {}, {}, {}, {}
+        self._saidas = {}
+        self._lock = threading.Lock()
+
+    def output(self, nome):
+        """Saída de um estágio (da memória ou do cache em disco)."""
+        with self._lock:
+            if nome in self._saidas:
+                return self._saidas[nome]
+        saida = self.cache.carregar(self.chaves[nome])
+        with self._lock:
+            self._saidas[nome] = saida
+        return saida
+
+    def _resolver(self, estagio):
+        inicio = time.perf_counter()
+        chave = estagio.chave(self.hashes)
+        self.chaves[estagio.nome] = chave
+        hash_saida = None if self.forcar else self.cache.consultar(chave)
+        if hash_saida is not None:
+            return estagio.nome, hash_saida, 'cache', time.perf_counter() - inicio
+
+        saida = estagio.funcao(*[self.output(dep) for dep in estagio.deps], **estagio.params)
+        if _saida_invalida(saida):
+            raise EstagioSemSaida(f"O estágio '{estagio.nome}' não produziu saída (veja o erro acima)")
+        with self._lock:
+            self._saidas[estagio.nome] = saida
+        hash_saida = self.cache.guardar(estagio.nome, chave, saida, protegidas=self.chaves.values())
+        return estagio.nome, hash_saida, 'executado', time.perf_counter() - inicio
+
+    def run(self):
+        pendentes_deps = {nome: set(e.deps) for nome, e in self.estagios.items()}
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                em_execucao = {}
+                while pendentes_deps or em_execucao:
+                    prontos = [nome for nome, deps in pendentes_deps.items() if not deps]
+                    for nome in prontos:
+                        del pendentes_deps[nome]
+                        em_execucao[pool.submit(self._resolver, self.estagios[nome])] = nome
+                    if not em_execucao:
+                        raise ValueError(f"Dependências circulares ou ausentes: {sorted(pendentes_deps)}")
+
+                    feitos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+                    for futuro in feitos:
+                        del em_execucao[futuro]
+                        nome, hash_saida, status, segundos = futuro.result()
+                        self.hashes[nome], self.status[nome], self.tempos[nome] = hash_saida, status, segundos
+                        print(f"  {'✅' if status == 'executado' else '⏩'} {nome}: {status} ({segundos:.2f}s)")
+                        for deps in pendentes_deps.values():
+                            deps.discard(nome)
+        finally:
+            # Entradas de execuções antigas saem primeiro; as desta execução ficam.
+            # Também grava os usos marcados pelo consultar (uma escrita do índice por execução)
+            self.cache.aplicar_limite(protegidas=self.chaves.values())
+        return self.status
+
+    def resumo(self):
+        return pd.DataFrame({'status': self.status, 'segundos': self.tempos}).loc[list(self.status)]
+
+
+# --- 5. Estágios do PeakSense ---
+
+# Módulos cujo fonte entra na chave de cada estágio (além da função do próprio estágio):
+# mudar qualquer função deles (ex.: build_calendar, a tipagem do dataset_store) refaz o estágio
+MODULOS_LIMPEZA = [config, data_processing]
+MODULOS_FEATURES = MODULOS_LIMPEZA + [calendar_features, lag_features, dataset_store, climate_ingestion,
+                                      news_events]
+MODULOS_TREINO = [ml_pipeline]
+
+def _estagio_consumo():
+    # Leitura em blocos: o export bruto da CCEE nunca fica inteiro na memória nem no cache
+    return load_consumo_chunked(CONSUMO_CSV)
+
+def _estagio_auxiliares():
+    _, df_pop, df_clima = load_raw_data(incluir_consumo=False)
+    if df_pop is None:
+        return None
+    return clean_pop_clima(df_pop, df_clima)
+
+def _estagio_harmonizacao(auxiliares):
+    df_pop, df_clima = auxiliares
+    return harmonize_regions(df_pop.copy(), df_clima.copy())
+
+def _estagio_features(df_consumo_agg, harmonizados):
+    df_pop_harmonizado, df_clima_harmonizado = harmonizados
+    df_master = create_features(df_consumo_agg, df_pop_harmonizado, df_clima_harmonizado,
+                                load_climate_daily(), load_news_events())
+    return add_lag_features(df_master)
+
+def _estagio_matriz(df_master, regiao, features):
+    df = df_master[df_master['Região'] == regiao].rename(columns={'População 2024': 'Populacao'})
+    return build_regional_matrices(df, features)[regiao]
+
+def _estagio_treino(matriz, regiao, features, n_jobs):
+    X, y, ds = matriz
+    _, modelo, segundos = _treinar_regiao(regiao, X, y, features, n_jobs)
+    return {'modelo': modelo, 'ds': ds, 'y': y, 'y_pred': modelo.predict(X), 'segundos': segundos}
+
+def build_stages(features=FEATURES_V4, regioes=None, n_jobs=1):
+    """Grafo: consumo (em blocos) + auxiliares -> harmonização -> features -> (matriz -> treino) por região."""
+    regioes = regioes or list(ESTADOS_POR_SUBMERCADO)
+    artefatos = [a for a in (CLIMA_DIARIO_PARQUET, EVENTOS_DIARIOS_PARQUET) if a.exists()]
+    estagios = [
+        Estagio('consumo', _estagio_consumo, arquivos=[CONSUMO_CSV],
+                codigo=[_estagio_consumo, *MODULOS_LIMPEZA]),
+        Estagio('auxiliares', _estagio_auxiliares, arquivos=ARQUIVOS_AUXILIARES,
+                codigo=[_estagio_auxiliares, *MODULOS_LIMPEZA]),
+        Estagio('harmonizacao', _estagio_harmonizacao, ['auxiliares'],
+                codigo=[_estagio_harmonizacao, *MODULOS_LIMPEZA]),
+        Estagio('features', _estagio_features, ['consumo', 'harmonizacao'],
+                versoes={'master': VERSAO_MASTER}, arquivos=artefatos,
+                codigo=[_estagio_features, *MODULOS_FEATURES]),
+    ]
+    for regiao in regioes:
+        estagios += [
+            Estagio(f'matriz|{regiao}', _estagio_matriz, ['features'],
+                    params={'regiao': regiao, 'features': list(features)},
+                    codigo=[_estagio_matriz, *MODULOS_TREINO]),
+            Estagio(f'treino|{regiao}', _estagio_treino, [f'matriz|{regiao}'],
+                    params={'regiao': regiao, 'features': list(features), 'n_jobs': n_jobs},
+                    versoes={'params_xgb': PARAMS_V4},
+                    codigo=[_estagio_treino, *MODULOS_TREINO]),
+        ]
+    return estagios
+
+
+# --- 6. Publicação (Master Dataset e Registry) ---
+
+def publish_master(runner):
+    """Grava o master dataset se ele não corresponde à saída atual do estágio de features."""
+    publicado = {}
+    if PUBLICADO_JSON.exists():
+        with open(PUBLICADO_JSON, encoding='utf-8') as f:
+            publicado = json.load(f)
+    if publicado.get('features') == runner.hashes['features'] and MASTER_PARQUET.exists():
+        return False
+
+    save_master_dataset(runner.output('features'))
+    save_consumo_agg(runner.output('consumo'))
+    # Sem digests por dia: o próximo --incremental fará rebuild completo
+    ESTADO_INCREMENTAL.unlink(missing_ok=True)
+    PUBLICADO_JSON.parent.mkdir(parents=True, exist_ok=True)
+    with open(PUBLICADO_JSON, 'w', encoding='utf-8') as f:
+        json.dump({'features': runner.hashes['features']}, f)
+    print(f"✅ Master dataset salvo em: {MASTER_PARQUET}")
+    return True
+
+def publish_models(runner, regioes, features):
+    """Registra (e promove) só os modelos que diferem da versão promovida de cada região."""
+    versao_dataset = dataset_hash('diario')
+    for regiao in regioes:
+        chave = model_key(regiao)
+        promovido = load_metadata(chave)
+        if promovido is not None and promovido.get('hash_estagio') == runner.hashes[f'treino|{regiao}']:
+            continue
+
+        treino = runner.output(f'treino|{regiao}')
+        ds, y = treino['ds'], treino['y']
+        registro = register_model(chave, treino['modelo'], features, {
+            'params': PARAMS_V4,
+            'n_linhas': len(y),
+            'data_inicio': pd.Timestamp(ds.min()).isoformat(),
+            'data_fim': pd.Timestamp(ds.max()).isoformat(),
+            'dataset_hash': versao_dataset,
+            'segundos_treino': treino['segundos'],
+            'granularidade': 'diario',
+            'hash_estagio': runner.hashes[f'treino|{regiao}'],
+        })
+        save_predictions(chave, ds, y, treino['y_pred'], registro['hash'], versao_dataset)
+        print(f"  ✅ {chave} registrado como {registro['versao']} (hash {registro['hash'][:12]})")
+
+
+# --- 7. Função Principal ---
+
+def main(workers=4, threads=None, limite_mb=LIMITE_CACHE_MB, lags=False, eventos=False, forcar=False):
+    """Processamento + treino com cache por estágio; o dashboard lê o que for publicado."""
+    print("--- INICIANDO PIPELINE (CACHE POR ESTÁGIO) ---")
+    inicio = time.perf_counter()
+    features = FEATURES_V4 + (LAG_COLUMNS if lags else []) + (EVENT_COLUMNS if eventos else [])
+    regioes = list(ESTADOS_POR_SUBMERCADO)
+    n_jobs = max(1, (threads or os.cpu_count() or 1) // min(workers, len(regioes)))
+
+    cache = CacheEstagios(limite_mb=limite_mb)
+    runner = PipelineRunner(build_stages(features, regioes, n_jobs), cache, workers=workers, forcar=forcar)
+    try:
+        runner.run()
+    except FileNotFoundError as e:
+        print(f"❌ ERRO: Arquivo não encontrado. {e}")
+        return None
+    except EstagioSemSaida as e:
+        print(f"❌ ERRO: {e}")
+        return None
+
+    publish_master(runner)
+    publish_models(runner, regioes, features)
+
+    resumo = runner.resumo()
+    print(f"\n⏱️ Pipeline em {time.perf_counter() - inicio:.2f}s | "
+          f"{(resumo['status'] == 'executado').sum()} estágio(s) executado(s), "
+          f"{(resumo['status'] == 'cache').sum()} em cache | cache: {cache.tamanho_mb():.1f} MB "
+          f"(limite {limite_mb} MB)")
+    return resumo
+
+
+# --- Ponto de Entrada ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline completo com cache por estágio (hash de entradas/código)")
+    parser.add_argument("--workers", type=int, default=4, help="Estágios independentes em paralelo")
+    parser.add_argument("--threads", type=int, default=None, help="Orçamento total de threads do XGBoost")
+    parser.add_argument("--cache-mb", type=int, default=LIMITE_CACHE_MB, help="Tamanho máximo do cache em disco")
+    parser.add_argument("--lags", action="store_true", help="Treina com as defasagens/janelas móveis de 'y'")
+    parser.add_argument("--eventos", action="store_true", help="Treina com as contagens de eventos das notícias")
+    parser.add_argument("--forcar", action="store_true", help="Ignora o cache e refaz todos os estágios")
+    args = parser.parse_args()
+    main(args.workers, args.threads, args.cache_mb, args.lags, args.eventos, args.forcar)
@@ -0,0 +1,81 @@
+import pandas as pd
+import numpy as np
+import pyarrow.parquet as pq
+from functools import lru_cache
+import hashlib
+import os
+
+from config import DATA_PROCESSED_DIR
+from dataset_store import MASTER_PARQUET, MASTER_CSV, MASTER_HORARIO_PARQUET
+
+# --- 1. Configuração de Caminhos ---
+PREDICTIONS_DIR = DATA_PROCESSED_DIR / "predictions"
+
+COLUNAS_PREVISAO = ['ds', 'Região', 'y_real', 'y_pred', 'residuo']
+
+
+# --- 2. Hashes (versão do modelo e do dataset) ---
+
+@lru_cache(maxsize=64)
+def _hash_cacheado(caminho, mtime_ns, tamanho):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+def file_hash(caminho):
+    """SHA-256 do conteúdo de um arquivo (recalculado só se mtime/tamanho mudarem)."""
+    info = os.stat(caminho)
+    return _hash_cacheado(str(caminho), info.st_mtime_ns, info.st_size)
+
+def dataset_hash(granularidade='diario'):
+    """Versão do master dataset atual (hash do arquivo que os leitores usam)."""
+    if granularidade == 'horario':
+        return file_hash(MASTER_HORARIO_PARQUET)
+    caminho = MASTER_PARQUET if MASTER_PARQUET.exists() else MASTER_CSV
+    return file_hash(caminho)
+
+
+# --- 3. Escrita e Leitura ---
+
+def _slug(regiao):
+    return regiao.lower().replace('/', '_')
+
+def prediction_path(regiao, model_hash, dataset_hash):
+    """Arquivo do store para (região, versão do modelo, versão do dataset)."""
+    return PREDICTIONS_DIR / _slug(regiao) / f"{model_hash[:16]}_{dataset_hash[:16]}.parquet"
+
+def save_predictions(regiao, ds, y_real, y_pred, model_hash, dataset_hash):
+    """Grava as previsões in-sample/backtest (e resíduos) de um modelo no store."""
+    df = pd.DataFrame({
+        'ds': pd.to_datetime(ds),
+        'Região': regiao,
+        'y_real': np.asarray(y_real, dtype=np.float64),
+        'y_pred': np.asarray(y_pred, dtype=np.float64),
+    })
+    df['residuo'] = df['y_real'] - df['y_pred']
+    df = df.sort_values('ds', kind='stable')
+
+    caminho = prediction_path(regiao, model_hash, dataset_hash)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(caminho, index=False)
+    return caminho
+
+def load_predictions(regiao, model_hash, dataset_hash, inicio=None, fim=None):
+    """Lê as previsões de um modelo, filtrando o período já na leitura.
+
+    Retorna None se o store não tiver essa combinação de modelo/dataset (ausente ou
+    desatualizado) — nesse caso quem chamou deve rodar o modelo e gravar o resultado.
+    """
+    caminho = prediction_path(regiao, model_hash, dataset_hash)
+    if not caminho.exists():
+        return None
+
+    filtros = []
+    if inicio is not None:
+        filtros.append(('ds', '>=', pd.Timestamp(inicio)))
+    if fim is not None:
+        filtros.append(('ds', '<=', pd.Timestamp(fim)))
+    tabela = pq.read_table(caminho, filters=filtros or None, memory_map=True)
+    return tabela.to_pandas()
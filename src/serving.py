@@ -0,0 +1,264 @@
+import numpy as np
+from collections import deque
+import asyncio
+import argparse
+import json
+import math
+import time
+
+from config import ESTADOS_POR_SUBMERCADO
+from model_registry import ModelRegistry
+from tree_inference import predictor
+from instrumentation import get_logger
+
+log = get_logger("serving")
+
+# --- 1. Configuração ---
+
+JANELA_MS_PADRAO = 5       # Tempo máximo que uma requisição espera para ser agrupada
+MAX_BATCH_PADRAO = 4096    # Máximo de linhas por chamada de predict
+AMOSTRAS_LATENCIA = 10_000  # Latências guardadas para p50/p99
+
+
+class ErroValidacao(ValueError):
+    """Requisição com vetor de features inválido (vira HTTP 422)."""
+
+
+# --- 2. Métricas ---
+
+class Metricas:
+    """Latência (p50/p99), throughput e tamanho médio dos batches, em memória."""
+
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.latencias = deque(maxlen=AMOSTRAS_LATENCIA)
+        self.instantes = deque(maxlen=AMOSTRAS_LATENCIA)
+        self.requisicoes = 0
+        self.linhas = 0
+        self.batches = 0
+        self.erros = 0
+
+    def registrar_requisicao(self, segundos, linhas):
+        self.latencias.append(segundos)
+        self.instantes.append(time.monotonic())
+        self.requisicoes += 1
+        self.linhas += linhas
+
+    def resumo(self):
+        agora = time.monotonic()
+        latencias_ms = np.asarray(self.latencias) * 1000
+        ultimos_60s = sum(1 for t in self.instantes if agora - t <= 60)
+        return {
+            'requisicoes': self.requisicoes,
+            'linhas_previstas': self.linhas,
+            'erros': self.erros,
+            'batches': self.batches,
+            'linhas_por_batch': self.linhas / self.batches if self.batches else 0.0,
+            'latencia_p50_ms': float(np.percentile(latencias_ms, 50)) if len(latencias_ms) else None,
+            'latencia_p99_ms': float(np.percentile(latencias_ms, 99)) if len(latencias_ms) else None,
+            'throughput_rps_60s': ultimos_60s / min(60.0, max(agora - self.inicio, 1e-9)),
+            'uptime_s': agora - self.inicio,
+        }
+
+
+# --- 3. Micro-Batching por Região ---
+
+class MicroBatcher:
+    """Junta requisições concorrentes de uma região em uma única chamada de predict.
+
+    A primeira requisição da fila abre uma janela de 'janela_ms'; tudo que chegar
+    nesse intervalo (até 'max_batch' linhas) vai no mesmo predict, que roda numa
+    thread para não travar o event loop.
+
+    Cada requisição chega com o modelo contra o qual foi validada, e só linhas da
+    mesma versão vão juntas: se uma promoção acontece no meio da janela, o batch
+    atual fecha e a requisição da versão nova abre o próximo.
+    """
+
+    def __init__(self, regiao, metricas, janela_ms=JANELA_MS_PADRAO, max_batch=MAX_BATCH_PADRAO):
+        self.regiao = regiao
+        self.metricas = metricas
+        self.janela = janela_ms / 1000
+        self.max_batch = max_batch
+        self.fila = asyncio.Queue()
+        self.adiado = None  # Primeira requisição de outra versão (abre o próximo batch)
+        self.tarefa = None
+
+    def iniciar(self):
+        self.tarefa = asyncio.get_running_loop().create_task(self._loop())
+
+    async def prever(self, modelo, X):
+        futuro = asyncio.get_running_loop().create_future()
+        await self.fila.put((modelo, X, futuro))
+        return await futuro
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.adiado is not None:
+                pendentes, self.adiado = [self.adiado], None
+            else:
+                pendentes = [await self.fila.get()]
+            modelo = pendentes[0][0]
+            linhas = len(pendentes[0][1])
+            prazo = loop.time() + self.janela
+            while linhas < self.max_batch:
+                restante = prazo - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.fila.get(), restante)
+                except asyncio.TimeoutError:
+                    break
+                if item[0].versao != modelo.versao:
+                    self.adiado = item
+                    break
+                pendentes.append(item)
+                linhas += len(item[1])
+
+            try:
+                X = np.concatenate([x for _, x, _ in pendentes]) if len(pendentes) > 1 else pendentes[0][1]
+                y = await loop.run_in_executor(None, lambda: predictor(modelo)(X))
+                self.metricas.batches += 1
+            except Exception as e:
+                for _, _, futuro in pendentes:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+
+            inicio = 0
+            for _, x, futuro in pendentes:
+                if not futuro.done():
+                    futuro.set_result((modelo.versao, y[inicio:inicio + len(x)]))
+                inicio += len(x)
+
+
+# --- 4. Validação ---
+
+def build_feature_matrix(instancias, features):
+    """Valida as instâncias ({feature: valor}) e monta a matriz float32 na ordem do modelo."""
+    if not isinstance(instancias, list) or not instancias:
+        raise ErroValidacao("'instancias' deve ser uma lista não vazia de objetos")
+
+    esperadas = set(features)
+    X = np.empty((len(instancias), len(features)), dtype=np.float32)
+    for i, inst in enumerate(instancias):
+        if not isinstance(inst, dict):
+            raise ErroValidacao(f"instância {i}: deve ser um objeto {{feature: valor}}")
+        faltando, extras = esperadas - inst.keys(), inst.keys() - esperadas
+        if faltando or extras:
+            raise ErroValidacao(f"instância {i}: faltando {sorted(faltando)}, desconhecidas {sorted(extras)}")
+        for j, nome in enumerate(features):
+            valor = inst[nome]
+            if not isinstance(valor, (int, float)) or not math.isfinite(valor):
+                raise ErroValidacao(f"instância {i}: '{nome}' deve ser numérico e finito")
+            X[i, j] = valor
+    return X
+
+
+# --- 5. Aplicação ASGI ---
+
+async def _ler_corpo(receive):
+    corpo = b''
+    while True:
+        mensagem = await receive()
+        corpo += mensagem.get('body', b'')
+        if not mensagem.get('more_body'):
+            return corpo
+
+async def _responder(send, status, dados):
+    corpo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(corpo)).encode())]})
+    await send({'type': 'http.response.body', 'body': corpo})
+
+def create_app(regioes=None, janela_ms=JANELA_MS_PADRAO, max_batch=MAX_BATCH_PADRAO, registry=None):
+    """Cria o app ASGI de previsão (rodar com uvicorn; funciona 100% offline).
+
+    POST /predict  {"regiao": "Sul", "instancias": [{feature: valor, ...}, ...]}
+    GET  /metrics  latência p50/p99, throughput e estatísticas dos batches
+    GET  /health   modelos carregados (versão e features)
+    """
+    registry = registry or ModelRegistry()
+    regioes = regioes or list(ESTADOS_POR_SUBMERCADO)
+    metricas = Metricas()
+    batchers = {}
+
+    async def modelo_atual(regiao):
+        # get() relê a versão promovida (um modelo novo entra sem restart) e pode
+        # carregar o UBJ do disco: roda numa thread para não travar o event loop
+        return await asyncio.get_running_loop().run_in_executor(None, registry.get, regiao)
+
+    async def startup():
+        # Os boosters são carregados uma vez, na subida do serviço
+        for regiao in regioes:
+            if await modelo_atual(regiao) is None:
+                log.warning(f"⚠️ Sem modelo registrado para {regiao}; região ignorada.")
+                continue
+            batchers[regiao] = MicroBatcher(regiao, metricas, janela_ms, max_batch)
+            batchers[regiao].iniciar()
+        log.info(f"✅ Serviço pronto com {len(batchers)} região(ões): {', '.join(batchers)}")
+
+    async def predict(receive, send):
+        inicio = time.perf_counter()
+        try:
+            pedido = json.loads(await _ler_corpo(receive) or b'{}')
+            regiao = pedido.get('regiao')
+            if regiao not in batchers:
+                raise ErroValidacao(f"região desconhecida: {regiao!r} (disponíveis: {sorted(batchers)})")
+            instancias = pedido.get('instancias', [pedido['features']] if 'features' in pedido else None)
+            # A versão é resolvida uma vez: a mesma que valida as features faz a previsão
+            modelo = await modelo_atual(regiao)
+            X = build_feature_matrix(instancias, modelo.features)
+        except (ErroValidacao, ValueError, AttributeError) as e:
+            metricas.erros += 1
+            return await _responder(send, 422, {'erro': str(e)})
+
+        versao, y = await batchers[regiao].prever(modelo, X)
+        metricas.registrar_requisicao(time.perf_counter() - inicio, len(X))
+        await _responder(send, 200, {'regiao': regiao, 'versao': versao, 'previsoes': y.tolist()})
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                mensagem = await receive()
+                if mensagem['type'] == 'lifespan.startup':
+                    await startup()
+                    await send({'type': 'lifespan.startup.complete'})
+                elif mensagem['type'] == 'lifespan.shutdown':
+                    for batcher in batchers.values():
+                        batcher.tarefa.cancel()
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+
+        rota = (scope['method'], scope['path'])
+        if rota == ('POST', '/predict'):
+            return await predict(receive, send)
+        if rota == ('GET', '/metrics'):
+            return await _responder(send, 200, metricas.resumo())
+        if rota == ('GET', '/health'):
+            modelos = {}
+            for regiao in batchers:
+                modelo = await modelo_atual(regiao)
+                modelos[regiao] = {'versao': modelo.versao, 'features': modelo.features}
+            return await _responder(send, 200, {'status': 'ok', 'modelos': modelos})
+        return await _responder(send, 404, {'erro': f"rota não encontrada: {scope['method']} {scope['path']}"})
+
+    return app
+
+
+# --- Ponto de Entrada ---
+def cli(argv=None, prog=None):
+    """Linha de comando (também usada por 'peaksense serve')."""
+    parser = argparse.ArgumentParser(prog=prog, description="Serviço local de previsão com micro-batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--janela-ms", type=float, default=JANELA_MS_PADRAO, help="Janela de agrupamento (ms)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH_PADRAO, help="Máximo de linhas por predict")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    uvicorn.run(create_app(janela_ms=args.janela_ms, max_batch=args.max_batch), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,312 @@
+import numpy as np
+from collections import OrderedDict
+import itertools
+import json
+import os
+import time
+from pathlib import Path
+import argparse
+import threading
+import warnings
+
+from config import BACKEND_INFERENCIA
+from instrumentation import get_logger
+
+# Ignorar avisos
+warnings.filterwarnings('ignore')
+
+log = get_logger("tree_inference")
+
+# --- 1. Configuração ---
+
+# Backend de inferência padrão (config.py); pode ser trocado pela variável de ambiente PEAKSENSE_INFERENCIA.
+#   'xgboost': inplace_predict do booster | 'numpy': árvores compiladas (CompiledForest)
+#   'auto': NumPy até LIMITE_LINHAS_NUMPY linhas por chamada (onde o overhead do XGBoost
+#           domina) e XGBoost acima disso (onde a avaliação multithread em C++ ganha)
+BACKEND_PADRAO = BACKEND_INFERENCIA
+BACKENDS = ('xgboost', 'numpy', 'auto')
+LIMITE_LINHAS_NUMPY = 16
+
+# Tolerância da checagem contra o predict do XGBoost (float32 somado em outra ordem)
+RTOL, ATOL = 1e-5, 1e-2
+
+
+# --- 2. Compilação (Árvores -> Arrays Planos) ---
+
+class CompiledForest:
+    """Ensemble de árvores do XGBoost achatado em arrays NumPy e avaliado de forma vetorizada.
+
+    Todas as árvores viram um único conjunto de nós (feature, limiar, filho esquerdo,
+    direção dos ausentes; o direito é sempre esquerdo + 1, como o XGBoost os aloca).
+    As folhas apontam para si mesmas com limiar +inf, então descer 'profundidade'
+    passos leva todas as (linha, árvore) às suas folhas de uma vez, sem laço em Python
+    por árvore nem por linha. As linhas são processadas em blocos que cabem no cache.
+    """
+
+    BLOCO = 128
+    ARRAYS = ('raizes', 'esquerda', 'feature', 'limiar', 'valor', 'padrao_esq', 'interno')
+
+    def __init__(self, booster=None):
+        if booster is not None:
+            self._compilar(booster)
+
+    def _compilar(self, booster):
+        modelo = json.loads(booster.save_raw(raw_format='json'))['learner']
+        gbm = modelo['gradient_booster']
+        if gbm['name'] != 'gbtree':
+            raise ValueError(f"Booster '{gbm['name']}' não suportado (apenas gbtree)")
+        if modelo['objective']['name'] not in ('reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror'):
+            raise ValueError(f"Objetivo '{modelo['objective']['name']}' não suportado (só link identidade)")
+        if int(modelo['learner_model_param'].get('num_target', 1)) != 1:
+            raise ValueError("Modelos com múltiplos alvos não são suportados")
+
+        self.feature_names = booster.feature_names
+        self.n_features = int(modelo['learner_model_param']['num_feature'])
+        self.base_score = float(modelo['learner_model_param']['base_score'].strip('[]'))
+
+        arvores = gbm['model']['trees']
+        if any(any(a['split_type']) for a in arvores):
+            raise ValueError("Splits categóricos não são suportados")
+
+        # Todas as árvores concatenadas de uma vez; índices locais viram globais somando a raiz
+        tamanhos = np.array([len(a['left_children']) for a in arvores])
+        self.raizes = np.concatenate([[0], np.cumsum(tamanhos)[:-1]]).astype(np.int32)
+        deslocamento = np.repeat(self.raizes, tamanhos)
+
+        def juntar(campo, dtype):
+            return np.fromiter(itertools.chain.from_iterable(a[campo] for a in arvores), dtype=dtype,
+                               count=int(tamanhos.sum()))
+
+        filhos_esq = juntar('left_children', np.int32)
+        filhos_dir = juntar('right_children', np.int32)
+        condicoes = juntar('split_conditions', np.float32)
+        folha = filhos_esq == -1
+        if np.any(filhos_dir[~folha] != filhos_esq[~folha] + 1):
+            raise ValueError("Árvore com filhos não adjacentes")
+
+        ids = np.arange(len(folha), dtype=np.int32)
+        self.esquerda = np.where(folha, ids, filhos_esq + deslocamento).astype(np.int32)
+        self.feature = np.where(folha, 0, juntar('split_indices', np.int32)).astype(np.int32)
+        # Nas folhas, split_conditions guarda o valor da folha (já com o learning rate)
+        self.limiar = np.where(folha, np.inf, condicoes).astype(np.float32)
+        self.valor = np.where(folha, condicoes, 0.0).astype(np.float32)
+        self.padrao_esq = juntar('default_left', bool) | folha
+        self.interno = ~folha
+        self.profundidade = self._profundidade()
+
+    def _profundidade(self):
+        """Maior profundidade do ensemble (descendo as fronteiras de todas as árvores juntas)."""
+        nivel, fronteira = 0, self.raizes
+        while True:
+            internos = fronteira[self.interno[fronteira]]
+            if not len(internos):
+                return nivel
+            fronteira = np.concatenate([self.esquerda[internos], self.esquerda[internos] + 1])
+            nivel += 1
+
+    def save(self, caminho):
+        """Grava os arrays compilados (.npz), para não recompilar a cada processo."""
+        caminho = Path(caminho)
+        tmp = caminho.with_name(caminho.stem + '.tmp.npz')
+        np.savez(tmp, base_score=self.base_score, n_features=self.n_features, profundidade=self.profundidade,
+                 feature_names=np.asarray(self.feature_names or [], dtype=str),
+                 **{nome: getattr(self, nome) for nome in self.ARRAYS})
+        os.replace(tmp, caminho)
+        return caminho
+
+    @classmethod
+    def load(cls, caminho):
+        forest = cls()
+        with np.load(caminho) as dados:
+            for nome in cls.ARRAYS:
+                setattr(forest, nome, dados[nome])
+            forest.base_score = float(dados['base_score'])
+            forest.n_features = int(dados['n_features'])
+            forest.profundidade = int(dados['profundidade'])
+            forest.feature_names = dados['feature_names'].tolist() or None
+        return forest
+
+    @property
+    def n_arvores(self):
+        return len(self.raizes)
+
+    def predict(self, X):
+        """Prevê um array float32 (n_linhas, n_features) ou uma única linha (n_features,)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Esperava {self.n_features} features, recebeu {X.shape[1]}")
+
+        saida = np.empty(len(X), dtype=np.float64)
+        for inicio in range(0, len(X), self.BLOCO):
+            bloco = X[inicio:inicio + self.BLOCO]
+            saida[inicio:inicio + len(bloco)] = self._somar_folhas(bloco)
+        return (saida + self.base_score).astype(np.float32)
+
+    def _somar_folhas(self, X):
+        planos = X.ravel()
+        deslocamento = (np.arange(len(X), dtype=np.int32) * self.n_features)[:, None]
+        nao_finitos = not np.isfinite(planos).all()
+
+        nos = np.broadcast_to(self.raizes, (len(X), self.n_arvores))
+        for _ in range(self.profundidade):
+            valores = planos.take(deslocamento + self.feature.take(nos))
+            direita = ~(valores < self.limiar.take(nos))
+            if nao_finitos:
+                # Caminho exato para NaN/inf: ausente segue default_left; folhas ficam paradas
+                direita &= ~(np.isnan(valores) & self.padrao_esq.take(nos)) & self.interno.take(nos)
+            nos = self.esquerda.take(nos) + direita
+        return self.valor.take(nos).sum(axis=1, dtype=np.float64)
+
+
+# --- 3. Checagem e Seleção do Backend ---
+
+def verify(forest, booster, X, rtol=RTOL, atol=ATOL):
+    """Confere o backend compilado contra o inplace_predict do XGBoost; retorna o maior erro."""
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    esperado = booster.inplace_predict(X)
+    obtido = forest.predict(X)
+    np.testing.assert_allclose(obtido, esperado, rtol=rtol, atol=atol)
+    return float(np.abs(obtido.astype(np.float64) - esperado).max())
+
+ARQUIVO_COMPILADO = "compilado.npz"
+# Compilados em memória (hash -> CompiledForest), em LRU limitado pelo tamanho dos arrays,
+# como o cache de modelos do ModelRegistry: versões antigas não ficam presas no processo
+LIMITE_COMPILADOS_BYTES = 256 * 1024 ** 2
+_COMPILADOS = OrderedDict()
+_lock_compilados = threading.Lock()
+
+def _tamanho(forest):
+    return sum(getattr(forest, nome).nbytes for nome in CompiledForest.ARRAYS)
+
+def _guardar_compilado(chave, forest, limite=LIMITE_COMPILADOS_BYTES):
+    with _lock_compilados:
+        _COMPILADOS[chave] = forest
+        _COMPILADOS.move_to_end(chave)
+        total = sum(_tamanho(f) for f in _COMPILADOS.values())
+        # Remove os menos usados até caber no limite (sempre mantém o mais recente)
+        while total > limite and len(_COMPILADOS) > 1:
+            _, antigo = _COMPILADOS.popitem(last=False)
+            total -= _tamanho(antigo)
+
+def compile_model(modelo, X_verificacao=None):
+    """Compila (uma vez por hash) o booster de um ModeloCarregado do registry.
+
+    O resultado fica em memória e ao lado do artefato no registry (compilado.npz), então
+    só a primeira carga de cada versão paga a compilação. Se X_verificacao for dado,
+    o compilado só é aceito se bater com o XGBoost nele.
+    """
+    with _lock_compilados:
+        forest = _COMPILADOS.get(modelo.hash)
+        if forest is not None:
+            _COMPILADOS.move_to_end(modelo.hash)
+            return forest
+
+    from model_registry import version_dir
+
+    caminho = version_dir(modelo.regiao, modelo.versao) / ARQUIVO_COMPILADO
+    booster = modelo.model.get_booster()
+    forest = CompiledForest.load(caminho) if caminho.exists() else CompiledForest(booster)
+    if X_verificacao is not None:
+        verify(forest, booster, X_verificacao)
+    if not caminho.exists() and caminho.parent.exists():
+        forest.save(caminho)
+    _guardar_compilado(modelo.hash, forest)
+    return forest
+
+def predictor(modelo, backend=None, X_verificacao=None):
+    """Função X (float32 contíguo) -> previsões, no backend pedido (padrão: BACKEND_PADRAO).
+
+    Se o modelo não puder ser compilado (ou não bater na verificação), cai no XGBoost.
+    """
+    backend = backend or BACKEND_PADRAO
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconhecido: {backend!r} (use {', '.join(BACKENDS)})")
+
+    inplace_predict = modelo.model.get_booster().inplace_predict
+    if backend == 'xgboost':
+        return inplace_predict
+    try:
+        compilado = compile_model(modelo, X_verificacao).predict
+    except (ValueError, AssertionError) as e:
+        log.warning(f"⚠️ Backend NumPy indisponível para {modelo.regiao} ({e}); usando XGBoost.")
+        return inplace_predict
+    if backend == 'numpy':
+        return compilado
+    return lambda X: compilado(X) if len(X) <= LIMITE_LINHAS_NUMPY else inplace_predict(X)
+
+
+# --- 4. Benchmark ---
+
+def _latencia(funcao, repeticoes):
+    """Mediana (µs) de 'repeticoes' chamadas."""
+    tempos = np.empty(repeticoes)
+    for i in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos[i] = time.perf_counter() - inicio
+    return float(np.median(tempos) * 1e6)
+
+def benchmark(regioes=None, repeticoes=200, linhas_batch=10_000):
+    """Latência de uma linha e de um batch: XGBRegressor.predict (DataFrame), inplace_predict e NumPy."""
+    import pandas as pd
+    from dataset_store import load_master_dataset
+    from model_registry import ModelRegistry, version_dir
+    from config import ESTADOS_POR_SUBMERCADO
+
+    registry = ModelRegistry()
+    df = load_master_dataset().rename(columns={'População 2024': 'Populacao'})
+    resultados = []
+    for regiao in regioes or list(ESTADOS_POR_SUBMERCADO):
+        modelo = registry.get(regiao)
+        if modelo is None:
+            print(f"⚠️ Sem modelo registrado para {regiao}.")
+            continue
+        df_regional = df[df['Região'] == regiao].reindex(columns=modelo.features)
+        X = np.ascontiguousarray(df_regional.to_numpy(dtype=np.float32))
+        X_batch = np.ascontiguousarray(np.resize(X, (linhas_batch, X.shape[1])))
+        booster = modelo.model.get_booster()
+
+        inicio = time.perf_counter()
+        CompiledForest(booster)
+        segundos_compilacao = time.perf_counter() - inicio
+        forest = compile_model(modelo, X_verificacao=X)  # grava o compilado.npz no registry
+        inicio = time.perf_counter()
+        CompiledForest.load(version_dir(modelo.regiao, modelo.versao) / ARQUIVO_COMPILADO)
+        segundos_carga = time.perf_counter() - inicio
+        erro = verify(forest, booster, X_batch)
+
+        linha_df, linha = df_regional.iloc[:1], X[:1]
+        resultados.append({
+            'regiao': regiao,
+            'arvores': forest.n_arvores,
+            'compilacao_ms': segundos_compilacao * 1000,
+            'carga_compilado_ms': segundos_carga * 1000,
+            'erro_max': erro,
+            '1 linha: predict(DataFrame) µs': _latencia(lambda: modelo.model.predict(linha_df), repeticoes),
+            '1 linha: inplace_predict µs': _latencia(lambda: booster.inplace_predict(linha), repeticoes),
+            '1 linha: numpy µs': _latencia(lambda: forest.predict(linha), repeticoes),
+            f'{LIMITE_LINHAS_NUMPY} linhas: inplace_predict µs':
+                _latencia(lambda: booster.inplace_predict(X_batch[:LIMITE_LINHAS_NUMPY]), repeticoes),
+            f'{LIMITE_LINHAS_NUMPY} linhas: numpy µs':
+                _latencia(lambda: forest.predict(X_batch[:LIMITE_LINHAS_NUMPY]), repeticoes),
+            f'{linhas_batch} linhas: inplace_predict ms': _latencia(lambda: booster.inplace_predict(X_batch), 10) / 1000,
+            f'{linhas_batch} linhas: numpy ms': _latencia(lambda: forest.predict(X_batch), 10) / 1000,
+        })
+
+    resumo = pd.DataFrame(resultados).set_index('regiao')
+    with pd.option_context('display.float_format', '{:,.2f}'.format, 'display.width', 200, 'display.max_columns', None):
+        print(resumo.T)
+    return resumo
+
+
+# --- Ponto de Entrada ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backend de inferência NumPy (árvores achatadas) + benchmark")
+    parser.add_argument("--regioes", nargs="*", default=None, help="Regiões (padrão: todas)")
+    parser.add_argument("--repeticoes", type=int, default=200, help="Chamadas por medição de 1 linha")
+    parser.add_argument("--linhas-batch", type=int, default=10_000, help="Tamanho do batch medido")
+    args = parser.parse_args()
+    print("--- BENCHMARK DE INFERÊNCIA ---")
+    benchmark(args.regioes, args.repeticoes, args.linhas_batch)
@@ -0,0 +1,247 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import time
+import argparse
+import warnings
+
+from ml_pipeline import (
+    FEATURES_V4, FEATURES_LAGS, PARAMS_V4, load_data, build_regional_matrices,
+)
+from news_events import EVENT_COLUMNS
+from model_registry import register_model, model_key
+from prediction_store import dataset_hash, save_predictions
+from config import MODELS_DIR
+
+# Ignorar avisos
+warnings.filterwarnings('ignore')
+
+# --- 1. Configuração ---
+
+RESULTADOS_TUNING = MODELS_DIR / "tuning_resultados.json"
+
+# Espaço de busca (amostragem aleatória). max_bin fica fixo para que as
+# QuantileDMatrix de cada fold possam ser reaproveitadas entre os trials.
+ESPACO_BUSCA = {
+    'learning_rate': lambda rng: float(10 ** rng.uniform(-2.3, -0.7)),
+    'max_depth': lambda rng: int(rng.integers(3, 9)),
+    'subsample': lambda rng: float(rng.uniform(0.6, 1.0)),
+    'colsample_bytree': lambda rng: float(rng.uniform(0.6, 1.0)),
+    'min_child_weight': lambda rng: float(10 ** rng.uniform(0, 1.3)),
+    'reg_lambda': lambda rng: float(10 ** rng.uniform(-1, 1.5)),
+}
+
+
+# --- 2. Validação Walk-Forward ---
+
+def rolling_origin_folds(n_linhas, n_folds=4, horizonte=30, min_treino=90):
+    """Índices (fim_treino, fim_validacao) de uma validação com origem móvel.
+
+    Cada fold treina em tudo até a origem e valida nos 'horizonte' dias seguintes;
+    a origem anda 'horizonte' dias por fold, terminando no fim da série.
+    """
+    folds = []
+    for k in range(n_folds, 0, -1):
+        fim_treino = n_linhas - k * horizonte
+        if fim_treino < min_treino:
+            continue
+        folds.append((fim_treino, fim_treino + horizonte))
+    return folds
+
+def build_fold_matrices(X, y, folds, features=FEATURES_V4, n_jobs=None):
+    """Cria as DMatrix de treino/validação de cada fold uma única vez (reusadas em todos os trials)."""
+    import xgboost as xgb  # Import pesado: só quando há treino (importar o módulo fica leve)
+    matrizes = []
+    for fim_treino, fim_valid in folds:
+        dtreino = xgb.QuantileDMatrix(X[:fim_treino], y[:fim_treino], feature_names=list(features), nthread=n_jobs)
+        dvalid = xgb.QuantileDMatrix(X[fim_treino:fim_valid], y[fim_treino:fim_valid], ref=dtreino,
+                                     feature_names=list(features), nthread=n_jobs)
+        matrizes.append((dtreino, dvalid))
+    return matrizes
+
+def _params_booster(params, n_jobs):
+    """Converte os parâmetros do XGBRegressor para o xgb.train nativo."""
+    base = {k: v for k, v in PARAMS_V4.items() if k not in ('n_estimators', 'random_state')}
+    return {**base, **params, 'seed': PARAMS_V4['random_state'], 'eval_metric': 'mape', 'nthread': n_jobs}
+
+
+# --- 3. Busca de Hiperparâmetros (com Poda) ---
+
+def evaluate_trial(params, matrizes, historico_podas, n_startup=5, max_rounds=2000,
+                   early_stopping=50, n_jobs=None):
+    """Avalia um conjunto de parâmetros fold a fold, com early stopping em cada fold.
+
+    Poda (estilo "median pruner"): depois de cada fold, se a MAPE média acumulada
+    do trial for pior que a mediana dos trials anteriores no mesmo fold, o trial é
+    interrompido. Retorna (mape_por_fold, rounds_por_fold, podado).
+    """
+    import xgboost as xgb
+
+    params_booster = _params_booster(params, n_jobs)
+    mapes, rounds = [], []
+    for k, (dtreino, dvalid) in enumerate(matrizes):
+        resultado = {}
+        booster = xgb.train(
+            params_booster, dtreino, num_boost_round=max_rounds,
+            evals=[(dvalid, 'valid')], early_stopping_rounds=early_stopping,
+            evals_result=resultado, verbose_eval=False,
+        )
+        mapes.append(resultado['valid']['mape'][booster.best_iteration])
+        rounds.append(booster.best_iteration + 1)
+
+        media = float(np.mean(mapes))
+        anteriores = historico_podas.setdefault(k, [])
+        if len(anteriores) >= n_startup and media > np.median(anteriores):
+            return mapes, rounds, True
+        anteriores.append(media)
+    return mapes, rounds, False
+
+def refit_rounds(rounds_folds):
+    """Nº de árvores do refit: mediana dos rounds dos folds, ignorando folds degenerados.
+
+    Um fold que parou no primeiro round (best_iteration=0) não diz nada sobre o
+    tamanho certo do modelo; com a média, ele puxaria o refit para baixo.
+    """
+    validos = [r for r in rounds_folds if r > 1] or rounds_folds
+    return int(np.ceil(np.median(validos)))
+
+def tune_region(regiao, X, y, n_trials=30, n_folds=4, horizonte=30, seed=42, n_jobs=None, features=FEATURES_V4):
+    """Busca aleatória com validação walk-forward para uma região ('features' = colunas de X)."""
+    inicio = time.perf_counter()
+    folds = rolling_origin_folds(len(y), n_folds=n_folds, horizonte=horizonte)
+    if not folds:
+        print(f"  ⚠️ {regiao}: dados insuficientes para {n_folds} folds de {horizonte} dias.")
+        return None
+
+    matrizes = build_fold_matrices(X, y, folds, features, n_jobs=n_jobs)
+    rng = np.random.default_rng(seed)
+
+    # O primeiro trial é sempre o V4 atual, como referência
+    candidatos = [{k: PARAMS_V4[k] for k in ('learning_rate', 'max_depth', 'subsample')}]
+    candidatos += [{nome: amostrar(rng) for nome, amostrar in ESPACO_BUSCA.items()} for _ in range(n_trials - 1)]
+
+    historico_podas, trials = {}, []
+    for i, params in enumerate(candidatos):
+        mapes, rounds, podado = evaluate_trial(params, matrizes, historico_podas, n_jobs=n_jobs)
+        trials.append({'params': params, 'mape_folds': mapes, 'rounds_folds': rounds, 'podado': podado})
+        status = "podado" if podado else f"MAPE média {np.mean(mapes) * 100:.2f}%"
+        print(f"  trial {i:>3}: {status} | folds: " + ", ".join(f"{m * 100:.2f}%" for m in mapes))
+
+    completos = [t for t in trials if not t['podado']]
+    melhor = min(completos, key=lambda t: np.mean(t['mape_folds']))
+    melhor['n_estimators'] = refit_rounds(melhor['rounds_folds'])
+
+    return {
+        'regiao': regiao,
+        'features': list(features),
+        'folds': [{'fim_treino': int(a), 'fim_validacao': int(b)} for a, b in folds],
+        'melhor': melhor,
+        'trials': trials,
+        'n_podados': sum(t['podado'] for t in trials),
+        'segundos': time.perf_counter() - inicio,
+    }
+
+
+# --- 4. Refit Final ---
+
+def refit_best(regiao, X, y, ds, resultado, n_jobs=None):
+    """Retreina em 100% dos dados com os melhores parâmetros e registra a nova versão.
+
+    O modelo é registrado com as features usadas no tuning (resultado['features']),
+    que é por onde dashboard/serviço/previsão montam o X, e com os mesmos metadados
+    do train_and_save_models; as previsões in-sample vão para o prediction store.
+    """
+    import xgboost as xgb
+
+    melhor = resultado['melhor']
+    features = resultado['features']
+    params = {**PARAMS_V4, **melhor['params'], 'n_estimators': melhor['n_estimators']}
+    inicio = time.perf_counter()
+    model_xgb = xgb.XGBRegressor(**params, n_jobs=n_jobs)
+    model_xgb.fit(X, y)
+    model_xgb.get_booster().feature_names = list(features)
+    segundos = time.perf_counter() - inicio
+
+    chave = model_key(regiao)
+    versao_dataset = dataset_hash('diario')
+    registro = register_model(chave, model_xgb, features, {
+        'params': params,
+        'n_linhas': len(y),
+        'data_inicio': pd.Timestamp(ds.min()).isoformat(),
+        'data_fim': pd.Timestamp(ds.max()).isoformat(),
+        'dataset_hash': versao_dataset,
+        'segundos_treino': segundos,
+        'granularidade': 'diario',
+        'origem': 'tuning',
+        'mape_folds': melhor['mape_folds'],
+    })
+    save_predictions(chave, ds, y, model_xgb.predict(X), registro['hash'], versao_dataset)
+    print(f"  ✅ Modelo ajustado de {chave} registrado como {registro['versao']}")
+    return registro
+
+
+# --- 5. Função Principal ---
+
+def main(regioes=None, n_trials=30, n_folds=4, horizonte=30, salvar=False, threads=None, features=FEATURES_V4):
+    """Roda a busca por região, imprime a MAPE por fold e o tempo total de computação.
+
+    'features' é o conjunto do modelo ajustado (como no train_and_save_models): o mesmo
+    entra na busca e no registro do refit.
+    """
+    print("--- INICIANDO TUNING (WALK-FORWARD + EARLY STOPPING) ---")
+    inicio_total = time.perf_counter()
+
+    df = load_data()
+    if df is None:
+        return
+    if not set(features).issubset(df.columns):
+        print(f"❌ ERRO: o master dataset não tem as features {sorted(set(features) - set(df.columns))}.")
+        return
+    df = df.sort_values(['Região', 'ds'], kind='stable')
+    matrizes = build_regional_matrices(df, features)
+    n_jobs = threads or os.cpu_count() or 1
+
+    resultados = []
+    for regiao, (X, y, ds) in matrizes.items():
+        if regioes and regiao not in regioes:
+            continue
+        print(f"\n--- Tuning para Região: {regiao} ---")
+        resultado = tune_region(regiao, X, y, n_trials=n_trials, n_folds=n_folds,
+                                horizonte=horizonte, n_jobs=n_jobs, features=features)
+        if resultado is None:
+            continue
+
+        melhor = resultado['melhor']
+        print(f"  🏆 Melhor: {melhor['params']} | {melhor['n_estimators']} rounds")
+        print("     MAPE por fold: " + ", ".join(f"{m * 100:.2f}%" for m in melhor['mape_folds']))
+        print(f"     {resultado['n_podados']} trial(s) podado(s) | {resultado['segundos']:.2f}s")
+
+        if salvar:
+            refit_best(regiao, X, y, ds, resultado, n_jobs=n_jobs)
+        resultados.append(resultado)
+
+    segundos_total = time.perf_counter() - inicio_total
+    with open(RESULTADOS_TUNING, 'w', encoding='utf-8') as f:
+        json.dump({'segundos_total': segundos_total, 'regioes': resultados}, f, indent=2)
+
+    print(f"\n⏱️ Tempo total de computação: {segundos_total:.2f}s")
+    print(f"Resultados salvos em: {RESULTADOS_TUNING}")
+    return resultados
+
+
+# --- Ponto de Entrada ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tuning walk-forward dos modelos regionais")
+    parser.add_argument("--regioes", nargs="*", default=None, help="Regiões a ajustar (padrão: todas)")
+    parser.add_argument("--trials", type=int, default=30, help="Nº de combinações de parâmetros")
+    parser.add_argument("--folds", type=int, default=4, help="Nº de folds com origem móvel")
+    parser.add_argument("--horizonte", type=int, default=30, help="Dias de validação por fold")
+    parser.add_argument("--threads", type=int, default=None, help="Threads do XGBoost (padrão: nº de CPUs)")
+    parser.add_argument("--salvar", action="store_true", help="Retreina com os melhores parâmetros e salva os modelos")
+    parser.add_argument("--lags", action="store_true", help="Ajusta o modelo com as defasagens/janelas móveis de 'y'")
+    parser.add_argument("--eventos", action="store_true", help="Ajusta o modelo com as contagens de eventos das notícias")
+    args = parser.parse_args()
+    features = (FEATURES_LAGS if args.lags else FEATURES_V4) + (EVENT_COLUMNS if args.eventos else [])
+    main(regioes=args.regioes, n_trials=args.trials, n_folds=args.folds,
+         horizonte=args.horizonte, salvar=args.salvar, threads=args.threads, features=features)
@@ -0,0 +1,130 @@
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Servidor local que imita o /v2/everything da NewsAPI (só biblioteca padrão), para
+# testar a coleta sem rede: paginação, filtro 'from', limite de resultados do plano
+# gratuito (426 'maximumResultsReached') e falhas programadas (429 com Retry-After, 5xx).
+
+# --- 1. Artigos Sintéticos ---
+
+LIMITE_RESULTADOS = 200  # Plano gratuito: páginas além disso voltam 426
+
+
+def gerar_artigos(keywords, por_termo=60, urls_distintas=150):
+    """{termo: [artigos]}: as URLs se repetem entre termos (a coleta deve deduplicar)."""
+    artigos = {}
+    for i, termo in enumerate(keywords):
+        artigos[termo] = [{
+            'source': {'name': f'Fonte {j % 3}'},
+            'title': f'{termo} {j}',
+            'description': 'descrição | com separador',
+            'content': 'linha 1\nlinha 2',
+            'url': f'https://noticias.exemplo/{(i * 37 + j) % urls_distintas}',
+            'publishedAt': f'2025-12-{1 + j % 28:02d}T{j % 24:02d}:00:00Z',
+        } for j in range(por_termo)]
+    return artigos
+
+
+# --- 2. Servidor ---
+
+class NewsStub:
+    """Stub da NewsAPI em uma thread; 'falhas' = {nº da requisição (1, 2, ...): (status, cabeçalhos)}.
+
+    Cada requisição recebida fica em 'requisicoes' (instante monotônico, termo, página,
+    status devolvido) e cada pausa que o cliente marcou na Cadencia em 'pausas' (ver
+    registrar_pausa), no mesmo relógio, para os testes conferirem retentativas e pausas.
+    """
+
+    def __init__(self, artigos, falhas=None, atraso=0.01):
+        self.artigos = artigos
+        self.falhas = falhas or {}
+        self.atraso = atraso
+        self.requisicoes = []
+        self.pausas = []
+        self._lock = threading.Lock()
+        self._servidor = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._servidor.server_port}/v2/everything"
+
+    def iniciar(self, porta=0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub._responder(self)
+
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', porta), Handler)
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self.url
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def registrar_pausa(self, inicio, ate):
+        """Pausa da Cadencia do cliente: 'inicio' (já marcada) e 'ate', em time.monotonic()."""
+        with self._lock:
+            self.pausas.append({'inicio': inicio, 'ate': ate})
+
+    def _responder(self, handler):
+        query = parse_qs(urlparse(handler.path).query)
+        termo = query['q'][0].split('"')[1]
+        pagina, tamanho = int(query['page'][0]), int(query['pageSize'][0])
+        with self._lock:
+            numero = len(self.requisicoes) + 1
+            status, cabecalhos = self.falhas.get(numero, (200, {}))
+            if status == 200 and pagina > 1 and pagina * tamanho > LIMITE_RESULTADOS:
+                status = 426
+            self.requisicoes.append({'instante': time.monotonic(), 'termo': termo, 'pagina': pagina,
+                                     'status': status})
+
+        if status == 200:
+            desde = query.get('from', [None])[0]
+            artigos = sorted((a for a in self.artigos[termo] if desde is None or a['publishedAt'] >= desde),
+                             key=lambda a: a['publishedAt'], reverse=True)
+            time.sleep(self.atraso)
+            corpo = {'status': 'ok', 'totalResults': len(artigos),
+                     'articles': artigos[(pagina - 1) * tamanho:pagina * tamanho]}
+        elif status == 426:
+            corpo = {'status': 'error', 'code': 'maximumResultsReached'}
+        else:
+            corpo = {'status': 'error', 'code': 'rateLimited' if status == 429 else 'unexpectedError'}
+
+        dados = json.dumps(corpo).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(dados)))
+        for nome, valor in cabecalhos.items():
+            handler.send_header(nome, valor)
+        handler.end_headers()
+        handler.wfile.write(dados)
+
+
+# --- Ponto de Entrada (coleta manual contra o stub) ---
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+    from data_collection import KEYWORDS
+
+    parser = argparse.ArgumentParser(description="Servidor local que imita a NewsAPI")
+    parser.add_argument("--porta", type=int, default=8099)
+    parser.add_argument("--por-termo", type=int, default=230, help="Artigos por termo")
+    args = parser.parse_args()
+
+    stub = NewsStub(gerar_artigos(KEYWORDS, args.por_termo, urls_distintas=400),
+                    falhas={3: (429, {'Retry-After': '1'}), 5: (500, {})})
+    print(f"✅ Stub da NewsAPI em {stub.iniciar(args.porta)} (Ctrl+C para sair)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.parar()
@@ -0,0 +1,111 @@
+import sys
+import time
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import data_collection as dc
+from instrumentation import execucao
+from news_stub import NewsStub, gerar_artigos
+
+# Coleta completa contra o stub local da NewsAPI (tests/news_stub.py), sem rede:
+# python -m unittest discover tests
+
+RETRY_AFTER = 1.0
+FALHAS = {2: (429, {'Retry-After': str(int(RETRY_AFTER))}), 4: (503, {})}
+
+
+def cadencia_observada(stub, esperas):
+    """Cadencia real que também anota as pausas no stub e, em 'esperas', cada passagem
+    pelo aguardar (thread, início da chamada, liberação), no relógio do stub."""
+
+    class CadenciaObservada(dc.Cadencia):
+        def aguardar(self):
+            chamada = time.monotonic()
+            super().aguardar()
+            esperas.append((threading.get_ident(), chamada, time.monotonic()))
+
+        def pausar(self, segundos):
+            super().pausar(segundos)
+            stub.registrar_pausa(time.monotonic(), self._ate)
+
+    return CadenciaObservada
+
+
+class TestColetaContraStub(unittest.TestCase):
+
+    def setUp(self):
+        self.temporaria = tempfile.TemporaryDirectory()
+        pasta = Path(self.temporaria.name)
+        self.pasta, self.csv = pasta / "noticias", pasta / "noticias.csv"
+        self.artigos = gerar_artigos(dc.KEYWORDS, por_termo=60, urls_distintas=150)
+        self.stub = NewsStub(self.artigos, falhas=FALHAS)
+        self.stub.iniciar()
+        self.esperas = []
+
+    def tearDown(self):
+        self.stub.parar()
+        self.temporaria.cleanup()
+
+    def coletar(self):
+        # Execução externa sem gravar relatório: o teste não escreve em reports/
+        with execucao("teste_data_collection", salvar=False), \
+                mock.patch.object(dc, 'Cadencia', cadencia_observada(self.stub, self.esperas)):
+            return dc.fetch_and_save_news(base_url=self.stub.url, workers=4, tamanho_pagina=25,
+                                          espera_base=0.05, pasta=self.pasta, caminho_csv=self.csv)
+
+    def test_coleta_com_retentativas_pausa_e_dedupe(self):
+        novos = self.coletar()
+        requisicoes = self.stub.requisicoes
+
+        # Dedupe pelo hash da URL: as URLs se repetem entre termos, cada uma entra uma vez
+        urls = {a['url'] for artigos in self.artigos.values() for a in artigos}
+        self.assertEqual(len(novos), len(urls))
+        store = dc.load_news(self.pasta)
+        self.assertTrue(store['url_hash'].is_unique)
+        self.assertEqual(set(store['url']), urls)
+        self.assertEqual(len(pd.read_csv(self.csv, sep='|')), len(urls))
+
+        # 429: a mesma página é repetida só depois do Retry-After...
+        r429 = next(r for r in requisicoes if r['status'] == 429)
+        self.assertEqual(len(self.stub.pausas), 1)
+        pausa = self.stub.pausas[0]
+        self.assertGreaterEqual(pausa['ate'] - r429['instante'], RETRY_AFTER)
+        repeticoes = [r for r in requisicoes if r['instante'] > r429['instante']
+                      and (r['termo'], r['pagina']) == (r429['termo'], r429['pagina'])]
+        self.assertEqual(repeticoes[-1]['status'], 200)
+        self.assertGreaterEqual(repeticoes[0]['instante'], pausa['ate'])
+
+        # ...e a pausa vale para todas as threads: nenhuma requisição que começou depois de
+        # a pausa ser marcada sai antes do fim dela (as que já estavam em voo não contam)
+        depois = [(thread, liberada) for thread, chamada, liberada in self.esperas if chamada > pausa['inicio']]
+        self.assertGreater(len({thread for thread, _ in depois}), 1)
+        for _, liberada in depois:
+            self.assertGreaterEqual(liberada, pausa['ate'])
+
+        # 5xx: repetida com backoff até dar certo
+        r503 = next(r for r in requisicoes if r['status'] == 503)
+        self.assertTrue(any((r['termo'], r['pagina'], r['status']) == (r503['termo'], r503['pagina'], 200)
+                            for r in requisicoes if r['instante'] > r503['instante']))
+
+    def test_segunda_coleta_nao_duplica(self):
+        self.coletar()
+        lotes = dc.list_lots(self.pasta)
+
+        # Retoma do 'publishedAt' mais recente; os artigos desse instante voltam e são descartados
+        novos = self.coletar()
+        self.assertTrue(novos.empty)
+        self.assertEqual(dc.list_lots(self.pasta), lotes)
+        self.assertTrue(dc.load_news(self.pasta)['url_hash'].is_unique)
+
+
+if __name__ == "__main__":
+    unittest.main()